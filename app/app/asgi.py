@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# Pay for building the URL resolver at boot rather than on the first request
+from core.startup import warm_up  # noqa: E402
+
+warm_up()
@@ -44,14 +44,22 @@ INSTALLED_APPS = [
     'recipe',
 ]
 
+# The Browser* middleware are Django's session, CSRF, authentication,
+# messages and frame options middleware, skipped for the token
+# authenticated API under API_PATH_PREFIXES so only the admin pays for them
+
+API_PATH_PREFIXES = ('/api/',)
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.BrowserSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.BrowserCsrfViewMiddleware',
+    'core.middleware.BrowserAuthenticationMiddleware',
+    'core.middleware.BrowserMessageMiddleware',
+    'core.middleware.BrowserXFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -78,16 +86,280 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# DB_CONN_MAX_AGE keeps connections open between requests (seconds, 0 to
+# close after every request). DB_CONN_HEALTH_CHECKS pings a persistent
+# connection before reusing it. DB_POOL_MAX_SIZE enables a per-process
+# connection pool shared by the threads of a threaded server, connections
+# then go back to the pool after each request and DB_CONN_MAX_AGE must be 0.
+# Threads wait up to DB_POOL_TIMEOUT seconds for a free pooled connection.
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get(
+            'DB_CONN_MAX_AGE', 0 if DB_POOL_MAX_SIZE else 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': DB_POOL_MAX_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        } if DB_POOL_MAX_SIZE else None,
     }
 }
 
+# Read replicas, as a comma separated list of hosts sharing the primary's
+# credentials. Reads of safe requests are spread over healthy replicas;
+# a user who just wrote reads from the primary for DB_REPLICA_PIN_SECONDS,
+# which needs a cache shared by every worker, see CACHE_HOSTS.
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(alias)
+
+# Shards, as a comma separated list of hosts sharing the primary's
+# credentials. The recipes, tags, ingredients and change log of each user
+# live on one of DATABASE_SHARDS, the default database included; users,
+# tokens and sessions stay on the default database. New users are spread
+# over the shards and move_user_shard moves an existing one. The n-th shard
+# of the list numbers new recipes, tags and ingredients from
+# n * SHARD_ID_RANGE, so a moved user keeps their ids; only append to the
+# list. Old change feed cursors get 410 Gone after a move.
+
+DATABASE_SHARDS = ['default']
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(','))):
+    alias = f'shard_{index + 1}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host)
+    DATABASE_SHARDS.append(alias)
+
+SHARDED_MODELS = [
+    'core.tag',
+    'core.ingredient',
+    'core.recipe',
+    'core.recipetag',
+    'core.recipeingredient',
+    'core.reciperevision',
+    'core.change',
+]
+
+# Ids of each shard, 16 shards fit in the 32 bit ids
+SHARD_ID_RANGE = 2 ** 27
+
+# Seconds clients are told to wait while their data is being moved
+SHARD_MOVE_RETRY_AFTER = 5
+
+DATABASE_ROUTERS = ['core.routers.ShardRouter', 'core.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+# Cache holding the pins, which must be shared by every worker
+REPLICA_PIN_CACHE = 'default'
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+# Models that must always be read from the primary, e.g. to log in
+# right after signing up
+REPLICA_PRIMARY_MODELS = [
+    'core.user',
+    'authtoken.token',
+    'sessions.session',
+]
+
+
+# Cache
+# CACHE_HOSTS, as a comma separated list of memcached host:port, gives all
+# workers one shared cache. Without it each process caches in its own
+# memory, which only suits a single process.
+
+CACHE_HOSTS = [
+    host for host in os.environ.get('CACHE_HOSTS', '').split(',') if host
+]
+
+if CACHE_HOSTS:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': CACHE_HOSTS,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Password hashing
+# PASSWORD_HASHER picks the algorithm used for new hashes; hashes made
+# with the other algorithms or with a different cost are upgraded
+# transparently the next time their user logs in. argon2 uses the
+# argon2-cffi package and bcrypt the bcrypt package.
+
+_PASSWORD_HASHERS = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+}
+_PREFERRED_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[_PREFERRED_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != _PREFERRED_HASHER
+]
+
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', 180000))
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 512))
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 2))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+# Failed logins: how long a wrong email/password pair is remembered, and
+# how many failures an account accepts per window before being locked out
+
+LOGIN_FAILURE_CACHE = 300
+LOGIN_FAILURE_WINDOW = 900
+LOGIN_MAX_FAILURES = 10
+
+
+# Django REST framework
+# Every user gets an overall request budget plus separate budgets for
+# reads, writes and image uploads. Buckets live in the memory of each
+# worker; point THROTTLE_BUCKET_STORE at core.throttling.CacheBucketStore
+# to share them between workers through the default cache.
+
+REST_FRAMEWORK = {
+    # Sessions are not available under API_PATH_PREFIXES
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.UserTokenBucketThrottle',
+        'core.throttling.ScopedTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '100/min'),
+        'user': os.environ.get('THROTTLE_USER_RATE', '1200/min'),
+        'reads': os.environ.get('THROTTLE_READS_RATE', '600/min'),
+        'writes': os.environ.get('THROTTLE_WRITES_RATE', '120/min'),
+        'uploads': os.environ.get('THROTTLE_UPLOADS_RATE', '20/min'),
+    },
+}
+
+THROTTLE_BUCKET_STORE = os.environ.get(
+    'THROTTLE_BUCKET_STORE', 'core.throttling.LocalBucketStore'
+)
+
+
+# Recipe recommendations
+# Per-user in-memory indexes are rebuilt after RECOMMENDATION_INDEX_TTL
+# seconds to pick up writes made by other processes.
+
+RECOMMENDATION_INDEX_TTL = 300
+RECOMMENDATION_INDEX_MAX_USERS = 1000
+
+
+# Seconds the statistics of a recipe library stay cached; writes make them
+# stale at once since they are cached under the latest change log entry
+
+RECIPE_STATS_CACHE_TIMEOUT = 3600
+
+
+# Shopping lists are built from at most SHOPPING_LIST_MAX_RECIPES recipes
+# with one grouped query, read SHOPPING_LIST_CHUNK_SIZE rows at a time and
+# streamed when built from at least SHOPPING_LIST_STREAM_THRESHOLD recipes
+
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_STREAM_THRESHOLD = 1000
+SHOPPING_LIST_MAX_RECIPES = 10000
+
+
+# Soft deleted rows are purged by the purge_deleted command once they have
+# been deleted for PURGE_GRACE_SECONDS, PURGE_BATCH_SIZE rows at a time
+
+PURGE_GRACE_SECONDS = 3600
+PURGE_BATCH_SIZE = 1000
+
+
+# Recipe revisions store the whole recipe once every
+# RECIPE_REVISION_SNAPSHOT_INTERVAL revisions and only changes otherwise
+
+RECIPE_REVISION_SNAPSHOT_INTERVAL = 20
+
+
+# Most recipes cloned by one request
+
+RECIPE_CLONE_MAX = 100
+
+
+# Batch image uploads hold at most RECIPE_UPLOAD_BATCH_MAX images, each at
+# most RECIPE_IMAGE_MAX_SIZE bytes, and are stored by RECIPE_UPLOAD_WORKERS
+# threads; zip archives of images may be RECIPE_UPLOAD_ARCHIVE_MAX_SIZE bytes
+
+RECIPE_UPLOAD_BATCH_MAX = 100
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_UPLOAD_ARCHIVE_MAX_SIZE = 200 * 1024 * 1024
+RECIPE_UPLOAD_WORKERS = int(os.environ.get('RECIPE_UPLOAD_WORKERS', 4))
+
+
+# Syncing clients read at most CHANGE_FEED_PAGE_SIZE changes at a time;
+# tombstones of deleted objects are kept for CHANGE_LOG_TOMBSTONE_SECONDS
+
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_LOG_TOMBSTONE_SECONDS = 30 * 24 * 3600
+
+
+# Live updates
+# Event streams are told about changes through PUBSUB_BROKER. With a shared
+# cache it defaults to core.pubsub.CacheBroker, which delivers across
+# workers; the local broker only reaches streams served by the same
+# process. Each open stream holds a worker thread, so a worker serves at
+# most EVENT_STREAM_MAX_PER_WORKER streams (keep it below its threads, the
+# rest get 503) and streams end after EVENT_STREAM_MAX_SECONDS, when
+# clients reconnect.
+
+PUBSUB_BROKER = os.environ.get(
+    'PUBSUB_BROKER',
+    'core.pubsub.CacheBroker' if CACHE_HOSTS else 'core.pubsub.LocalBroker'
+)
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS',
+                                              300))
+EVENT_STREAM_MAX_PER_WORKER = int(
+    os.environ.get('EVENT_STREAM_MAX_PER_WORKER', 2)
+)
+EVENT_STREAM_RETRY_AFTER = 30
+
+
+# Response compression
+# Brotli, from requirements.txt, is used when the client accepts it and
+# gzip otherwise or without the package. Levels trade CPU for bytes, see the
+# compression_benchmark command. Event streams are skipped since proxies
+# tend to buffer compressed streams. Other streamed bodies are flushed to
+# the client every COMPRESSION_STREAM_FLUSH_SIZE bytes of input, or every
+# chunk for COMPRESSION_FLUSH_CHUNK_TYPES, read by clients as they arrive.
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY',
+                                                4))
+COMPRESSION_SKIP_TYPES = (
+    'image/', 'video/', 'audio/', 'application/zip', 'application/gzip',
+    'application/octet-stream', 'text/event-stream',
+)
+COMPRESSION_STREAM_FLUSH_SIZE = 64 * 1024
+COMPRESSION_FLUSH_CHUNK_TYPES = ('application/x-ndjson',)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -105,6 +377,9 @@ AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
     },
+    {
+        'NAME': 'user.login.ForgetFailedLogins',
+    },
 ]
 
 
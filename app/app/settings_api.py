@@ -0,0 +1,40 @@
+"""
+Settings for processes serving only the REST API.
+
+Select with DJANGO_SETTINGS_MODULE=app.settings_api. The admin, sessions,
+messages, static files and template engines are left out, so workers
+import less at boot and run fewer middleware per request. Use app.settings
+for the admin and for management commands such as migrate.
+"""
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import INSTALLED_APPS, REST_FRAMEWORK
+
+UNUSED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+
+# Clients authenticate with tokens, so there is no session to protect
+# with CSRF checks and no HTML to guard against framing
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+TEMPLATES = []
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_RENDERER_CLASSES=[
+        'rest_framework.renderers.JSONRenderer',
+    ],
+)
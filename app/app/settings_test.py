@@ -0,0 +1,19 @@
+"""
+Settings for the test suite.
+
+`manage.py test` selects them unless DJANGO_SETTINGS_MODULE says
+otherwise. The routing is checked against a real second database and a
+replica mirroring the primary, only used by the tests asking for them.
+"""
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import DATABASES
+
+if 'shard_1' not in DATABASES:
+    DATABASES['shard_1'] = dict(DATABASES['default'], TEST={
+        'NAME': f"test_{DATABASES['default']['NAME']}_shard_1",
+    })
+if 'replica_1' not in DATABASES:
+    DATABASES['replica_1'] = dict(
+        DATABASES['default'], TEST={'MIRROR': 'default'}
+    )
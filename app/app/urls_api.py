@@ -0,0 +1,10 @@
+"""app URL Configuration for API-only processes, see app.settings_api """
+from django.urls import path, include
+from django.conf.urls.static import static
+from django.conf import settings
+
+
+urlpatterns = [
+    path('api/user/', include('user.urls')),
+    path('api/recipe/', include('recipe.urls')),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Pay for building the URL resolver at boot rather than on the first request
+from core.startup import warm_up  # noqa: E402
+
+warm_up()
@@ -1,11 +1,62 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelectMultiple
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from core import models
+from core.fields import OwnedManyToManyField
 
 # Register your models here.
 
 
+class EstimatedCountPaginator(Paginator):
+    """ Paginator that trusts the planner's row estimate for unfiltered
+        changelists of huge tables instead of running COUNT(*) """
+    exact_count_below = 100000
+
+    @staticmethod
+    def _where_sql(queryset):
+        query = queryset.query
+        return query.get_compiler(queryset.db).compile(query.where)
+
+    def is_unfiltered(self):
+        """ Tell whether the changelist shows every row its model's default
+            manager does, such as all rows not soft deleted """
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return False
+        if not queryset.query.where:
+            return True
+        default = queryset.model._default_manager.using(queryset.db).all()
+        return self._where_sql(queryset) == self._where_sql(default)
+
+    def estimated_count(self):
+        """ Return the row estimate of the table, if the database has one """
+        if not self.is_unfiltered():
+            return None
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimated_count()
+        if estimate is not None and estimate >= self.exact_count_below:
+            return estimate
+        return super().count
+
+
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
@@ -43,7 +94,46 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAttrAdmin(admin.ModelAdmin):
+    """ Base admin for user owned recipe attributes """
+    list_display = ['name', 'user']
+    list_select_related = ['user']
+    # Case sensitive prefix search, served by the name pattern index
+    search_fields = ['name__startswith']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    list_select_related = ['user']
+    search_fields = ['title__startswith']
+    raw_id_fields = ['user']
+    autocomplete_fields = ['tags', 'ingredients']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        """ Keep the tags and ingredients editable despite their through
+            models, whose rows their related managers fill in """
+        if not isinstance(db_field, OwnedManyToManyField):
+            return super().formfield_for_manytomany(
+                db_field, request, **kwargs
+            )
+
+        db = kwargs.get('using')
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = AutocompleteSelectMultiple(
+                db_field.remote_field, self.admin_site, using=db
+            )
+        queryset = self.get_field_queryset(db, db_field, request)
+        if queryset is not None:
+            kwargs.setdefault('queryset', queryset)
+        return db_field.formfield(**kwargs)
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
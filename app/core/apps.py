@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        """ Connect the signal handlers maintaining denormalized data and
+            register the system checks """
+        from core import checks, signals  # noqa: F401
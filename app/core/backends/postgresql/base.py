@@ -0,0 +1,135 @@
+import os
+import threading
+
+from psycopg2 import pool as pg_pool
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from core.backends.postgresql.schema import DatabaseSchemaEditor
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(pg_pool.ThreadedConnectionPool):
+    """ Thread safe pool making borrowers wait for a free connection
+
+    psycopg2's pool raises PoolError as soon as every connection is lent
+    out, which turns a load spike with more threads than connections into
+    errors. Here borrowers wait up to `timeout` seconds first.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=30, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pg_pool.PoolError(
+                f'no connection freed up within {self.timeout} seconds'
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def close_pools():
+    """ Close every connection pool created by this process """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """ PostgreSQL backend with connection health checks and pooling
+
+    Two extra keys are read from the database settings:
+
+    CONN_HEALTH_CHECKS -- when True, a persistent connection is checked
+        with a cheap query before it is reused by a new request.
+    POOL -- optional dict with MIN_SIZE, MAX_SIZE and TIMEOUT. When set,
+        connections are borrowed from a per-process pool shared by all
+        threads instead of being opened and closed by each thread; threads
+        wait up to TIMEOUT seconds for a connection when all are in use.
+        Needs CONN_MAX_AGE 0, else threads would keep their connection
+        between requests instead of putting it back.
+
+    Foreign keys to partitioned tables are created by
+    core.backends.postgresql.schema.DatabaseSchemaEditor.
+    """
+    SchemaEditorClass = DatabaseSchemaEditor
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_pending = False
+        if self.settings_dict.get('POOL') and \
+                self.settings_dict.get('CONN_MAX_AGE'):
+            raise ImproperlyConfigured(
+                f'Database {self.alias!r} has a POOL, its CONN_MAX_AGE '
+                f'must be 0 so connections go back to the pool'
+            )
+
+    def _get_pool(self, conn_params):
+        """ Return the pool for this alias, creating it on first use """
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        # Pools must never cross a fork, so they are keyed by pid too
+        key = (self.alias, os.getpid())
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = BlockingConnectionPool(
+                    options.get('MIN_SIZE', 1),
+                    options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 30),
+                    **conn_params
+                )
+                _pools[key] = pool
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+
+        return connection
+
+    def _close(self):
+        pool = _pools.get((self.alias, os.getpid()))
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # Broken connections are discarded instead of being reused
+            pool.putconn(self.connection, close=self.errors_occurred)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None and \
+                self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            self.health_check_pending = True
+
+    def ensure_connection(self):
+        if self.health_check_pending:
+            self.health_check_pending = False
+            if self.connection is not None and not self.is_usable():
+                self.close()
+        super().ensure_connection()
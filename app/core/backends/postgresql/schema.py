@@ -0,0 +1,39 @@
+from django.db.backends.ddl_references import Columns
+from django.db.backends.postgresql import schema
+
+
+class DatabaseSchemaEditor(schema.DatabaseSchemaEditor):
+    """ Schema editor keeping foreign keys to partitioned tables valid
+
+    Once partition_recipes has run, the primary key of a partitioned table
+    is (id, user_id) and PostgreSQL refuses foreign keys referencing its id
+    alone. Foreign keys that later migrations add to such a table include
+    user_id on both sides instead; a model without a user_id column cannot
+    reference one and its migration fails with PartitioningError.
+    """
+
+    def _create_fk_sql(self, model, field, suffix):
+        from core.partitioning import PARTITION_KEY, PartitioningError, \
+            is_partitioned
+
+        statement = super()._create_fk_sql(model, field, suffix)
+        to_table = field.target_field.model._meta.db_table
+        with self.connection.cursor() as cursor:
+            if not is_partitioned(cursor, to_table):
+                return statement
+
+        table = model._meta.db_table
+        if PARTITION_KEY not in (
+                f.column for f in model._meta.local_concrete_fields):
+            raise PartitioningError(
+                f'{table}.{field.column} cannot reference the partitioned '
+                f'table {to_table} without a {PARTITION_KEY} column'
+            )
+        statement.parts['column'] = Columns(
+            table, [field.column, PARTITION_KEY], self.quote_name
+        )
+        statement.parts['to_column'] = Columns(
+            to_table, [field.target_field.column, PARTITION_KEY],
+            self.quote_name
+        )
+        return statement
@@ -0,0 +1,24 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+""" Cache backends whose entries other processes cannot see """
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def is_shared(cache):
+    """ Return whether every process sees the entries of a cache """
+    return not isinstance(cache, PROCESS_LOCAL_CACHES)
+
+
+def shared_cache(alias='default'):
+    """ Return the cache of an alias, raising ImproperlyConfigured unless
+        it is shared by every process """
+    cache = caches[alias]
+    if not is_shared(cache):
+        raise ImproperlyConfigured(
+            f'The {alias!r} cache is local to each process; configure a '
+            f'shared backend such as memcached, e.g. with CACHE_HOSTS.'
+        )
+    return cache
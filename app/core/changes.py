@@ -0,0 +1,88 @@
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.contrib.auth import get_user_model
+from core.models import Change, Recipe, Tag, Ingredient
+from core.pubsub import get_broker
+
+MODELS = {
+    Recipe: Change.RECIPE,
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+}
+
+""" Namespace of the advisory locks serializing the writers of each user's
+    change log on PostgreSQL """
+CHANGE_LOG_LOCK = 0x636c
+
+
+def lock_change_log(user_id, using=DEFAULT_DB_ALIAS):
+    """ Wait for the other transactions writing a user's change log
+
+    Clients resume the log after the last id they read, so ids have to
+    show up in order: a transaction taking id 10 must not commit after one
+    taking id 11 was read. Holding this lock until the transaction ends
+    makes the writers of a user take their ids in commit order. SQLite
+    allows a single writer at a time and needs no lock.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, %s)', [CHANGE_LOG_LOCK, user_id]
+        )
+
+
+def record_changes(user_id, model, object_ids, action=Change.UPSERT,
+                   using=DEFAULT_DB_ALIAS):
+    """ Append changes to a user's log, compacting away the entries they
+        supersede, and notify the user's event streams once committed """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    with transaction.atomic(using=using):
+        lock_change_log(user_id, using)
+        Change.objects.using(using).filter(
+            user_id=user_id, model=model, object_id__in=object_ids
+        ).delete()
+        Change.objects.using(using).bulk_create([
+            Change(user_id=user_id, model=model, object_id=object_id,
+                   action=action)
+            for object_id in object_ids
+        ])
+
+    transaction.on_commit(lambda: get_broker().publish(
+        user_id, 'change',
+        {'model': model, 'ids': object_ids, 'action': action}
+    ), using=using)
+
+
+def record_instance(instance, action=Change.UPSERT, using=DEFAULT_DB_ALIAS):
+    """ Record a change of a recipe, tag or ingredient """
+    if getattr(instance, 'deleted_at', None) is not None:
+        action = Change.DELETE
+    record_changes(
+        instance.user_id, MODELS[type(instance)], [instance.pk], action, using
+    )
+
+
+def expire_tombstones(before, using=DEFAULT_DB_ALIAS):
+    """ Drop delete entries older than a given time from a shard
+
+    The horizon of every affected user moves past the dropped entries so
+    clients that may have missed them are told to sync from scratch.
+    Return the number of entries dropped.
+    """
+    tombstones = Change.objects.using(using).filter(
+        action=Change.DELETE, created_at__lt=before
+    )
+    horizons = tombstones.values('user_id').annotate(horizon=Max('id'))
+    with transaction.atomic(using=DEFAULT_DB_ALIAS), \
+            transaction.atomic(using=using):
+        for row in horizons:
+            get_user_model().all_objects.using(DEFAULT_DB_ALIAS).filter(
+                id=row['user_id'], changes_horizon__lt=row['horizon']
+            ).update(changes_horizon=row['horizon'])
+        count, _ = tombstones.delete()
+
+    return count
@@ -0,0 +1,16 @@
+from django.core.cache import caches
+from django.core.checks import Warning, register
+from core.caches import is_shared
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """ Warn when each worker would keep its own login failures, replica
+        pins and cached statistics """
+    if is_shared(caches['default']):
+        return []
+    return [Warning(
+        'The default cache is local to each process.',
+        hint='Set CACHE_HOSTS so that every worker shares one cache.',
+        id='core.W001',
+    )]
@@ -0,0 +1,118 @@
+from django.db import connections, transaction
+from django.dispatch import Signal
+from core import changes
+from core.models import Change, Recipe, RecipeRevision
+from core.revisions import recipe_states
+from core.summaries import through_model
+
+""" Recipes copied per statement; each takes three query parameters, which
+    keeps statements within the 999 parameters older SQLite allows """
+CLONE_BATCH_SIZE = 300
+
+""" Sent once recipes are cloned, with `user_id`, the new `recipes` and the
+    `using` alias; their links are copied without m2m_changed signals """
+recipes_cloned = Signal()
+
+
+def insert_copies(model, objects, using):
+    """ Insert objects as new rows and give them their new primary keys
+
+    Only some databases return the keys of bulk inserts; on the others the
+    rows are inserted one by one. No post_save handler acts on either.
+    """
+    for obj in objects:
+        obj.pk = None
+        obj._state.adding = True
+        obj._state.db = None
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        model._base_manager.using(using).bulk_create(objects)
+    else:
+        for obj in objects:
+            obj.save_base(using=using, raw=True, force_insert=True)
+
+    return objects
+
+
+def copy_links(recipe_ids, using):
+    """ Copy the tags and ingredients of recipes to other recipes with one
+        INSERT ... SELECT per through table
+
+    `recipe_ids` maps the id of each source recipe to the id of its copy.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    cases = ' '.join(['WHEN %s THEN %s'] * len(recipe_ids))
+    params = [pk for pair in recipe_ids.items() for pk in pair]
+    params += list(recipe_ids)
+    sources = ', '.join(['%s'] * len(recipe_ids))
+
+    with connection.cursor() as cursor:
+        for name in ('tags', 'ingredients'):
+            meta = through_model(name)._meta
+            columns = [
+                field.column for field in meta.concrete_fields
+                if not field.primary_key
+            ]
+            selected = [
+                f'CASE {quote(column)} {cases} END'
+                if column == 'recipe_id' else quote(column)
+                for column in columns
+            ]
+            cursor.execute(
+                f"INSERT INTO {quote(meta.db_table)} "
+                f"({', '.join(map(quote, columns))}) "
+                f"SELECT {', '.join(selected)} FROM {quote(meta.db_table)} "
+                f"WHERE {quote('recipe_id')} IN ({sources})",
+                params
+            )
+
+
+def clone_recipes(recipes, title=None):
+    """ Copy recipes of one user along with their tags and ingredients
+
+    The recipes are copied as given, summaries included, so they should
+    be freshly loaded. The copies share the image files of their recipes
+    and start their history with a snapshot. Everything is written in bulk in one
+    transaction; return the copies in the order of the recipes.
+    """
+    if not recipes:
+        return []
+    using = recipes[0]._state.db
+    user_id = recipes[0].user_id
+    fields = [
+        field.attname for field in Recipe._meta.concrete_fields
+        if not field.primary_key
+    ]
+
+    clones = []
+    with transaction.atomic(using=using):
+        for start in range(0, len(recipes), CLONE_BATCH_SIZE):
+            batch = recipes[start:start + CLONE_BATCH_SIZE]
+            copies = insert_copies(Recipe, [
+                Recipe(**dict(
+                    {name: getattr(recipe, name) for name in fields},
+                    image=recipe.image.name,
+                    **({'title': title} if title else {})
+                ))
+                for recipe in batch
+            ], using)
+            copy_links(
+                {recipe.pk: copy.pk for recipe, copy in zip(batch, copies)},
+                using
+            )
+            states = recipe_states(copies, using)
+            RecipeRevision.objects.using(using).bulk_create([
+                RecipeRevision(user_id=user_id, recipe_id=copy.pk, number=1,
+                               snapshot=states[copy.pk])
+                for copy in copies
+            ])
+            clones.extend(copies)
+
+        changes.record_changes(
+            user_id, Change.RECIPE, [clone.pk for clone in clones], using=using
+        )
+        recipes_cloned.send(
+            sender=Recipe, user_id=user_id, recipes=clones, using=using
+        )
+
+    return clones
@@ -0,0 +1,101 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class GzipEncoder:
+    """ Incremental gzip compressor """
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """ Return everything compressed so far, keeping the stream open """
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """ Incremental Brotli compressor, needs the brotli package """
+    name = 'br'
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(
+            quality=level, mode=brotli.MODE_TEXT
+        )
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def encoders():
+    """ Return the available encoders, most effective first """
+    if brotli is None:
+        return {'gzip': GzipEncoder}
+    return {'br': BrotliEncoder, 'gzip': GzipEncoder}
+
+
+def negotiate(accept_encoding, available):
+    """ Return the first available encoding a client accepts, or None
+
+    `available` is in order of preference; q=0 and wildcards are honoured.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(encoder, data):
+    """ Compress a whole body at once """
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_stream(encoder, chunks, flush_size=0):
+    """ Compress a streamed body, flushing once at least flush_size bytes
+        went in since the last flush
+
+    Every flush ends a compression block and costs ratio, so exports are
+    flushed rarely; a flush_size of 0 flushes every chunk, for bodies
+    clients read as they arrive.
+    """
+    pending = 0
+    for chunk in chunks:
+        data = encoder.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += encoder.flush()
+            pending = 0
+        if data:
+            yield data
+    yield encoder.finish()
@@ -0,0 +1,78 @@
+import json
+
+from django.db import models
+from django.db.models.fields.related_descriptors import \
+    ManyToManyDescriptor
+from django.utils.functional import cached_property
+
+
+class JSONTextField(models.TextField):
+    """ Text column holding a JSON document, usable on every database """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return json.loads(value)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return json.dumps(value)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
+
+
+def owned_related_manager(manager_cls):
+    """ Wrap a many-to-many related manager so the through rows it adds
+        carry the owner of the instance they are added from, and the rows
+        it reads are looked up by that owner too, which keeps the reads of
+        partitioned through tables in the owner's partition """
+
+    class OwnedRelatedManager(manager_cls):
+
+        def __init__(self, instance=None):
+            super().__init__(instance)
+            owner = self.through._meta.get_field(
+                self.target_field_name
+            ).related_query_name()
+            self.core_filters[f'{owner}__user_id'] = instance.user_id
+
+        def add(self, *objs, through_defaults=None):
+            through_defaults = {
+                'user_id': self.instance.user_id, **(through_defaults or {})
+            }
+            super().add(*objs, through_defaults=through_defaults)
+        add.alters_data = True
+
+    return OwnedRelatedManager
+
+
+class OwnedManyToManyDescriptor(ManyToManyDescriptor):
+
+    @cached_property
+    def related_manager_cls(self):
+        return owned_related_manager(super().related_manager_cls)
+
+
+class OwnedManyToManyField(models.ManyToManyField):
+    """ Many-to-many field between objects of one user, whose through model
+        has a `user` column filled in by add(), set() and create() on
+        either side of the relation """
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.name,
+                OwnedManyToManyDescriptor(self.remote_field, reverse=False))
+
+    def contribute_to_related_class(self, cls, related):
+        super().contribute_to_related_class(cls, related)
+        if not self.remote_field.is_hidden() and \
+                not related.related_model._meta.swapped:
+            setattr(cls, related.get_accessor_name(),
+                    OwnedManyToManyDescriptor(self.remote_field, reverse=True))
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.changes import expire_tombstones
+
+
+class Command(BaseCommand):
+    """ Django command to drop old tombstones from the change log """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=settings.CHANGE_LOG_TOMBSTONE_SECONDS,
+            help='Drop tombstones at least this many seconds old'
+        )
+        parser.add_argument(
+            '--database',
+            help='Shard to compact, all of DATABASE_SHARDS by default'
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(seconds=options['older_than'])
+        for shard in [options['database']] if options['database'] \
+                else settings.DATABASE_SHARDS:
+            count = expire_tombstones(before, shard)
+            self.stdout.write(
+                self.style.SUCCESS(f'Dropped {count} tombstones from {shard}')
+            )
@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.test import APIClient
+from core import compression
+from core.models import Recipe
+
+DEFAULT_PATHS = (
+    '/api/recipe/recipes/',
+    '/api/recipe/recipes/{recipe}/',
+    '/api/recipe/tags/',
+    '/api/recipe/ingredients/',
+    '/api/recipe/recipes/stats/',
+    '/api/recipe/changes/',
+)
+
+
+class Command(BaseCommand):
+    """ Django command to measure the CPU cost and the bytes saved by
+        compressing the responses of API endpoints """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email',
+            help='User to fetch as, defaults to the one with most recipes'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Endpoint to measure, may be repeated; {recipe} is '
+                 'replaced with one of the user\'s recipes'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def get_user(self, email):
+        users = get_user_model().objects.all()
+        if email:
+            return users.filter(email=email).first()
+        return users.annotate(
+            recipes=Count('recipe')
+        ).order_by('-recipes').first()
+
+    def measure(self, encoder_class, level, body, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compressed = compression.compress(encoder_class(level), body)
+        return len(compressed), (time.perf_counter() - started) / repeat
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        if user is None:
+            raise CommandError('No user to fetch the endpoints as')
+        recipe = Recipe.objects.filter(user=user).first()
+
+        host = next((
+            host for host in settings.ALLOWED_HOSTS
+            if host != '*' and not host.startswith('.')
+        ), 'localhost')
+        client = APIClient(HTTP_HOST=host)
+        client.force_authenticate(user)
+        self.stdout.write(
+            f"{'endpoint':<40} {'codec':<8} {'bytes':>9} {'saved':>7} "
+            f"{'ms':>8}"
+        )
+        for path in options['paths'] or DEFAULT_PATHS:
+            path = path.format(recipe=recipe.pk if recipe else 0)
+            response = client.get(path, HTTP_ACCEPT_ENCODING='identity')
+            if response.status_code != 200 or response.streaming:
+                self.stdout.write(f'{path:<40} skipped '
+                                  f'({response.status_code})')
+                continue
+            body = response.content
+            self.stdout.write(f"{path:<40} {'none':<8} {len(body):>9}")
+            for name, encoder_class in compression.encoders().items():
+                levels = (1, 4, 6, 9) if name == 'gzip' else (1, 4, 5, 11)
+                for level in levels:
+                    size, seconds = self.measure(
+                        encoder_class, level, body, options['repeat']
+                    )
+                    saved = 1 - size / len(body) if body else 0
+                    self.stdout.write(
+                        f"{'':<40} {f'{name}-{level}':<8} {size:>9} "
+                        f"{saved:>7.1%} {seconds * 1000:>8.3f}"
+                    )
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from core import middleware
+
+
+class Command(BaseCommand):
+    """ Django command to measure the time the middleware stack adds to
+        API requests, with and without the browser middleware bypassed """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/recipe/')
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def stock_middleware(self):
+        """ Return MIDDLEWARE with Django's own browser middleware """
+        stock = []
+        for path in settings.MIDDLEWARE:
+            module, _, name = path.rpartition('.')
+            cls = getattr(middleware, name, None) \
+                if module == 'core.middleware' else None
+            if cls is not None and name.startswith('Browser'):
+                base = cls.__bases__[0]
+                path = f'{base.__module__}.{base.__name__}'
+            stock.append(path)
+        return stock
+
+    def measure(self, path, repeat):
+        host = next((
+            host for host in settings.ALLOWED_HOSTS
+            if host != '*' and not host.startswith('.')
+        ), 'localhost')
+        client = Client(HTTP_HOST=host)
+        # A browser that also uses the admin sends its session cookie
+        client.cookies[settings.SESSION_COOKIE_NAME] = 'x' * 32
+        client.get(path)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            client.get(path)
+        return (time.perf_counter() - started) / repeat
+
+    def handle(self, *args, **options):
+        stacks = (
+            ('stock', self.stock_middleware()),
+            ('scoped', settings.MIDDLEWARE),
+        )
+        # Without rates nothing is throttled, which would cut the run short
+        rest_framework = dict(settings.REST_FRAMEWORK,
+                              DEFAULT_THROTTLE_RATES={})
+        for name, stack in stacks:
+            with override_settings(MIDDLEWARE=stack,
+                                   REST_FRAMEWORK=rest_framework):
+                seconds = self.measure(options['path'], options['repeat'])
+            self.stdout.write(
+                f'{name:<8} {seconds * 1e6:10.1f} us per request'
+            )
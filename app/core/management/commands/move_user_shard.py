@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from core.sharding import UserMove
+
+
+class Command(BaseCommand):
+    """ Django command to move a user's recipes, tags and ingredients to
+        another shard while they keep using them
+
+    The moved rows keep their ids, while change feed cursors expire with
+    410 Gone since the user's change log starts over on the target shard.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('shard', choices=settings.DATABASE_SHARDS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--drain-seconds', type=float, default=5,
+            help='How long requests that started before writes were held '
+                 'off get to finish'
+        )
+        parser.add_argument('--max-rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        user = get_user_model().all_objects.filter(
+            email=options['email']
+        ).first()
+        if user is None:
+            raise CommandError(f"No user with email {options['email']}")
+        if user.shard == options['shard']:
+            raise CommandError(f"The user is already on {options['shard']}")
+
+        UserMove(user, options['shard'], options['batch_size']).run(
+            drain_seconds=options['drain_seconds'],
+            max_rounds=options['max_rounds'],
+            log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {user.email} from {user.shard} to {options['shard']}"
+        ))
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from core.partitioning import PartitioningError, partition_recipe_tables
+
+
+class Command(BaseCommand):
+    """ Django command to hash partition the recipe and recipe link tables
+        by user on PostgreSQL databases
+
+    Their primary keys become (id, user_id) afterwards, so foreign keys
+    added to them by later migrations need a user_id column on the
+    referencing model; the database backend adds it to the constraint.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=16)
+        parser.add_argument(
+            '--database',
+            help='Shard to partition, all of DATABASE_SHARDS by default'
+        )
+
+    def handle(self, *args, **options):
+        if options['partitions'] < 2:
+            raise CommandError('At least 2 partitions are needed')
+
+        for shard in [options['database']] if options['database'] \
+                else settings.DATABASE_SHARDS:
+            vendor = connections[shard].vendor
+            if vendor != 'postgresql':
+                self.stdout.write(
+                    f'{shard} runs on {vendor}, leaving its tables as is'
+                )
+                continue
+            try:
+                tables = partition_recipe_tables(options['partitions'], shard)
+            except PartitioningError as exc:
+                raise CommandError(f'{shard}: {exc}')
+            self.stdout.write(self.style.SUCCESS(
+                f"Partitioned {', '.join(tables)} on {shard}" if tables
+                else f'{shard} is already partitioned'
+            ))
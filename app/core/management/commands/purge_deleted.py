@@ -0,0 +1,52 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    """ Django command to purge soft deleted users, recipes, tags and
+        ingredients in bounded batches """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--grace-seconds', type=int,
+            default=settings.PURGE_GRACE_SECONDS,
+            help='Only purge rows deleted at least this long ago'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Keep running, purging every this many seconds'
+        )
+        parser.add_argument(
+            '--database',
+            help='Shard to purge, all of DATABASE_SHARDS by default'
+        )
+
+    def purge(self, options):
+        before = timezone.now() - timedelta(seconds=options['grace_seconds'])
+        for shard in self.shards(options):
+            counts = purge_deleted(before, options['batch_size'], shard)
+            summary = ', '.join(
+                f'{count} {name}' for name, count in counts.items()
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Purged {summary} from {shard}')
+            )
+
+    def shards(self, options):
+        if options['database']:
+            return [options['database']]
+        return settings.DATABASE_SHARDS
+
+    def handle(self, *args, **options):
+        self.purge(options)
+        while options['interval']:
+            time.sleep(options['interval'])
+            self.purge(options)
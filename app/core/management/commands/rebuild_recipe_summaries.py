@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from core import summaries
+
+
+class Command(BaseCommand):
+    """ Django command to rebuild or check the denormalized recipe
+        tag and ingredient summaries """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report recipes whose summaries are out of date'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=summaries.SUMMARY_BATCH_SIZE
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        batch_size = options['batch_size']
+
+        if options['check']:
+            stale = list(
+                summaries.find_inconsistent_recipes(using, batch_size)
+            )
+            if stale:
+                raise CommandError(
+                    f'{len(stale)} recipe summaries are out of date: '
+                    + ', '.join(str(recipe_id) for recipe_id in stale)
+                )
+            self.stdout.write(self.style.SUCCESS('Recipe summaries are up to date'))
+            return
+
+        count = 0
+        for batch in summaries.iter_recipe_id_batches(using, batch_size):
+            summaries.refresh_recipe_summaries(batch, using)
+            count += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} recipe summaries'))
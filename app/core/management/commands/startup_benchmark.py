@@ -0,0 +1,52 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """ Django command to measure how long fresh processes take to import
+        the project and serve their first request """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', action='append', dest='settings_modules',
+            help='Settings module to compare, may be repeated'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--path', default='/api/recipe/')
+
+    def run_once(self, settings_module, path):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        result = subprocess.run(
+            [sys.executable, '-c',
+             f'from core.startup import measure; measure({path!r})'],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout)
+
+    def handle(self, *args, **options):
+        modules = options['settings_modules'] or [
+            os.environ.get('DJANGO_SETTINGS_MODULE', 'app.settings'),
+            'app.settings_api',
+        ]
+        for settings_module in modules:
+            runs = [
+                self.run_once(settings_module, options['path'])
+                for _ in range(options['repeat'])
+            ]
+            self.stdout.write(self.style.MIGRATE_HEADING(settings_module))
+            for key in ('import', 'warm_up', 'first_request',
+                        'next_request'):
+                median = statistics.median(run[key] for run in runs)
+                self.stdout.write(f'  {key:<14} {median * 1000:8.1f} ms')
+            self.stdout.write(
+                f"  {'modules':<14} {runs[-1]['modules']:8d}"
+                f"{' (Pillow loaded)' if runs[-1]['pillow_loaded'] else ''}"
+            )
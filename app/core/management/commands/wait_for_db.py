@@ -1,19 +1,46 @@
 import time
-from django.db import connections
+from django.db import connections, DEFAULT_DB_ALIAS
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """ Django command to pause execution until dabase is available """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to wait for'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up after this many seconds'
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Upper bound for the delay between two attempts'
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        connection = connections[options['database']]
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while True:
             try:
-                db_conn = connections['default']
+                connection.ensure_connection()
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        'Database unavailable after %s seconds'
+                        % options['timeout']
+                    )
+                wait = min(delay, options['max_delay'], remaining)
+                self.stdout.write(
+                    f'Database unavailable, waiting {wait:.1f} seconds...'
+                )
+                time.sleep(wait)
+                delay *= 2
         self.stdout.write(self.style.SUCCESS('Database available'))
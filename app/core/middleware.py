@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import patch_vary_headers
+from core import compression, routers
+
+
+def is_api_request(request):
+    """ Tell whether a request is for the token authenticated API """
+    return request.path_info.startswith(settings.API_PATH_PREFIXES)
+
+
+def browser_only(middleware_class):
+    """ Return a version of a middleware that API requests bypass
+
+    Sessions, CSRF checks, messages and frame options only matter to the
+    admin and other browser pages; the API authenticates with tokens.
+    Every hook Django may call on the middleware is bypassed, not only
+    __call__, so e.g. CSRF checks made in process_view are skipped too.
+    """
+
+    class BrowserOnlyMiddleware(middleware_class):
+
+        def __call__(self, request):
+            if is_api_request(request):
+                return self.get_response(request)
+            return super().__call__(request)
+
+    for hook in ('process_view', 'process_exception',
+                 'process_template_response'):
+        if hasattr(middleware_class, hook):
+            setattr(BrowserOnlyMiddleware, hook,
+                    _skip_api(getattr(middleware_class, hook)))
+
+    name = f'Browser{middleware_class.__name__}'
+    BrowserOnlyMiddleware.__name__ = BrowserOnlyMiddleware.__qualname__ = name
+    return BrowserOnlyMiddleware
+
+
+def _skip_api(hook):
+    """ Wrap a middleware hook so it does nothing for API requests """
+
+    def method(self, request, *args, **kwargs):
+        if is_api_request(request):
+            # process_template_response must hand the response back
+            return args[0] if hook.__name__ == 'process_template_response' \
+                else None
+        return hook(self, request, *args, **kwargs)
+
+    return method
+
+
+BrowserSessionMiddleware = browser_only(SessionMiddleware)
+BrowserCsrfViewMiddleware = browser_only(CsrfViewMiddleware)
+BrowserAuthenticationMiddleware = browser_only(AuthenticationMiddleware)
+BrowserMessageMiddleware = browser_only(MessageMiddleware)
+BrowserXFrameOptionsMiddleware = browser_only(XFrameOptionsMiddleware)
+
+
+class ReplicaRoutingMiddleware:
+    """ Expose the current request to the replica router and pin the
+        reads of users who just wrote to the primary """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.set_current_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.clear_current_request()
+
+        if request.method not in routers.SAFE_METHODS and \
+                response.status_code < 400:
+            user_id = routers.request_user_id(request)
+            if user_id is not None:
+                routers.pin_user_to_primary(user_id)
+
+        return response
+
+
+class CompressionMiddleware:
+    """ Compress responses with Brotli or gzip, whichever the client
+        accepts and is available
+
+    Bodies smaller than COMPRESSION_MIN_SIZE bytes, responses that are
+    already encoded and content types starting with one of
+    COMPRESSION_SKIP_TYPES are sent as they are. Streaming responses are
+    flushed every COMPRESSION_STREAM_FLUSH_SIZE bytes, or every chunk for
+    content types starting with one of COMPRESSION_FLUSH_CHUNK_TYPES.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encoders = compression.encoders()
+        self.levels = {
+            'br': settings.COMPRESSION_BROTLI_QUALITY,
+            'gzip': settings.COMPRESSION_GZIP_LEVEL,
+        }
+
+    def skip(self, response):
+        if response.has_header('Content-Encoding'):
+            return True
+        content_type = response.get('Content-Type', '').lower()
+        if content_type.startswith(settings.COMPRESSION_SKIP_TYPES):
+            return True
+        return not response.streaming and \
+            len(response.content) < settings.COMPRESSION_MIN_SIZE
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if self.skip(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encoders
+        )
+        if encoding is None:
+            return response
+        encoder = self.encoders[encoding](self.levels[encoding])
+
+        if response.streaming:
+            content_type = response.get('Content-Type', '').lower()
+            flush_size = settings.COMPRESSION_STREAM_FLUSH_SIZE
+            if content_type.startswith(settings.COMPRESSION_FLUSH_CHUNK_TYPES):
+                flush_size = 0
+            response.streaming_content = compression.compress_stream(
+                encoder, response.streaming_content, flush_size
+            )
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(encoder, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # A compressed body is no longer byte-for-byte the tagged one
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.14 on 2026-10-19 05:13
+
+import core.fields
+from django.db import migrations, models
+
+
+def populate_summaries(apps, schema_editor):
+    """ Fill the summaries of the recipes that already exist """
+    Recipe = apps.get_model('core', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    for field, summary, column in (('tags', 'tag_list', 'tag'),
+                                   ('ingredients', 'ingredient_list',
+                                    'ingredient')):
+        through = Recipe._meta.get_field(field).remote_field.through
+        values = {}
+        rows = through.objects.using(db_alias).values_list(
+            'recipe_id', f'{column}_id', f'{column}__name'
+        ).order_by(f'{column}_id')
+        for recipe_id, target_id, name in rows:
+            values.setdefault(recipe_id, []).append([target_id, name])
+        for recipe_id, items in values.items():
+            Recipe.objects.using(db_alias).filter(id=recipe_id).update(
+                **{summary: items}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_list',
+            field=core.fields.JSONTextField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_list',
+            field=core.fields.JSONTextField(default=list, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
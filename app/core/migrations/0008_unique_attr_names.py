@@ -0,0 +1,69 @@
+# Generated by Django 3.0.14 on 2026-10-19 05:17
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """ Merge tags and ingredients sharing a name for the same user into
+        the oldest one, moving their recipe links over """
+    Recipe = apps.get_model('core', 'Recipe')
+    db_alias = schema_editor.connection.alias
+    for model_name, field, summary in (('Tag', 'tags', 'tag_list'),
+                                       ('Ingredient', 'ingredients',
+                                        'ingredient_list')):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field).remote_field.through
+        column = f'{model_name.lower()}_id'
+        duplicates = model.objects.using(db_alias).values(
+            'user_id', 'name'
+        ).annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+
+        touched = set()
+        for duplicate in duplicates:
+            others = list(model.objects.using(db_alias).filter(
+                user_id=duplicate['user_id'], name=duplicate['name']
+            ).exclude(id=duplicate['keep']).values_list('id', flat=True))
+            links = through.objects.using(db_alias).filter(
+                **{f'{column}__in': others}
+            )
+            recipe_ids = set(links.values_list('recipe_id', flat=True))
+            linked = set(through.objects.using(db_alias).filter(
+                **{column: duplicate['keep']}
+            ).values_list('recipe_id', flat=True))
+            through.objects.using(db_alias).bulk_create([
+                through(recipe_id=recipe_id, **{column: duplicate['keep']})
+                for recipe_id in recipe_ids - linked
+            ])
+            links.delete()
+            model.objects.using(db_alias).filter(id__in=others).delete()
+            touched |= recipe_ids
+
+        for recipe_id in touched:
+            items = list(through.objects.using(db_alias).filter(
+                recipe_id=recipe_id
+            ).order_by(column).values_list(
+                column, f'{model_name.lower()}__name'
+            ))
+            Recipe.objects.using(db_alias).filter(id=recipe_id).update(
+                **{summary: [list(item) for item in items]}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_ingredient_name_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='unique_tag_name_per_user'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.0.14 on 2026-10-19 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_change_log(apps, schema_editor):
+    """ Log every live object so clients can sync from cursor 0 """
+    Change = apps.get_model('core', 'Change')
+    db_alias = schema_editor.connection.alias
+    for model_name in ('recipe', 'tag', 'ingredient'):
+        model = apps.get_model('core', model_name)
+        rows = model.objects.using(db_alias).filter(
+            deleted_at__isnull=True
+        ).values_list('user_id', 'id').order_by('id')
+        Change.objects.using(db_alias).bulk_create(
+            (Change(user_id=user_id, model=model_name, object_id=object_id,
+                    action='upsert') for user_id, object_id in rows.iterator()),
+            batch_size=1000
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='changes_horizon',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'id'], name='change_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'model', 'object_id'], name='change_object_idx'),
+        ),
+        migrations.RunPython(populate_change_log, migrations.RunPython.noop),
+    ]
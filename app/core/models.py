@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
+from core.fields import JSONTextField, OwnedManyToManyField
+from core import routers
 import uuid
 import os
 
@@ -14,6 +18,31 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('upload/recipe/', filename)
 
 
+class SoftDeleteManager(models.Manager):
+    """ Manager hiding soft deleted rows """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SoftDeleteModel(models.Model):
+    """ Model whose rows are flagged as deleted and purged later by the
+        purge_deleted command """
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                      editable=False)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def soft_delete(self):
+        """ Hide the object until it gets purged """
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+
 class UserManager(BaseUserManager):
     """ We create our UserManager class extend from BaseUserManager"""
     """ We add '**extra_fields' fields that provide us pass extra fields for this function"""
@@ -22,7 +51,9 @@ class UserManager(BaseUserManager):
         """ Create and save a new user """
         if not email:
             raise ValueError('Users must have email address')
-        user = self.model(email=self.normalize_email(email), **extra_fields)
+        email = self.normalize_email(email)
+        extra_fields.setdefault('shard', routers.pick_shard(email))
+        user = self.model(email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
 
@@ -37,6 +68,10 @@ class UserManager(BaseUserManager):
 
         return user
 
+    def get_queryset(self):
+        """ Hide soft deleted users """
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     """ Custom user model that supports using email instead of username """
@@ -44,54 +79,274 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                      editable=False)
 
     """ For creating a new user manager for our object """
     objects = UserManager()
+    all_objects = models.Manager()
 
     """ By default the username field is
         username and we're customizing that to email
         so we can use an email address. """
     USERNAME_FIELD = 'email'
 
+    """ Highest change id whose tombstones were expired; clients syncing
+        from an older cursor have to start over """
+    changes_horizon = models.BigIntegerField(default=0, editable=False)
+    """ Bumped when the change log is rebuilt, e.g. after moving shards,
+        which invalidates every cursor handed out before """
+    changes_epoch = models.IntegerField(default=0, editable=False)
+
+    """ Database holding the user's recipes, tags and ingredients, and
+        whether writes to them are held off while they are moved """
+    shard = models.CharField(max_length=64, default='default',
+                             editable=False)
+    shard_frozen = models.BooleanField(default=False, editable=False)
+
+    def soft_delete(self):
+        """ Deactivate the user and log them out everywhere; their data
+            is removed later by the purge_deleted command """
+        from rest_framework.authtoken.models import Token
+
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            self.is_active = False
+            self.save(update_fields=['deleted_at', 'is_active'])
+            Token.objects.filter(user=self).delete()
 
-class Tag(models.Model):
+
+class Tag(SoftDeleteModel):
     """ Tag to be used for a recipe """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='tag_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    condition=Q(deleted_at__isnull=True),
+                                    name='unique_tag_name_per_user'),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(SoftDeleteModel):
     """ Ingredient to be used for recipe """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='ingredient_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'],
+                                    condition=Q(deleted_at__isnull=True),
+                                    name='unique_ingredient_name_per_user'),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
-    """ Recipe objects """
+class Recipe(SoftDeleteModel):
+    """ Recipe objects
+
+    Like tags and ingredients, recipes may live on another database than
+    their user, see core.routers.ShardRouter, hence the user foreign keys
+    without database constraints.
+    """
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False
     )
 
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    ingredients = models.ManyToManyField('Ingredient')
-    tags = models.ManyToManyField('Tag')
+    ingredients = OwnedManyToManyField('Ingredient',
+                                       through='RecipeIngredient')
+    tags = OwnedManyToManyField('Tag', through='RecipeTag')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
+    """ Denormalized [id, name] pairs of the tags and ingredients, kept up
+        to date by core.signals so lists are served from this table only """
+    tag_list = JSONTextField(default=list, editable=False)
+    ingredient_list = JSONTextField(default=list, editable=False)
+
+    SUMMARY_FIELDS = ('tag_list', 'ingredient_list')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            models.Index(fields=['title'], name='recipe_title_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        """ Save the recipe without overwriting the summaries, which may
+            have changed since this instance was loaded """
+        if not self._state.adding and not args and \
+                kwargs.get('update_fields') is None and \
+                not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in self.SUMMARY_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class RecipeLink(models.Model):
+    """ Row of a recipe many-to-many table
+
+    The owner of the recipe is repeated on every row so the tables can be
+    partitioned by user like core_recipe, see the partition_recipes
+    command, and queries of one user only read that user's partition. It
+    leads the indexes of the tables rather than having one of its own.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_index=False,
+        related_name='+'
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+
+    class Meta:
+        abstract = True
+
+
+class RecipeTag(RecipeLink):
+    """ Tag of a recipe """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        unique_together = [('recipe', 'tag')]
+        indexes = [
+            # Covers the recipes of a user having some tags
+            models.Index(fields=['user', 'tag', 'recipe'],
+                         name='recipetag_user_tag_idx'),
+        ]
+
+
+class RecipeIngredient(RecipeLink):
+    """ Ingredient of a recipe, with its place in the recipe's list and
+        the amount needed """
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+    quantity = models.DecimalField(max_digits=8, decimal_places=2,
+                                   null=True, blank=True)
+    unit = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        db_table = 'core_recipe_ingredients'
+        unique_together = [('recipe', 'ingredient')]
+        indexes = [
+            # Covers the recipes of a user using some ingredients
+            models.Index(fields=['user', 'ingredient', 'recipe'],
+                         name='recipeingr_user_ingr_idx'),
+            # Serves the ingredients of recipes in their order
+            models.Index(fields=['recipe', 'position'],
+                         name='recipeingr_recipe_pos_idx'),
+        ]
+
+
+class RecipeRevision(models.Model):
+    """ Revision of a recipe, see core.revisions
+
+    Revisions store what changed since the previous one. Every few
+    revisions also store the whole recipe, so rebuilding any version
+    reads a bounded number of rows.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_index=False,
+        related_name='+'
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='revisions')
+    number = models.PositiveIntegerField()
+    delta = JSONTextField(null=True)
+    snapshot = JSONTextField(null=True)
+    # Not auto_now_add, so moved revisions keep their date
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        unique_together = [('recipe', 'number')]
+
+    def __str__(self):
+        return f'{self.recipe_id}#{self.number}'
+
+
+class Change(models.Model):
+    """ Entry of a user's change log, read by syncing clients
+
+    Only the latest entry of each object is kept, so the log holds one row
+    per live object plus the tombstones of deleted ones.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    MODEL_CHOICES = (
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    )
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = (
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    """ Deleting a user deletes their objects first, and logging those
+        deletions must not trip over the user going away; core.signals
+        drops the log once the user is gone """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False
+    )
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=8, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='change_user_id_idx'),
+            models.Index(fields=['user', 'model', 'object_id'],
+                         name='change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.model} {self.object_id}'
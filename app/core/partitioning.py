@@ -0,0 +1,206 @@
+import re
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from core.models import Recipe, RecipeTag, RecipeIngredient
+
+""" Models whose tables are hash partitioned by their owner """
+PARTITIONED_MODELS = (Recipe, RecipeTag, RecipeIngredient)
+
+""" Once partitioned, the primary key of these tables is (id, user_id): their
+    rows are looked up by user as well to read a single partition, and
+    foreign keys to them include user_id, see
+    core.backends.postgresql.schema """
+PARTITION_KEY = 'user_id'
+
+""" Hash partitions and primary keys on partitioned tables need PostgreSQL
+    11, foreign keys referencing partitioned tables PostgreSQL 12 """
+MIN_POSTGRESQL_VERSION = 120000
+
+UNIQUE_RE = re.compile(r'^UNIQUE \((?P<columns>[^)]*)\)(?P<rest>.*)$')
+FOREIGN_KEY_RE = re.compile(
+    r'^FOREIGN KEY \((?P<columns>[^)]*)\) '
+    r'REFERENCES (?P<table>[^(]+)\((?P<targets>[^)]*)\)(?P<rest>.*)$'
+)
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _table_name(name):
+    return name.split('.')[-1].strip('"')
+
+
+def partitioned_definition(definition, partitioned_tables):
+    """ Rewrite a unique or foreign key constraint for partitioned tables
+
+    Unique constraints of a partitioned table have to include the
+    partition key, and so do foreign keys to one.
+    """
+    match = UNIQUE_RE.match(definition)
+    if match:
+        columns = match['columns']
+        if PARTITION_KEY not in columns.split(', '):
+            columns = f'{columns}, {PARTITION_KEY}'
+        return f"UNIQUE ({columns}){match['rest']}"
+
+    match = FOREIGN_KEY_RE.match(definition)
+    if match and _table_name(match['table']) in partitioned_tables:
+        return (
+            f"FOREIGN KEY ({match['columns']}, {PARTITION_KEY}) "
+            f"REFERENCES {match['table']}({match['targets']}, "
+            f"{PARTITION_KEY}){match['rest']}"
+        )
+    return definition
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table p '
+        'JOIN pg_class c ON c.oid = p.partrelid '
+        'WHERE c.oid = to_regclass(%s)', [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def _describe(cursor, table):
+    """ Return what has to be recreated on the partitioned table """
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id')", [table]
+    )
+    sequence = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'p'", [table]
+    )
+    primary_key = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f')", [table]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_indexdef(i.indexrelid), i.indisunique FROM pg_index i '
+        'WHERE i.indrelid = %s::regclass AND NOT EXISTS ('
+        '    SELECT 1 FROM pg_constraint c'
+        '    WHERE c.conrelid = i.indrelid AND c.conindid = i.indexrelid'
+        ')', [table]
+    )
+    indexes = cursor.fetchall()
+    for definition, unique in indexes:
+        if unique:
+            raise PartitioningError(
+                f'Unique index without constraint on {table}: {definition}'
+            )
+    return sequence, primary_key, constraints, [row[0] for row in indexes]
+
+
+def _referencing(cursor, tables):
+    """ Return the foreign keys from other tables to the given ones """
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+        "FROM pg_constraint WHERE contype = 'f' "
+        "AND confrelid = ANY(%s::regclass[]) "
+        "AND NOT conrelid = ANY(%s::regclass[])", [tables, tables]
+    )
+    foreign_keys = cursor.fetchall()
+    for table, name, definition in foreign_keys:
+        cursor.execute(
+            'SELECT 1 FROM information_schema.columns '
+            'WHERE table_name = %s AND column_name = %s',
+            [_table_name(table), PARTITION_KEY]
+        )
+        if cursor.fetchone() is None:
+            raise PartitioningError(
+                f'{table} references a partitioned table through {name} '
+                f'but has no {PARTITION_KEY} column'
+            )
+    return foreign_keys
+
+
+def partition_recipe_tables(partitions, using=DEFAULT_DB_ALIAS):
+    """ Hash partition the recipe tables of a PostgreSQL database by user
+
+    Each table is renamed, recreated as a partitioned table with the same
+    columns, filled from the old one and given back its constraints and
+    indexes, all in one transaction holding exclusive locks: run it in a
+    maintenance window. Returns the tables partitioned, none if they
+    already were.
+    """
+    connection = connections[using]
+    if connection.pg_version < MIN_POSTGRESQL_VERSION:
+        raise PartitioningError(
+            f'PostgreSQL 12 or later is needed, {using} runs '
+            f'{connection.pg_version // 10000}'
+        )
+    quote = connection.ops.quote_name
+    tables = [model._meta.db_table for model in PARTITIONED_MODELS]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        done = [table for table in tables if is_partitioned(cursor, table)]
+        if len(done) == len(tables):
+            return []
+        if done:
+            raise PartitioningError(
+                f"Only {', '.join(done)} of {', '.join(tables)} are "
+                f"partitioned"
+            )
+
+        cursor.execute(
+            f"LOCK TABLE {', '.join(map(quote, tables))} "
+            f"IN ACCESS EXCLUSIVE MODE"
+        )
+        described = {table: _describe(cursor, table) for table in tables}
+        referencing = _referencing(cursor, tables)
+
+        for table in tables:
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} '
+                f'RENAME TO {quote(table + "_unpartitioned")}'
+            )
+        for table in tables:
+            old = quote(table + '_unpartitioned')
+            cursor.execute(
+                f'CREATE TABLE {quote(table)} (LIKE {old} INCLUDING DEFAULTS '
+                f'INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+                f'PARTITION BY HASH ({PARTITION_KEY})'
+            )
+            for remainder in range(partitions):
+                cursor.execute(
+                    f'CREATE TABLE {quote(f"{table}_p{remainder}")} '
+                    f'PARTITION OF {quote(table)} FOR VALUES WITH '
+                    f'(MODULUS {partitions}, REMAINDER {remainder})'
+                )
+            cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {old}')
+            cursor.execute(
+                f'ALTER SEQUENCE {described[table][0]} '
+                f'OWNED BY {quote(table)}.id'
+            )
+        cursor.execute(
+            f"DROP TABLE "
+            f"{', '.join(quote(table + '_unpartitioned') for table in tables)} "
+            f"CASCADE"
+        )
+
+        for table in tables:
+            _, primary_key, constraints, indexes = described[table]
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(primary_key)} '
+                f'PRIMARY KEY (id, {PARTITION_KEY})'
+            )
+            for name, definition in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} '
+                    f'{partitioned_definition(definition, tables)}'
+                )
+            for definition in indexes:
+                cursor.execute(definition)
+        for table, name, definition in referencing:
+            cursor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {quote(name)} '
+                f'{partitioned_definition(definition, tables)}'
+            )
+        for table in tables:
+            cursor.execute(f'ANALYZE {quote(table)}')
+
+    return tables
@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from core.caches import shared_cache
+
+
+""" Message handed to subscribers that fell behind and lost messages """
+RESYNC = ('resync', {})
+
+_brokers = {}
+
+
+class LocalSubscription:
+    """ Queue of the messages published to one user in this process """
+
+    def __init__(self, broker, user_id, size):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(size)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """ Wait for the next message, returning None on timeout """
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return RESYNC
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """ Deliver messages to subscribers in the current process only
+
+    Publishing never blocks: a subscriber whose queue is full is told to
+    resync instead of holding back the request that published.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, user_id, event, data):
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.put((event, data))
+
+    def subscribe(self, user_id):
+        subscription = LocalSubscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.user_id, None)
+
+
+class CacheSubscription:
+    """ Reader of a user's message sequence in a shared cache """
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.key = broker.key(user_id)
+        self.last = broker.cache.get(self.key, 0)
+        self.pending = []
+
+    def get(self, timeout):
+        """ Poll for the next message, returning None on timeout """
+        deadline = time.monotonic() + timeout
+        while not self.pending:
+            self.fetch()
+            remaining = deadline - time.monotonic()
+            if self.pending or remaining <= 0:
+                break
+            time.sleep(min(self.broker.poll_interval, remaining))
+        return self.pending.pop(0) if self.pending else None
+
+    def fetch(self):
+        seq = self.broker.cache.get(self.key, 0)
+        if seq <= self.last:
+            return
+        numbers = range(self.last + 1, seq + 1)
+        keys = [f'{self.key}:{number}' for number in numbers]
+        self.last = seq
+        if len(keys) > self.broker.queue_size:
+            self.pending = [RESYNC]
+            return
+        messages = self.broker.cache.get_many(keys)
+        if len(messages) < len(keys):
+            self.pending = [RESYNC]
+            return
+        self.pending = [messages[key] for key in keys]
+
+    def close(self):
+        pass
+
+
+class CacheBroker:
+    """ Deliver messages between processes through a shared Django cache
+
+    Each user has a counter and one cache entry per message; subscribers
+    poll the counter every `poll_interval` seconds. The cache must be
+    shared by every process, ImproperlyConfigured is raised otherwise.
+    """
+    queue_size = 100
+    poll_interval = 1
+    message_ttl = 60
+
+    def __init__(self, alias='default'):
+        self.cache = shared_cache(alias)
+
+    def key(self, user_id):
+        return f'pubsub:{user_id}'
+
+    def publish(self, user_id, event, data):
+        key = self.key(user_id)
+        self.cache.add(key, 0, None)
+        seq = self.cache.incr(key)
+        self.cache.set(f'{key}:{seq}', (event, data), self.message_ttl)
+
+    def subscribe(self, user_id):
+        return CacheSubscription(self, user_id)
+
+
+def get_broker():
+    """ Return the broker configured by PUBSUB_BROKER """
+    path = settings.PUBSUB_BROKER
+    broker = _brokers.get(path)
+    if broker is None:
+        broker = _brokers.setdefault(path, import_string(path)())
+    return broker
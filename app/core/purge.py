@@ -0,0 +1,116 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction, DEFAULT_DB_ALIAS
+from core.models import Change, Recipe, RecipeRevision, Tag, Ingredient
+
+
+def _batches(queryset, batch_size):
+    """ Yield lists of primary keys of a queryset until it is empty
+
+    Rows are deleted between two batches, so the first page is read again
+    each time.
+    """
+    while True:
+        batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+
+
+def _through(field):
+    return Recipe._meta.get_field(field).remote_field.through
+
+
+def purge_recipes(recipe_ids, using=DEFAULT_DB_ALIAS, delete_images=True):
+    """ Delete recipes, their links, revisions and images with raw deletes
+
+    Images are kept with `delete_images=False`, for recipes that live on
+    as copies elsewhere, and when cloned recipes still use them.
+    """
+    images = set()
+    if delete_images:
+        images = set(
+            Recipe.all_objects.using(using).filter(id__in=recipe_ids)
+            .exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True)
+        )
+        images.difference_update(
+            Recipe.all_objects.using(using).filter(image__in=images)
+            .exclude(id__in=recipe_ids).values_list('image', flat=True)
+        )
+    with transaction.atomic(using=using):
+        for field in ('tags', 'ingredients'):
+            _through(field).objects.using(using).filter(
+                recipe_id__in=recipe_ids
+            )._raw_delete(using)
+        RecipeRevision.objects.using(using).filter(
+            recipe_id__in=recipe_ids
+        )._raw_delete(using)
+        Recipe.all_objects.using(using).filter(
+            id__in=recipe_ids
+        )._raw_delete(using)
+
+    for name in images:
+        default_storage.delete(name)
+
+    return len(recipe_ids)
+
+
+def purge_recipe_attrs(model, field, ids, using=DEFAULT_DB_ALIAS):
+    """ Delete tags or ingredients and their links with raw deletes """
+    column = f'{model._meta.model_name}_id'
+    with transaction.atomic(using=using):
+        _through(field).objects.using(using).filter(
+            **{f'{column}__in': ids}
+        )._raw_delete(using)
+        model.all_objects.using(using).filter(id__in=ids)._raw_delete(using)
+
+    return len(ids)
+
+
+def purge_user(user, batch_size, using=DEFAULT_DB_ALIAS):
+    """ Delete a user and everything they own on the shard `using`, in
+        bounded batches """
+    from rest_framework.authtoken.models import Token
+
+    recipes = Recipe.all_objects.using(using).filter(user=user)
+    for batch in _batches(recipes, batch_size):
+        purge_recipes(batch, using)
+    for model, field in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+        rows = model.all_objects.using(using).filter(user=user)
+        for batch in _batches(rows, batch_size):
+            purge_recipe_attrs(model, field, batch, using)
+    Change.objects.using(using).filter(user=user)._raw_delete(using)
+    Token.objects.using(DEFAULT_DB_ALIAS).filter(user=user)._raw_delete(
+        DEFAULT_DB_ALIAS
+    )
+
+    # Nothing heavy is left, so the regular cascade is cheap now
+    user.delete(using=DEFAULT_DB_ALIAS)
+
+
+def purge_deleted(before, batch_size, using=DEFAULT_DB_ALIAS):
+    """ Purge everything soft deleted before a given time from a shard,
+        including the users whose data lives there
+
+    Return the number of users, recipes, tags and ingredients purged.
+    """
+    counts = {'users': 0, 'recipes': 0, 'tags': 0, 'ingredients': 0}
+
+    users = get_user_model().all_objects.using(DEFAULT_DB_ALIAS).filter(
+        deleted_at__lt=before, shard=using
+    )
+    for user in users.iterator():
+        purge_user(user, batch_size, using)
+        counts['users'] += 1
+
+    recipes = Recipe.all_objects.using(using).filter(deleted_at__lt=before)
+    for batch in _batches(recipes, batch_size):
+        counts['recipes'] += purge_recipes(batch, using)
+
+    for model, field in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+        rows = model.all_objects.using(using).filter(deleted_at__lt=before)
+        for batch in _batches(rows, batch_size):
+            counts[field] += purge_recipe_attrs(model, field, batch, using)
+
+    return counts
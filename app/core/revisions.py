@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.db.models import Subquery
+from core.models import RecipeRevision, RecipeTag, RecipeIngredient
+
+""" Recipe fields kept in revisions, besides tags and ingredients """
+FIELDS = ('title', 'time_minutes', 'price', 'link', 'image')
+
+
+def recipe_states(recipes, using):
+    """ Return recipes as stored in revisions, keyed by id
+
+    Tags are a sorted list of ids and ingredients map their id, as a
+    string, to their position, quantity and unit. The links of all the
+    recipes are read with one query per table.
+    """
+    states = {}
+    for recipe in recipes:
+        state = states[recipe.pk] = {
+            name: getattr(recipe, name) for name in FIELDS
+        }
+        state['price'] = str(state['price'])
+        state['image'] = state['image'].name or ''
+        state['tags'] = []
+        state['ingredients'] = {}
+
+    tags = RecipeTag.objects.using(using).filter(
+        recipe_id__in=states
+    ).values_list('recipe_id', 'tag_id').order_by('tag_id')
+    for recipe_id, tag_id in tags:
+        states[recipe_id]['tags'].append(tag_id)
+
+    ingredients = RecipeIngredient.objects.using(using).filter(
+        recipe_id__in=states
+    ).values_list('recipe_id', 'ingredient_id', 'position', 'quantity',
+                  'unit')
+    for recipe_id, ingredient_id, position, quantity, unit in ingredients:
+        states[recipe_id]['ingredients'][str(ingredient_id)] = [
+            position, None if quantity is None else str(quantity), unit
+        ]
+
+    return states
+
+
+def recipe_state(recipe):
+    """ Return a recipe as stored in revisions """
+    return recipe_states([recipe], recipe._state.db)[recipe.pk]
+
+
+def diff(old, new):
+    """ Return the delta turning one state into another """
+    delta = {
+        name: new[name] for name in FIELDS if old.get(name) != new[name]
+    }
+
+    added = sorted(set(new['tags']) - set(old['tags']))
+    removed = sorted(set(old['tags']) - set(new['tags']))
+    if added or removed:
+        delta['tags'] = {'add': added, 'remove': removed}
+
+    changed = {
+        key: value for key, value in new['ingredients'].items()
+        if old['ingredients'].get(key) != value
+    }
+    removed = sorted(set(old['ingredients']) - set(new['ingredients']))
+    if changed or removed:
+        delta['ingredients'] = {'set': changed, 'remove': removed}
+
+    return delta
+
+
+def apply(state, delta):
+    """ Return the state a delta turns a state into """
+    state = dict(state, **{
+        name: value for name, value in delta.items() if name in FIELDS
+    })
+    if 'tags' in delta:
+        tags = set(state['tags']).union(delta['tags']['add'])
+        state['tags'] = sorted(tags.difference(delta['tags']['remove']))
+    if 'ingredients' in delta:
+        ingredients = dict(state['ingredients'], **delta['ingredients']['set'])
+        for key in delta['ingredients']['remove']:
+            ingredients.pop(key, None)
+        state['ingredients'] = ingredients
+
+    return state
+
+
+def revision_chain(recipe, number=None):
+    """ Return the revisions to rebuild a version from, latest snapshot
+        first, with one query """
+    revisions = RecipeRevision.objects.using(recipe._state.db).filter(
+        recipe_id=recipe.pk
+    )
+    if number is not None:
+        revisions = revisions.filter(number__lte=number)
+    start = revisions.filter(
+        snapshot__isnull=False
+    ).order_by('-number').values('number')[:1]
+
+    return list(revisions.filter(number__gte=Subquery(start)).order_by('number'))
+
+
+def rebuild(chain):
+    """ Return the state of the last revision of a chain """
+    state = chain[0].snapshot
+    for revision in chain[1:]:
+        state = apply(state, revision.delta)
+    return state
+
+
+def get_version(recipe, number):
+    """ Return a revision of a recipe with its state, or None """
+    chain = revision_chain(recipe, number)
+    if not chain or chain[-1].number != number:
+        return None
+    return chain[-1], rebuild(chain)
+
+
+def record_revision(recipe):
+    """ Store the changes made to a recipe since its last revision
+
+    Call it in the transaction changing the recipe, after the recipe row
+    is written: the row lock keeps concurrent edits from taking the same
+    revision number. Return the revision, None if nothing changed.
+    """
+    state = recipe_state(recipe)
+    chain = revision_chain(recipe)
+    revision = RecipeRevision(
+        user_id=recipe.user_id, recipe_id=recipe.pk, number=1
+    )
+    if not chain:
+        revision.snapshot = state
+    else:
+        revision.delta = diff(rebuild(chain), state)
+        if not revision.delta:
+            return None
+        revision.number = chain[-1].number + 1
+        if len(chain) >= settings.RECIPE_REVISION_SNAPSHOT_INTERVAL:
+            revision.snapshot = state
+
+    revision.save(using=recipe._state.db)
+    return revision
@@ -0,0 +1,277 @@
+import itertools
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.utils import OperationalError
+from django.utils.functional import LazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+from core.caches import shared_cache
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+_health = {}
+_counter = itertools.count()
+
+
+def set_current_request(request):
+    """ Make the request being served visible to the routers """
+    _state.request = request
+    _state.pinned = None
+    _state.placements = None
+
+
+def clear_current_request():
+    """ Forget the request once it has been served """
+    _state.request = None
+    _state.pinned = None
+    _state.placements = None
+
+
+def request_user(request):
+    """ Return the request user without triggering a lookup """
+    # DRF stores the authenticated user on the Django request, while
+    # AuthenticationMiddleware leaves a lazy object we must not evaluate
+    # here since evaluating it would query the database through the router.
+    user = request.__dict__.get('user')
+    if isinstance(user, LazyObject):
+        user = user._wrapped
+        if user is empty:
+            return None
+    return user
+
+
+def request_user_id(request):
+    """ Return the id of the request user without triggering a lookup """
+    return getattr(request_user(request), 'pk', None)
+
+
+def pin_key(user_id):
+    """ Return the cache key marking a user as a recent writer """
+    return f'replica-pin:{user_id}'
+
+
+def pin_user_to_primary(user_id):
+    """ Send the reads of a user to the primary for a short while
+
+    The pin is kept in REPLICA_PIN_CACHE, which must be shared by every
+    process so that the next request of the user sees it wherever it is
+    served; ImproperlyConfigured is raised otherwise.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return
+    shared_cache(settings.REPLICA_PIN_CACHE).set(
+        pin_key(user_id), True, settings.REPLICA_PIN_SECONDS
+    )
+
+
+def is_healthy(alias):
+    """ Check that a replica accepts connections, caching the answer """
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and checked[1] > now:
+        return checked[0]
+
+    try:
+        connections[alias].ensure_connection()
+        healthy = True
+    except OperationalError:
+        healthy = False
+    _health[alias] = (healthy, now + settings.REPLICA_HEALTH_CHECK_INTERVAL)
+
+    return healthy
+
+
+class ReplicaRouter:
+    """ Send reads of safe requests to replicas and everything else to
+        the primary database """
+
+    def _use_primary(self, model):
+        request = getattr(_state, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return True
+        if model._meta.label_lower in settings.REPLICA_PRIMARY_MODELS:
+            return True
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+
+        if _state.pinned is None:
+            user_id = request_user_id(request)
+            if user_id is None:
+                return False
+            pins = shared_cache(settings.REPLICA_PIN_CACHE)
+            _state.pinned = bool(pins.get(pin_key(user_id)))
+
+        return _state.pinned
+
+    def _choose_replica(self, replicas):
+        start = next(_counter)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if is_healthy(alias):
+                return alias
+
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or self._use_primary(model):
+            return DEFAULT_DB_ALIAS
+
+        return self._choose_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Objects related to rows of another database, such as a shard
+        # being migrated, are written next to them
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and \
+                instance._state.db not in settings.DATABASE_REPLICAS:
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ShardMoving(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Your recipes are being moved, try again shortly.')
+    default_code = 'shard_moving'
+
+    def __init__(self):
+        super().__init__()
+        self.wait = settings.SHARD_MOVE_RETRY_AFTER
+
+
+def pick_shard(key):
+    """ Return the shard a new user identified by a key is placed on """
+    shards = settings.DATABASE_SHARDS
+    return shards[zlib.crc32(key.encode()) % len(shards)]
+
+
+def user_placement(user_id):
+    """ Return the shard of a user and whether it is frozen for a move
+
+    Answers are remembered until the current request or `for_user` block
+    ends, so a move is noticed by the next request of every process.
+    """
+    placements = getattr(_state, 'placements', None)
+    if placements is not None and user_id in placements:
+        return placements[user_id]
+
+    from django.contrib.auth import get_user_model
+
+    placement = get_user_model().all_objects.using(
+        DEFAULT_DB_ALIAS
+    ).filter(pk=user_id).values_list(
+        'shard', 'shard_frozen'
+    ).first() or (DEFAULT_DB_ALIAS, False)
+    if getattr(_state, 'request', None) is not None or \
+            getattr(_state, 'user_id', None) is not None:
+        if placements is None:
+            placements = _state.placements = {}
+        placements[user_id] = placement
+    return placement
+
+
+def shard_for_user_id(user_id):
+    """ Return the shard holding the data of a user """
+    if len(settings.DATABASE_SHARDS) < 2:
+        return DEFAULT_DB_ALIAS
+    return user_placement(user_id)[0]
+
+
+@contextmanager
+def for_user(user_id):
+    """ Route queries made outside of requests to the shard of a user """
+    previous = getattr(_state, 'user_id', None)
+    _state.user_id = user_id
+    try:
+        yield shard_for_user_id(user_id)
+    finally:
+        _state.user_id = previous
+        _state.placements = None
+
+
+class ShardRouter:
+    """ Keep the recipes, tags, ingredients and change log of each user on
+        one of the DATABASE_SHARDS
+
+    The owner is taken from the object being saved or related to when
+    Django passes one, else from `for_user`, else from the user of the API
+    request being served. Queries without an owner use the default
+    database. Writes for a user whose data is being moved are refused.
+    """
+
+    def _placement(self, hints):
+        user_id = None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+                user_id = instance.pk
+            else:
+                user_id = getattr(instance, 'user_id', None)
+        if user_id is None:
+            user_id = getattr(_state, 'user_id', None)
+
+        # The request user is loaded anyway, reading it costs no query
+        request = getattr(_state, 'request', None)
+        user = None
+        if request is not None and \
+                request.path_info.startswith(settings.API_PATH_PREFIXES):
+            user = request_user(request)
+        if user is not None and user.pk is not None and \
+                user_id in (None, user.pk):
+            return user.shard, user.shard_frozen
+
+        if user_id is None:
+            return DEFAULT_DB_ALIAS, False
+        return user_placement(user_id)
+
+    def _sharded(self, model):
+        return len(settings.DATABASE_SHARDS) > 1 and \
+            model._meta.label_lower in settings.SHARDED_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not self._sharded(model):
+            return None
+        # Related objects of a loaded row are read next to it
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and \
+                self._sharded(instance):
+            return instance._state.db
+        return self._placement(hints)[0]
+
+    def db_for_write(self, model, **hints):
+        if not self._sharded(model):
+            return None
+        shard, frozen = self._placement(hints)
+        if frozen:
+            raise ShardMoving()
+        return shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = settings.SHARDED_MODELS
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels <= set(sharded):
+            return obj1._state.db == obj2._state.db
+        # Users stay on the default database and own rows on every shard,
+        # the foreign keys to them are not enforced by the database
+        if settings.AUTH_USER_MODEL.lower() in labels and \
+                labels & set(sharded):
+            return True
+        return None
@@ -0,0 +1,287 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import F, Max
+from django.dispatch import Signal
+from core import summaries
+from core.models import Change, Recipe, RecipeRevision, Tag, Ingredient
+from core.purge import purge_recipes, purge_recipe_attrs
+
+""" Sent once a user's data lives on another shard, with `user_id` and the
+    `source` and `target` aliases, for caches keyed by shard to go """
+user_moved = Signal()
+
+""" Models copied by a move, in dependency order, with their change log
+    name and their recipe many-to-many field if any """
+MOVED_MODELS = (
+    (Tag, Change.TAG, 'tags'),
+    (Ingredient, Change.INGREDIENT, 'ingredients'),
+    (Recipe, Change.RECIPE, None),
+)
+
+
+def id_range(alias):
+    """ Return the first and last id of the tags, ingredients and recipes
+        created on a shard """
+    index = settings.DATABASE_SHARDS.index(alias)
+    first = index * settings.SHARD_ID_RANGE
+    return max(first, 1), first + settings.SHARD_ID_RANGE - 1
+
+
+def reserve_id_range(using):
+    """ Make a shard draw the ids of new tags, ingredients and recipes from
+        its own range, so that moved rows keep their ids
+
+    On PostgreSQL the sequences are bounded by the range and running out
+    of it fails loudly. SQLite, used by the tests, only has its next ids
+    moved to the range: it numbers new rows after the largest id.
+    """
+    first, last = id_range(using)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model, _, _ in MOVED_MODELS:
+            table = model._meta.db_table
+            cursor.execute(
+                f'SELECT MAX(id) FROM {quote(table)} '
+                f'WHERE id BETWEEN %s AND %s', [first, last]
+            )
+            used = max(cursor.fetchone()[0] or 0, first - 1)
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, 'id')", [table]
+                )
+                sequence = cursor.fetchone()[0]
+                cursor.execute(
+                    f'SELECT last_value, is_called FROM {sequence}'
+                )
+                value, called = cursor.fetchone()
+                if first <= value <= last:
+                    used = max(used, value if called else value - 1)
+                cursor.execute(
+                    f'ALTER SEQUENCE {sequence} MINVALUE {first} '
+                    f'MAXVALUE {last} START WITH {first} '
+                    f'RESTART WITH {used + 1}'
+                )
+            else:
+                cursor.execute(
+                    'DELETE FROM sqlite_sequence WHERE name = %s', [table]
+                )
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, used]
+                )
+
+
+class UserMove:
+    """ Move the recipes, tags and ingredients of a user to another shard
+        while the user keeps using them
+
+    Everything is copied first, then the changes made meanwhile are
+    replayed from the change log of the source until few are left. Writes
+    are then held off for the last replay and the switch. Rows keep their
+    ids, which no other shard hands out (see reserve_id_range); the change
+    log of the user starts over on the target.
+    """
+
+    def __init__(self, user, target, batch_size=500):
+        self.user = user
+        self.source = user.shard
+        self.target = target
+        self.batch_size = batch_size
+        self.copied = {model: set() for model, _, _ in MOVED_MODELS}
+        self.cursor = 0
+
+    def _insert(self, model, objects):
+        """ Insert rows on the target with their ids """
+        model._base_manager.using(self.target).bulk_create(
+            objects, batch_size=self.batch_size
+        )
+        self.copied[model].update(obj.pk for obj in objects)
+
+    def _link(self, recipe_ids):
+        """ Copy the tags, ingredients and revisions of recipes """
+        for model, _, field in MOVED_MODELS[:2]:
+            through = summaries.through_model(field)
+            column = f'{model._meta.model_name}_id'
+            through.objects.using(self.target).filter(
+                recipe_id__in=recipe_ids
+            )._raw_delete(self.target)
+            rows = through.objects.using(self.source).filter(
+                recipe_id__in=recipe_ids
+            ).values()
+            through.objects.using(self.target).bulk_create([
+                through(**dict(row, id=None))
+                for row in rows if row[column] in self.copied[model]
+            ])
+        summaries.refresh_recipe_summaries(recipe_ids, self.target)
+
+        RecipeRevision.objects.using(self.target).filter(
+            recipe_id__in=recipe_ids
+        )._raw_delete(self.target)
+        RecipeRevision.objects.using(self.target).bulk_create([
+            RecipeRevision(
+                user_id=self.user.pk,
+                recipe_id=revision.recipe_id,
+                number=revision.number,
+                created_at=revision.created_at,
+                delta=revision.delta,
+                snapshot=revision.snapshot
+            )
+            for revision in RecipeRevision.objects.using(self.source).filter(
+                recipe_id__in=recipe_ids
+            )
+        ], batch_size=self.batch_size)
+
+    def _delete(self, model, field, ids, using):
+        if not ids:
+            return
+        if model is Recipe:
+            purge_recipes(ids, using, delete_images=False)
+        else:
+            purge_recipe_attrs(model, field, ids, using)
+
+    def _delete_all(self, using):
+        """ Delete every row of the user from a shard, keeping images """
+        for model, _, field in reversed(MOVED_MODELS):
+            rows = model.all_objects.using(using).filter(user=self.user)
+            while True:
+                ids = list(rows.values_list('pk', flat=True)[:self.batch_size])
+                if not ids:
+                    break
+                self._delete(model, field, ids, using)
+        Change.objects.using(using).filter(
+            user=self.user
+        )._raw_delete(using)
+
+    def copy(self):
+        """ Copy every row of the user, dropping leftovers of an earlier
+            attempt first """
+        self._delete_all(self.target)
+        self.cursor = Change.objects.using(self.source).filter(
+            user=self.user
+        ).aggregate(last=Max('id'))['last'] or 0
+
+        for model, _, _ in MOVED_MODELS:
+            rows = model.all_objects.using(self.source).filter(
+                user=self.user
+            ).order_by('pk')
+            last = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last)[:self.batch_size])
+                if not batch:
+                    break
+                last = batch[-1].pk
+                with transaction.atomic(using=self.target):
+                    self._insert(model, batch)
+                    if model is Recipe:
+                        self._link([obj.id for obj in batch])
+
+    def replay(self):
+        """ Apply the changes logged since the last copy or replay and
+            return how many there were """
+        entries = list(
+            Change.objects.using(self.source).filter(
+                user=self.user, id__gt=self.cursor
+            ).order_by('id')
+        )
+        if not entries:
+            return 0
+        self.cursor = entries[-1].id
+
+        with transaction.atomic(using=self.target):
+            for model, name, field in MOVED_MODELS:
+                ids = {e.object_id for e in entries if e.model == name}
+                if ids:
+                    self._replay(model, field, ids)
+
+        return len(entries)
+
+    def _replay(self, model, field, ids):
+        current = model.all_objects.using(self.source).in_bulk(ids)
+        copied = self.copied[model]
+
+        gone = [pk for pk in ids if pk not in current and pk in copied]
+        copied.difference_update(gone)
+        self._delete(model, field, gone, self.target)
+
+        self._insert(model, [
+            obj for pk, obj in current.items() if pk not in copied
+        ])
+        fields = [
+            f.attname for f in model._meta.concrete_fields
+            if not f.primary_key and f.attname != 'user_id' and
+            f.name not in getattr(model, 'SUMMARY_FIELDS', ())
+        ]
+        for pk, obj in current.items():
+            model.all_objects.using(self.target).filter(
+                pk=pk
+            ).update(**{name: getattr(obj, name) for name in fields})
+
+        if model is Recipe:
+            self._link(list(current))
+        else:
+            linked = set()
+            for pk in current:
+                linked.update(summaries.linked_recipe_ids(
+                    field, pk, self.target
+                ))
+            summaries.refresh_recipe_summaries(linked, self.target)
+
+    def switch(self):
+        """ Log every live object afresh on the target and point the user
+            at it """
+        Change.objects.using(self.target).filter(
+            user=self.user
+        )._raw_delete(self.target)
+        for model, name, _ in MOVED_MODELS:
+            ids = model.objects.using(self.target).filter(
+                user=self.user
+            ).values_list('pk', flat=True)
+            Change.objects.using(self.target).bulk_create(
+                (Change(user_id=self.user.pk, model=name, object_id=pk,
+                        action=Change.UPSERT) for pk in ids.iterator()),
+                batch_size=self.batch_size
+            )
+        get_user_model().all_objects.using(DEFAULT_DB_ALIAS).filter(
+            pk=self.user.pk
+        ).update(
+            shard=self.target, shard_frozen=False,
+            changes_epoch=F('changes_epoch') + 1, changes_horizon=0
+        )
+
+    def freeze(self, frozen=True):
+        get_user_model().all_objects.using(DEFAULT_DB_ALIAS).filter(
+            pk=self.user.pk
+        ).update(shard_frozen=frozen)
+
+    def run(self, drain_seconds=5, max_rounds=5, settle_changes=10,
+            log=lambda message: None):
+        """ Move the user, holding off their writes only for the final
+            replay """
+        self.copy()
+        log(f'Copied {sum(map(len, self.copied.values()))} rows')
+        for _ in range(max_rounds):
+            changes = self.replay()
+            log(f'Replayed {changes} changes')
+            if changes <= settle_changes:
+                break
+
+        self.freeze()
+        try:
+            # Let requests that loaded the user before the freeze finish
+            time.sleep(drain_seconds)
+            log(f'Replayed {self.replay()} changes while frozen')
+            with transaction.atomic(using=self.target):
+                self.switch()
+        except BaseException:
+            self.freeze(False)
+            raise
+
+        self._delete_all(self.source)
+        user_moved.send(
+            sender=UserMove, user_id=self.user.pk,
+            source=self.source, target=self.target
+        )
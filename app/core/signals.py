@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_save, pre_delete, \
+    post_delete, post_migrate
+from django.contrib.auth import get_user_model
+from django.dispatch import receiver
+from core.models import Change, Recipe, Tag, Ingredient
+from core import changes, sharding, summaries
+
+
+def recipe_m2m_changed(sender, instance, action, reverse, pk_set, using,
+                       field, **kwargs):
+    """ Refresh the summaries of recipes whose tags or ingredients changed """
+    if action == 'pre_clear' and reverse:
+        # Clearing the recipes of a tag does not tell which ones they were
+        instance._cleared_recipe_ids = summaries.linked_recipe_ids(
+            field, instance.pk, using
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_cleared_recipe_ids', [])
+    else:
+        recipe_ids = pk_set
+    if recipe_ids:
+        summaries.refresh_recipe_summaries(recipe_ids, using)
+        changes.record_changes(
+            instance.user_id, Change.RECIPE, recipe_ids, using=using
+        )
+
+
+@receiver(m2m_changed, sender=summaries.through_model('tags'))
+def recipe_tags_changed(sender, **kwargs):
+    recipe_m2m_changed(sender, field='tags', **kwargs)
+
+
+@receiver(m2m_changed, sender=summaries.through_model('ingredients'))
+def recipe_ingredients_changed(sender, **kwargs):
+    recipe_m2m_changed(sender, field='ingredients', **kwargs)
+
+
+def _field_for(sender):
+    return 'tags' if issubclass(sender, Tag) else 'ingredients'
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, using, raw=False,
+                      **kwargs):
+    """ Propagate renamed tags and ingredients to recipe summaries """
+    if created or raw:
+        return
+    recipe_ids = summaries.linked_recipe_ids(
+        _field_for(sender), instance.pk, using
+    )
+    if recipe_ids:
+        summaries.refresh_recipe_summaries(recipe_ids, using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, using, **kwargs):
+    """ Remember the recipes of a tag or ingredient before it goes away """
+    instance._linked_recipe_ids = summaries.linked_recipe_ids(
+        _field_for(sender), instance.pk, using
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, using, **kwargs):
+    """ Drop deleted tags and ingredients from recipe summaries """
+    recipe_ids = getattr(instance, '_linked_recipe_ids', [])
+    if recipe_ids:
+        summaries.refresh_recipe_summaries(recipe_ids, using)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def object_saved(sender, instance, using, raw=False, **kwargs):
+    """ Log saved and soft deleted objects for syncing clients """
+    if not raw:
+        changes.record_instance(instance, using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def object_deleted(sender, instance, using, **kwargs):
+    """ Log deleted objects for syncing clients """
+    changes.record_instance(instance, Change.DELETE, using)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    """ Drop the change log of deleted users """
+    Change.objects.using(instance.shard).filter(
+        user_id=instance.pk
+    )._raw_delete(instance.shard)
+
+
+@receiver(post_migrate)
+def shard_migrated(sender, using, **kwargs):
+    """ Keep the ids handed out by each shard within its own range """
+    if sender.name == 'core' and len(settings.DATABASE_SHARDS) > 1 and \
+            using in settings.DATABASE_SHARDS:
+        sharding.reserve_id_range(using)
@@ -0,0 +1,45 @@
+import json
+import sys
+import time
+
+
+def warm_up():
+    """ Build the URL resolver and import every view ahead of the first
+        request, so workers forked from a preloaded master share them """
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+    resolver.namespace_dict
+    resolver.app_dict
+
+
+def measure(path):
+    """ Time the startup of a fresh process and print it as JSON
+
+    Run in a child process by the startup_benchmark command, since only a
+    new interpreter shows the cost of importing Django and the project.
+    """
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    get_wsgi_application()
+    loaded = time.perf_counter()
+    warm_up()
+    warmed = time.perf_counter()
+
+    from django.test import Client
+    client = Client(HTTP_HOST='localhost')
+    timings = []
+    for _ in range(2):
+        request_started = time.perf_counter()
+        client.get(path)
+        timings.append(time.perf_counter() - request_started)
+
+    json.dump({
+        'import': loaded - started,
+        'warm_up': warmed - loaded,
+        'first_request': timings[0],
+        'next_request': timings[1],
+        'modules': len(sys.modules),
+        'pillow_loaded': 'PIL' in sys.modules,
+    }, sys.stdout)
@@ -0,0 +1,94 @@
+from django.db import transaction, DEFAULT_DB_ALIAS
+from core.models import Recipe
+
+
+SUMMARY_BATCH_SIZE = 500
+
+""" Recipe field name, summary field name and through table column """
+SUMMARIES = (
+    ('tags', 'tag_list', 'tag'),
+    ('ingredients', 'ingredient_list', 'ingredient'),
+)
+
+""" Through table columns ordering the summary of a field, before the id
+    of the linked object """
+SUMMARY_ORDERING = {
+    'ingredients': ('position',),
+}
+
+
+def through_model(field_name):
+    """ Return the through model of a recipe many-to-many field """
+    return Recipe._meta.get_field(field_name).remote_field.through
+
+
+def linked_recipe_ids(field_name, target_id, using=DEFAULT_DB_ALIAS):
+    """ Return the ids of the recipes linked to a tag or an ingredient """
+    column = dict((field, col) for field, _, col in SUMMARIES)[field_name]
+    return list(
+        through_model(field_name).objects.using(using).filter(
+            **{f'{column}_id': target_id}
+        ).values_list('recipe_id', flat=True)
+    )
+
+
+def build_summaries(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """ Compute the summaries of recipes from the through tables """
+    summaries = {
+        recipe_id: {summary: [] for _, summary, _ in SUMMARIES}
+        for recipe_id in recipe_ids
+    }
+    for field, summary, column in SUMMARIES:
+        rows = through_model(field).objects.using(using).filter(
+            recipe_id__in=recipe_ids,
+            **{f'{column}__deleted_at__isnull': True}
+        ).values_list(
+            'recipe_id', f'{column}_id', f'{column}__name'
+        ).order_by(*SUMMARY_ORDERING.get(field, ()), f'{column}_id')
+        for recipe_id, target_id, name in rows:
+            summaries[recipe_id][summary].append([target_id, name])
+
+    return summaries
+
+
+def refresh_recipe_summaries(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """ Recompute and store the summaries of the given recipes """
+    recipe_ids = sorted(set(recipe_ids))
+    fields = [summary for _, summary, _ in SUMMARIES]
+    with transaction.atomic(using=using):
+        for start in range(0, len(recipe_ids), SUMMARY_BATCH_SIZE):
+            batch = recipe_ids[start:start + SUMMARY_BATCH_SIZE]
+            recipes = [
+                Recipe(id=recipe_id, **values)
+                for recipe_id, values in build_summaries(batch, using).items()
+            ]
+            Recipe.objects.using(using).bulk_update(recipes, fields)
+
+
+def iter_recipe_id_batches(using=DEFAULT_DB_ALIAS,
+                           batch_size=SUMMARY_BATCH_SIZE):
+    """ Yield the ids of every recipe in ordered batches """
+    last_id = 0
+    while True:
+        batch = list(
+            Recipe.objects.using(using).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def find_inconsistent_recipes(using=DEFAULT_DB_ALIAS,
+                              batch_size=SUMMARY_BATCH_SIZE):
+    """ Yield the ids of recipes whose stored summaries are out of date """
+    fields = [summary for _, summary, _ in SUMMARIES]
+    for batch in iter_recipe_id_batches(using, batch_size):
+        expected = build_summaries(batch, using)
+        stored = Recipe.objects.using(using).filter(
+            id__in=batch
+        ).values_list('id', *fields)
+        for recipe_id, *values in stored:
+            if dict(zip(fields, values)) != expected[recipe_id]:
+                yield recipe_id
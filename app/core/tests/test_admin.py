@@ -1,6 +1,11 @@
-from django.test import TestCase, Client
+from unittest.mock import MagicMock, patch
+
+from django.contrib import admin
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from core.admin import EstimatedCountPaginator
+from core.models import Recipe, Tag, Ingredient
 
 
 class AdminSiteTests(TestCase):
@@ -43,3 +48,80 @@ class AdminSiteTests(TestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, 200)
+
+    def test_recipe_change_page(self):
+        """ Test that the recipe edit page works without listing all tags """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cacik',
+            time_minutes=5,
+            price=5.00
+        )
+        recipe.tags.add(tag)
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_recipe_listed(self):
+        """ Test that recipes are listed on the recipe page """
+        Recipe.objects.create(
+            user=self.user,
+            title='Cacik',
+            time_minutes=5,
+            price=5.00
+        )
+        url = reverse('admin:core_recipe_changelist')
+
+        response = self.client.get(url)
+
+        self.assertContains(response, 'Cacik')
+        self.assertContains(response, self.user.email)
+
+    def test_ingredient_search(self):
+        """ Test that ingredients are searched by name prefix """
+        Ingredient.objects.create(user=self.user, name='Cucumber')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        url = reverse('admin:core_ingredient_changelist')
+
+        response = self.client.get(url, {'q': 'Cuc'})
+
+        self.assertContains(response, 'Cucumber')
+        self.assertNotContains(response, 'Salt')
+
+    def test_paginator_uses_estimate_for_huge_tables(self):
+        """ Test that huge unfiltered tables are not counted exactly """
+        queryset = Tag.objects.all()
+        with patch.object(EstimatedCountPaginator, 'estimated_count',
+                          return_value=5000000):
+            paginator = EstimatedCountPaginator(queryset, 100)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 5000000)
+
+    def test_paginator_estimates_admin_changelist(self):
+        """ Test that the soft delete filter of the admin changelist still
+            counts as unfiltered while search filters do not """
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+        queryset = admin.site._registry[Tag].get_queryset(request)
+        paginator = EstimatedCountPaginator(queryset, 100)
+        connection = MagicMock(vendor='postgresql')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (5000000,)
+
+        self.assertTrue(paginator.is_unfiltered())
+        with patch('core.admin.connections', {'default': connection}):
+            self.assertEqual(paginator.count, 5000000)
+        self.assertFalse(EstimatedCountPaginator(
+            queryset.filter(name__icontains='veg'), 100
+        ).is_unfiltered())
+
+    def test_paginator_counts_small_tables(self):
+        """ Test that small tables still get an exact count """
+        Tag.objects.create(user=self.user, name='Vegan')
+        paginator = EstimatedCountPaginator(Tag.objects.all(), 100)
+
+        self.assertEqual(paginator.count, 1)
@@ -0,0 +1,103 @@
+import threading
+from unittest.mock import patch, MagicMock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from psycopg2 import pool as pg_pool
+from core.backends.postgresql import base
+
+
+def sample_wrapper(**settings):
+    """ Create a database wrapper that is never connected for real """
+    settings_dict = {'OPTIONS': {}, 'POOL': None}
+    settings_dict.update(settings)
+    return base.DatabaseWrapper(settings_dict, alias='backend_test')
+
+
+class PostgresBackendTests(SimpleTestCase):
+
+    def tearDown(self):
+        base._pools.clear()
+
+    @patch('core.backends.postgresql.base.BlockingConnectionPool')
+    def test_pooled_connection_is_borrowed(self, pool_class):
+        """ Test that connections come from the pool when it is enabled """
+        pool = pool_class.return_value
+        wrapper = sample_wrapper(POOL={'MIN_SIZE': 2, 'MAX_SIZE': 8})
+
+        connection = wrapper.get_new_connection({'dbname': 'app'})
+
+        pool_class.assert_called_once_with(2, 8, timeout=30, dbname='app')
+        self.assertEqual(connection, pool.getconn.return_value)
+
+    @patch('core.backends.postgresql.base.BlockingConnectionPool')
+    def test_pooled_connection_is_returned(self, pool_class):
+        """ Test that closing a pooled connection puts it back """
+        pool = pool_class.return_value
+        wrapper = sample_wrapper(POOL={'MIN_SIZE': 1, 'MAX_SIZE': 4})
+        wrapper.connection = wrapper.get_new_connection({})
+
+        wrapper._close()
+
+        pool.putconn.assert_called_once_with(
+            pool.getconn.return_value, close=False
+        )
+
+    @patch('psycopg2.connect')
+    def test_exhausted_pool_waits_for_connection(self, connect):
+        """ Test that borrowers wait for a connection to be put back """
+        pool = base.BlockingConnectionPool(0, 1, timeout=5)
+        connection = pool.getconn()
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.getconn()))
+        waiter.start()
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+
+        pool.putconn(connection)
+        waiter.join(5)
+
+        self.assertEqual(len(borrowed), 1)
+
+    def test_pool_needs_connections_closed_per_request(self):
+        """ Test that persistent connections cannot be combined with the
+            pool, which they would never go back to """
+        with self.assertRaises(ImproperlyConfigured):
+            sample_wrapper(POOL={'MAX_SIZE': 4}, CONN_MAX_AGE=60)
+
+    @patch('psycopg2.connect')
+    def test_failed_return_frees_slot(self, connect):
+        """ Test that a connection the pool fails to take back still frees
+            its slot """
+        pool = base.BlockingConnectionPool(0, 1, timeout=0.05)
+        connection = pool.getconn()
+
+        with patch.object(pg_pool.ThreadedConnectionPool, 'putconn',
+                          side_effect=pg_pool.PoolError('closed')):
+            with self.assertRaises(pg_pool.PoolError):
+                pool.putconn(connection)
+
+        self.assertTrue(pool._slots.acquire(blocking=False))
+
+    @patch('psycopg2.connect')
+    def test_exhausted_pool_times_out(self, connect):
+        """ Test that borrowers give up once the timeout passed """
+        pool = base.BlockingConnectionPool(0, 1, timeout=0.05)
+        pool.getconn()
+
+        with self.assertRaises(pg_pool.PoolError):
+            pool.getconn()
+
+    def test_health_check_closes_broken_connection(self):
+        """ Test that an unusable persistent connection is replaced """
+        wrapper = sample_wrapper(CONN_HEALTH_CHECKS=True)
+        wrapper.connection = MagicMock()
+        wrapper.health_check_pending = True
+
+        with patch.object(wrapper, 'is_usable', return_value=False), \
+                patch.object(wrapper, 'close') as close, \
+                patch.object(wrapper, 'connect'):
+            wrapper.ensure_connection()
+
+        close.assert_called_once_with()
+        self.assertFalse(wrapper.health_check_pending)
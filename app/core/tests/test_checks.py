@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase, override_settings
+from core.checks import check_shared_cache
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_local_cache_reported(self):
+        """ Test that deployments with a per-process cache are warned """
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)],
+            ['core.W001']
+        )
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/recipe-app-check-cache',
+    }})
+    def test_shared_cache_accepted(self):
+        """ Test that a cache shared by every worker passes """
+        self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,143 @@
+import gzip
+import json
+import unittest
+import zlib
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from core import compression
+from core.middleware import CompressionMiddleware
+from core.models import Recipe
+
+BODY = json.dumps([{'title': f'Recipe {n}'} for n in range(200)]).encode()
+
+
+class NegotiationTests(SimpleTestCase):
+
+    def test_negotiate(self):
+        """ Test that the preferred accepted encoding is picked """
+        available = ['br', 'gzip']
+        cases = (
+            ('gzip, deflate, br', 'br'),
+            ('gzip', 'gzip'),
+            ('br;q=0, gzip;q=0.5', 'gzip'),
+            ('*', 'br'),
+            ('*, br;q=0', 'gzip'),
+            ('identity', None),
+            ('', None),
+        )
+        for header, expected in cases:
+            self.assertEqual(
+                compression.negotiate(header, available), expected, header
+            )
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def process(self, response, accept='gzip'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compress_gzip(self):
+        """ Test that large bodies are gzipped for clients accepting it """
+        response = HttpResponse(BODY, content_type='application/json')
+        response['ETag'] = '"abc"'
+        response = self.process(response)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        self.assertEqual(int(response['Content-Length']),
+                         len(response.content))
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_compress_brotli(self):
+        """ Test that Brotli is preferred when both are accepted """
+        response = self.process(HttpResponse(BODY), 'gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(
+            compression.brotli.decompress(response.content), BODY
+        )
+
+    def test_small_body_not_compressed(self):
+        """ Test that bodies under the threshold are left alone """
+        response = self.process(HttpResponse(b'{}'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{}')
+
+    def test_no_accept_encoding(self):
+        """ Test that clients not accepting compression get plain bodies """
+        response = self.process(HttpResponse(BODY), 'identity')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_compressed_media_skipped(self):
+        """ Test that images are not compressed again """
+        for content_type in ('image/jpeg', 'image/webp'):
+            response = self.process(
+                HttpResponse(BODY, content_type=content_type)
+            )
+
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_compressed(self):
+        """ Test that streamed bodies are compressed chunk by chunk """
+        chunks = [BODY[:1000], BODY[1000:]]
+        response = self.process(StreamingHttpResponse(iter(chunks)))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), BODY
+        )
+
+    def test_streamed_export_compressed_like_whole_body(self):
+        """ Test that small chunks of a streamed export are not flushed one
+            by one, which would cost most of the compression """
+        chunks = [item + b',' for item in BODY.split(b',')]
+        response = self.process(StreamingHttpResponse(
+            iter(chunks), content_type='application/json'
+        ))
+        streamed = b''.join(response.streaming_content)
+        whole = gzip.compress(BODY, 6)
+
+        self.assertEqual(gzip.decompress(streamed), b''.join(chunks))
+        self.assertLess(len(streamed), len(whole) * 1.1)
+
+    def test_latency_sensitive_stream_flushed_per_chunk(self):
+        """ Test that every chunk of a line delimited stream is flushed """
+        chunks = [b'{"n": %d}\n' % n for n in range(5)]
+        response = self.process(StreamingHttpResponse(
+            iter(chunks), content_type='application/x-ndjson'
+        ))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        for part, chunk in zip(response.streaming_content, chunks):
+            self.assertEqual(decompressor.decompress(part), chunk)
+
+
+class CompressionBenchmarkTests(TestCase):
+
+    def test_benchmark(self):
+        """ Test that the benchmark reports each endpoint and codec """
+        user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        Recipe.objects.create(
+            user=user, title='Cacik', time_minutes=5, price=5.00
+        )
+        out = StringIO()
+        call_command('compression_benchmark', repeat=1, stdout=out)
+
+        self.assertIn('/api/recipe/recipes/', out.getvalue())
+        self.assertIn('gzip-6', out.getvalue())
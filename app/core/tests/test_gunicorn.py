@@ -0,0 +1,66 @@
+import os
+import runpy
+import sys
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from gunicorn.app.wsgiapp import WSGIApplication
+
+
+CONFIG = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+
+
+class GunicornConfigTests(SimpleTestCase):
+
+    def load(self, **env):
+        with patch.dict(os.environ, env):
+            return runpy.run_path(CONFIG)
+
+    def test_workers_derived_from_cpus(self):
+        """ Test that the worker count follows the available CPUs """
+        with patch('os.sched_getaffinity', return_value={0, 1, 2, 3},
+                   create=True):
+            config = self.load()
+
+        self.assertEqual(config['workers'], 9)
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['max_requests_jitter'], 100)
+
+    def test_environment_overrides(self):
+        """ Test that the settings can be overridden from the environment """
+        config = self.load(GUNICORN_WORKERS='3', GUNICORN_THREADS='8',
+                           GUNICORN_MAX_REQUESTS='500',
+                           GUNICORN_PRELOAD='0')
+
+        self.assertEqual(config['workers'], 3)
+        self.assertEqual(config['threads'], 8)
+        self.assertEqual(config['max_requests'], 500)
+        self.assertEqual(config['max_requests_jitter'], 50)
+        self.assertFalse(config['preload_app'])
+
+    def test_gunicorn_loads_config(self):
+        """ Test that a bare `gunicorn` run from the app directory finds
+            the application through the config file """
+        cwd = os.getcwd()
+        os.chdir(settings.BASE_DIR)
+        try:
+            with patch.object(sys, 'argv', ['gunicorn']):
+                application = WSGIApplication()
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(application.app_uri, 'app.wsgi:application')
+        self.assertEqual(application.cfg.worker_class_str, 'gthread')
+        self.assertTrue(callable(application.load()))
+
+    def test_pre_fork_closes_connections(self):
+        """ Test that no database connection is inherited by workers """
+        config = self.load()
+        with patch('django.db.connections.close_all') as close_all, \
+                patch('core.backends.postgresql.base.close_pools') as pools:
+            config['pre_fork'](None, None)
+
+        close_all.assert_called_once()
+        pools.assert_called_once()
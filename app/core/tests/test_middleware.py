@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+
+class BrowserMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@domain.com',
+            password='test123'
+        )
+
+    def test_api_skips_browser_middleware(self):
+        """ Test that API requests get no session, CSRF or frame options """
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('recipe:api-root'))
+
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertFalse(hasattr(response.wsgi_request, '_messages'))
+        self.assertFalse(response.has_header('X-Frame-Options'))
+
+    def test_api_not_csrf_checked(self):
+        """ Test that API posts are not rejected for a missing CSRF token """
+        get_user_model().objects.create_user('test@domain.com', 'test123')
+        response = self.client.post(reverse('user:token'), {
+            'email': 'test@domain.com',
+            'password': 'test123'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.data)
+
+    def test_admin_keeps_browser_middleware(self):
+        """ Test that the admin still works with sessions """
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.admin_user)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_admin_csrf_checked(self):
+        """ Test that the admin login still requires a CSRF token """
+        response = self.client.post(reverse('admin:login'), {
+            'username': 'admin@domain.com',
+            'password': 'test123'
+        })
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_login(self):
+        """ Test that logging into the admin with a CSRF token works """
+        response = self.client.get(reverse('admin:login'))
+        token = response.cookies['csrftoken'].value
+        response = self.client.post(reverse('admin:login'), {
+            'username': 'admin@domain.com',
+            'password': 'test123',
+            'csrfmiddlewaretoken': token,
+            'next': reverse('admin:index'),
+        })
+
+        self.assertRedirects(response, reverse('admin:index'))
+
+    def test_middleware_benchmark(self):
+        """ Test that the benchmark reports both middleware stacks """
+        out = StringIO()
+        call_command('middleware_benchmark', repeat=2, stdout=out)
+
+        self.assertIn('stock', out.getvalue())
+        self.assertIn('scoped', out.getvalue())
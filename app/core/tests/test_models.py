@@ -83,3 +83,26 @@ class ModelTests(TestCase):
 
         expected_path = f'upload/recipe/{uuid}.jpg'
         self.assertEqual(file_path, expected_path)
+
+    def test_recipe_links_carry_owner(self):
+        """ Test that through rows get the owner from either side """
+        user = sample_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=5.00
+        )
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+        recipe.tags.add(tag)
+        recipe.ingredients.create(user=user, name='Salt')
+        models.Ingredient.objects.create(
+            user=user, name='Pepper'
+        ).recipe_set.add(recipe)
+
+        self.assertEqual(
+            set(models.RecipeTag.objects.values_list('user_id', flat=True)),
+            {user.id}
+        )
+        self.assertEqual(
+            list(models.RecipeIngredient.objects.values_list(
+                'user_id', flat=True
+            )), [user.id, user.id]
+        )
@@ -0,0 +1,142 @@
+import re
+from io import StringIO
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.models import Ingredient, Recipe, RecipeRevision, Tag
+from core.partitioning import PartitioningError, partition_recipe_tables, \
+    partitioned_definition
+
+
+TABLES = ['core_recipe', 'core_recipe_tags']
+
+PARTITION_RE = re.compile(
+    r' on (?P<table>core_recipe(?:_tags|_ingredients)?)_p(?P<number>\d+)\b'
+)
+
+
+class PartitionedDefinitionTests(SimpleTestCase):
+
+    def test_unique_constraint_gets_partition_key(self):
+        """ Test that unique constraints are extended by the user """
+        self.assertEqual(
+            partitioned_definition('UNIQUE (recipe_id, tag_id)', TABLES),
+            'UNIQUE (recipe_id, tag_id, user_id)'
+        )
+        self.assertEqual(
+            partitioned_definition('UNIQUE (user_id, name)', TABLES),
+            'UNIQUE (user_id, name)'
+        )
+
+    def test_foreign_key_to_partitioned_table(self):
+        """ Test that foreign keys to partitioned tables include the user """
+        self.assertEqual(
+            partitioned_definition(
+                'FOREIGN KEY (recipe_id) REFERENCES core_recipe(id) '
+                'DEFERRABLE INITIALLY DEFERRED', TABLES
+            ),
+            'FOREIGN KEY (recipe_id, user_id) REFERENCES '
+            'core_recipe(id, user_id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+    def test_foreign_key_to_plain_table_kept(self):
+        """ Test that other foreign keys are left alone """
+        definition = 'FOREIGN KEY (tag_id) REFERENCES core_tag(id)'
+
+        self.assertEqual(partitioned_definition(definition, TABLES),
+                         definition)
+
+    @patch('core.partitioning.connections')
+    def test_old_postgresql_refused(self, connections):
+        """ Test that servers without partitioned foreign keys are refused
+            before anything is changed """
+        connections.__getitem__.return_value.pg_version = 110005
+
+        with self.assertRaisesMessage(PartitioningError, 'PostgreSQL 12'):
+            partition_recipe_tables(16)
+
+        connections.__getitem__.return_value.cursor.assert_not_called()
+
+
+@skipIf(connection.vendor == 'postgresql', 'partitions the database')
+class PartitionCommandTests(TestCase):
+
+    def test_other_databases_left_alone(self):
+        """ Test that databases other than PostgreSQL are not changed """
+        out = StringIO()
+
+        call_command('partition_recipes', database='default', stdout=out)
+
+        self.assertIn('leaving its tables as is', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL')
+class PartitionedTablesTests(TestCase):
+    """ Partitions the test database, which rolls back with each test """
+
+    def setUp(self):
+        partition_recipe_tables(4)
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com', 'test123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Hot'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt')
+        )
+
+    def scanned_partitions(self, sql):
+        """ Return the partitions read by a query, by table """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        partitions = {}
+        for match in PARTITION_RE.finditer(plan):
+            partitions.setdefault(match['table'], set()).add(match['number'])
+        return partitions
+
+    def test_recipe_detail_reads_one_partition(self):
+        """ Test that every query of a recipe detail is pruned to the
+            partition of its owner """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(
+                reverse('recipe:recipe-detail', args=[self.recipe.id])
+            )
+
+        self.assertEqual(len(res.data['tags']), 1)
+        self.assertEqual(len(res.data['ingredients']), 1)
+        scanned = {}
+        for query in queries.captured_queries:
+            if query['sql'].startswith('SELECT'):
+                for table, numbers in self.scanned_partitions(
+                        query['sql']).items():
+                    self.assertEqual(len(numbers), 1, query['sql'])
+                    scanned.setdefault(table, set()).update(numbers)
+        self.assertEqual(set(scanned), {
+            'core_recipe', 'core_recipe_tags', 'core_recipe_ingredients'
+        })
+
+    def test_foreign_keys_to_partitioned_tables(self):
+        """ Test that foreign keys added to partitioned tables by later
+            migrations include the owner, and need one """
+        field = RecipeRevision._meta.get_field('recipe')
+
+        with connection.schema_editor() as editor:
+            sql = str(editor._create_fk_sql(RecipeRevision, field, '_fk'))
+            with self.assertRaises(PartitioningError):
+                editor._create_fk_sql(get_user_model(), field, '_fk')
+
+        self.assertIn('("recipe_id", "user_id")', sql)
+        self.assertIn('"core_recipe" ("id", "user_id")', sql)
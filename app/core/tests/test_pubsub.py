@@ -0,0 +1,98 @@
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from core.pubsub import LocalBroker, CacheBroker, RESYNC
+
+
+class LocalBrokerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.broker = LocalBroker()
+
+    def test_publish_reaches_user_subscribers_only(self):
+        """ Test that messages are delivered to the user they are for """
+        mine = self.broker.subscribe(1)
+        other = self.broker.subscribe(2)
+
+        self.broker.publish(1, 'change', {'ids': [1]})
+
+        self.assertEqual(mine.get(0), ('change', {'ids': [1]}))
+        self.assertIsNone(other.get(0))
+
+    def test_closed_subscription_unregistered(self):
+        """ Test that closing a subscription stops deliveries """
+        subscription = self.broker.subscribe(1)
+        subscription.close()
+
+        self.broker.publish(1, 'change', {})
+
+        self.assertIsNone(subscription.get(0))
+        self.assertEqual(self.broker._subscribers, {})
+
+    def test_overflow_asks_for_resync(self):
+        """ Test that a subscriber which fell behind is told to resync """
+        self.broker.queue_size = 2
+        subscription = self.broker.subscribe(1)
+        for index in range(3):
+            self.broker.publish(1, 'change', {'ids': [index]})
+
+        self.assertEqual(subscription.get(0), RESYNC)
+        self.assertIsNone(subscription.get(0))
+
+
+class CacheBrokerTests(SimpleTestCase):
+
+    def setUp(self):
+        # A file based cache is shared by the processes of one machine
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'pubsub': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.directory.name,
+            },
+        })
+        self.settings_override.enable()
+        self.broker = CacheBroker('pubsub')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def test_process_local_cache_refused(self):
+        """ Test that a cache other processes cannot see is refused """
+        with self.assertRaises(ImproperlyConfigured):
+            CacheBroker('default')
+
+    def test_publish_through_cache(self):
+        """ Test that subscribers read messages published to the cache """
+        subscription = self.broker.subscribe(1)
+        other = CacheBroker('pubsub').subscribe(2)
+
+        self.broker.publish(1, 'change', {'ids': [1]})
+        self.broker.publish(1, 'change', {'ids': [2]})
+
+        self.assertEqual(subscription.get(0), ('change', {'ids': [1]}))
+        self.assertEqual(subscription.get(0), ('change', {'ids': [2]}))
+        self.assertIsNone(subscription.get(0))
+        self.assertIsNone(other.get(0))
+
+    def test_only_new_messages_delivered(self):
+        """ Test that messages published before subscribing are skipped """
+        self.broker.publish(1, 'change', {'ids': [1]})
+        subscription = self.broker.subscribe(1)
+
+        self.assertIsNone(subscription.get(0))
+
+    def test_overflow_asks_for_resync(self):
+        """ Test that a subscriber which fell behind is told to resync """
+        self.broker.queue_size = 2
+        subscription = self.broker.subscribe(1)
+        for index in range(3):
+            self.broker.publish(1, 'change', {'ids': [index]})
+
+        self.assertEqual(subscription.get(0), RESYNC)
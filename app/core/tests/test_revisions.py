@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+from core.revisions import apply, diff
+
+
+STATE = {
+    'title': 'Soup', 'time_minutes': 10, 'price': '5.00', 'link': '',
+    'image': '', 'tags': [1, 2],
+    'ingredients': {'3': [0, '1.00', 'cup'], '4': [1, None, '']},
+}
+
+
+class RevisionDeltaTests(SimpleTestCase):
+
+    def test_diff_and_apply(self):
+        """ Test that a delta holds the changes and rebuilds the state """
+        new = dict(STATE, title='Stew', tags=[2, 5],
+                   ingredients={'4': [0, None, ''], '6': [1, '2.00', 'g']})
+
+        delta = diff(STATE, new)
+
+        self.assertEqual(delta, {
+            'title': 'Stew',
+            'tags': {'add': [5], 'remove': [1]},
+            'ingredients': {
+                'set': {'4': [0, None, ''], '6': [1, '2.00', 'g']},
+                'remove': ['3'],
+            },
+        })
+        self.assertEqual(apply(STATE, delta), new)
+        self.assertEqual(diff(new, new), {})
@@ -0,0 +1,158 @@
+import multiprocessing
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, RequestFactory, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core import routers
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+
+REPLICAS = ['replica_1', 'replica_2']
+
+
+class SharedCacheMixin:
+    """ Replace the default cache with a file based cache, which unlike
+        the local memory one is shared by the processes of a machine """
+
+    def setUp(self):
+        super().setUp()
+        self.cache_directory = tempfile.TemporaryDirectory()
+        self.cache_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.cache_directory.name,
+        }})
+        self.cache_override.enable()
+
+    def tearDown(self):
+        self.cache_override.disable()
+        self.cache_directory.cleanup()
+        super().tearDown()
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+@patch('core.routers.is_healthy', return_value=True)
+class ReplicaRouterTests(SharedCacheMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = get_user_model()(pk=1, email='test@domain.com')
+
+    def tearDown(self):
+        routers.clear_current_request()
+
+    def serve(self, request):
+        routers.set_current_request(request)
+        request.user = self.user
+
+    def test_reads_use_replicas_round_robin(self, healthy):
+        """ Test that safe requests read from every replica in turn """
+        self.serve(self.factory.get('/api/recipe/recipes/'))
+
+        aliases = {self.router.db_for_read(Recipe) for _ in range(4)}
+
+        self.assertEqual(aliases, set(REPLICAS))
+
+    def test_unhealthy_replica_skipped(self, healthy):
+        """ Test that replicas failing their health check are skipped """
+        healthy.side_effect = lambda alias: alias == 'replica_2'
+        self.serve(self.factory.get('/api/recipe/recipes/'))
+
+        aliases = {self.router.db_for_read(Recipe) for _ in range(4)}
+
+        self.assertEqual(aliases, {'replica_2'})
+
+    def test_unsafe_requests_use_primary(self, healthy):
+        """ Test that reads made while writing go to the primary """
+        self.serve(self.factory.post('/api/recipe/recipes/'))
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_primary_models_use_primary(self, healthy):
+        """ Test that authentication models are read from the primary """
+        self.serve(self.factory.get('/api/user/me/'))
+
+        self.assertEqual(
+            self.router.db_for_read(get_user_model()), 'default'
+        )
+
+    def test_reads_pinned_after_write(self, healthy):
+        """ Test that a user reads their own writes from the primary """
+        request = self.factory.post('/api/recipe/recipes/')
+        middleware = ReplicaRoutingMiddleware(
+            lambda req: self.serve(req) or HttpResponse(status=201)
+        )
+        middleware(request)
+
+        self.serve(self.factory.get('/api/recipe/recipes/'))
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_pin_seen_by_other_processes(self, healthy):
+        """ Test that a pin set by another worker process sends the reads
+            of this one to the primary """
+        worker = multiprocessing.get_context('fork').Process(
+            target=routers.pin_user_to_primary, args=(self.user.pk,)
+        )
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        self.serve(self.factory.get('/api/recipe/recipes/'))
+
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_process_local_pin_cache_refused(self, healthy):
+        """ Test that pins are not kept where other workers miss them """
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            with self.assertRaises(ImproperlyConfigured):
+                routers.pin_user_to_primary(self.user.pk)
+
+    def test_no_replica_migrations(self, healthy):
+        """ Test that migrations only run against the primary """
+        self.assertFalse(self.router.allow_migrate('replica_1', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(SharedCacheMixin, TransactionTestCase):
+    databases = {'default', 'replica_1'}
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com', 'test123'
+        )
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_get_reads_from_replica(self):
+        """ Test that a GET served through the middleware reads the recipes
+            from the replica, which mirrors the primary in tests """
+        with CaptureQueriesContext(connections['replica_1']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual([r['title'] for r in res.data], ['Soup'])
+        self.assertTrue(any(
+            'core_recipe' in query['sql'] for query in replica.captured_queries
+        ))
+        self.assertFalse(any(
+            'core_recipe' in query['sql'] for query in primary.captured_queries
+        ))
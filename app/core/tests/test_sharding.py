@@ -0,0 +1,256 @@
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core import routers
+from core.models import Change, Recipe, RecipeRevision, Tag, Ingredient
+from core.revisions import record_revision
+from core.sharding import UserMove, id_range, reserve_id_range
+from recipe import recommendations
+
+
+SHARDS = ['default', 'shard_1']
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.ShardRouter()
+
+    def tearDown(self):
+        routers.clear_current_request()
+
+    def test_pick_shard_is_stable(self):
+        """ Test that users are spread over shards by their key """
+        shards = {routers.pick_shard(f'user{i}@domain.com') for i in range(20)}
+
+        self.assertEqual(shards, set(SHARDS))
+        self.assertEqual(routers.pick_shard('test@domain.com'),
+                         routers.pick_shard('test@domain.com'))
+
+    @patch('core.routers.user_placement', return_value=('shard_1', False))
+    def test_objects_routed_to_owner_shard(self, placement):
+        """ Test that sharded objects go to the shard of their owner """
+        recipe = Recipe(user_id=7)
+
+        self.assertEqual(
+            self.router.db_for_write(Recipe, instance=recipe), 'shard_1'
+        )
+        placement.assert_called_with(7)
+        self.assertIsNone(self.router.db_for_write(get_user_model()))
+
+    @patch('core.routers.user_placement', return_value=('shard_1', True))
+    def test_frozen_user_writes_refused(self, placement):
+        """ Test that writes are refused while a user is being moved """
+        with routers.for_user(7):
+            self.assertEqual(self.router.db_for_read(Tag), 'shard_1')
+            with self.assertRaises(routers.ShardMoving):
+                self.router.db_for_write(Tag)
+
+    def test_single_shard_not_routed(self):
+        """ Test that nothing is routed with a single shard """
+        with self.settings(DATABASE_SHARDS=['default']):
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+
+@skipUnless('shard_1' in settings.DATABASES, 'needs a second database')
+@override_settings(DATABASE_SHARDS=SHARDS)
+class UserMoveTests(TestCase):
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com', 'testpass', shard='default'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        record_revision(self.recipe)
+        reserve_id_range('shard_1')
+
+    def tearDown(self):
+        routers.clear_current_request()
+
+    def test_move_user_shard(self):
+        """ Test moving a user with the move_user_shard command """
+        call_command('move_user_shard', 'test@domain.com', 'shard_1',
+                     drain_seconds=0, stdout=StringIO())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.shard, 'shard_1')
+        self.assertFalse(self.user.shard_frozen)
+        self.assertEqual(self.user.changes_epoch, 1)
+        self.assertFalse(Recipe.all_objects.using('default').exists())
+        self.assertFalse(Change.objects.using('default').exists())
+
+        recipe = Recipe.objects.using('shard_1').get(user=self.user)
+        tag = Tag.objects.using('shard_1').get(user=self.user)
+        self.assertEqual((recipe.id, tag.id), (self.recipe.id, self.tag.id))
+        self.assertEqual(recipe.title, 'Soup')
+        self.assertEqual(recipe.tag_list, [[tag.id, 'Vegan']])
+        self.assertEqual(list(recipe.ingredients.values_list('name', flat=True)), ['Salt'])
+        self.assertEqual(
+            Change.objects.using('shard_1').filter(user=self.user).count(), 3
+        )
+        revision = RecipeRevision.objects.using('shard_1').get(recipe=recipe)
+        self.assertEqual(revision.snapshot['tags'], [tag.id])
+
+    def test_moved_ids_not_reused(self):
+        """ Test that the target shard numbers its own rows from its range,
+            apart from the ids of the rows moved in """
+        other = get_user_model().objects.create_user(
+            'other@domain.com', 'testpass', shard='shard_1'
+        )
+        with routers.for_user(other.pk):
+            before = Tag.objects.create(user=other, name='Quick')
+
+        call_command('move_user_shard', 'test@domain.com', 'shard_1',
+                     drain_seconds=0, stdout=StringIO())
+        with routers.for_user(other.pk):
+            after = Tag.objects.create(user=other, name='Spicy')
+
+        first, last = id_range('shard_1')
+        self.assertEqual(first, settings.SHARD_ID_RANGE)
+        self.assertTrue(first <= before.id < after.id <= last)
+        self.assertEqual(
+            set(Tag.objects.using('shard_1').values_list('id', flat=True)),
+            {self.tag.id, before.id, after.id}
+        )
+
+    def test_changes_during_move_replayed(self):
+        """ Test that changes made while copying reach the target """
+        move = UserMove(self.user, 'shard_1')
+        move.copy()
+
+        self.recipe.title = 'Stew'
+        self.recipe.save()
+        self.recipe.tags.remove(self.tag)
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        self.recipe.tags.add(tag)
+        self.ingredient.soft_delete()
+        Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=2, price=1
+        )
+
+        self.assertGreater(move.replay(), 0)
+        self.assertEqual(move.replay(), 0)
+
+        recipes = Recipe.objects.using('shard_1').order_by('title')
+        self.assertEqual([r.title for r in recipes], ['Stew', 'Toast'])
+        self.assertEqual([name for _, name in recipes[0].tag_list], ['Quick'])
+        self.assertFalse(
+            Ingredient.objects.using('shard_1').filter(user=self.user).exists()
+        )
+
+    def test_api_follows_moved_user(self):
+        """ Test that requests read the new shard and old cursors expire """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cursor = client.get(reverse('recipe:changes')).data['cursor']
+
+        call_command('move_user_shard', 'test@domain.com', 'shard_1',
+                     drain_seconds=0, stdout=StringIO())
+        self.user.refresh_from_db()
+
+        res = client.get(reverse('recipe:recipe-list'))
+        self.assertEqual([r['title'] for r in res.data], ['Soup'])
+
+        res = client.get(reverse('recipe:changes'), {'since': cursor})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_frozen_user_gets_retry_after(self):
+        """ Test that writes during the final step of a move are refused """
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            shard_frozen=True
+        )
+        self.user.refresh_from_db()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.post(reverse('recipe:tag-list'), {'name': 'Quick'})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], str(settings.SHARD_MOVE_RETRY_AFTER))
+
+
+@skipUnless('shard_1' in settings.DATABASES, 'needs a second database')
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardedApiTests(TestCase):
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com', 'testpass', shard='shard_1'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        routers.clear_current_request()
+
+    def test_create_on_user_shard(self):
+        """ Test that objects created through the API land on the shard of
+            a user living on the default database """
+        res = self.client.post(reverse('recipe:tag-list'), {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        tag_id = res.data['id']
+        res = self.client.post(
+            reverse('recipe:ingredient-list'), {'name': 'Salt'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ingredient_id = res.data['id']
+
+        res = self.client.post(reverse('recipe:recipe-list'), {
+            'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+            'tags': [tag_id], 'ingredients': [ingredient_id],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Recipe.all_objects.using('default').exists())
+        self.assertFalse(Tag.all_objects.using('default').exists())
+        recipe = Recipe.objects.using('shard_1').get(user=self.user)
+        self.assertEqual(
+            list(recipe.tags.values_list('id', flat=True)), [tag_id]
+        )
+
+        res = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual([r['title'] for r in res.data], ['Soup'])
+
+    def test_recommendations_read_user_shard(self):
+        """ Test that cookable and similar recipes are found on the shard
+            of the user """
+        recommendations.clear_indexes()
+        recipes = []
+        with routers.for_user(self.user.pk):
+            egg = Ingredient.objects.create(user=self.user, name='Egg')
+            for title in ('Omelette', 'Menemen'):
+                recipe = Recipe.objects.create(
+                    user=self.user, title=title, time_minutes=5, price=1
+                )
+                recipe.ingredients.add(egg)
+                recipes.append(recipe)
+        self.assertEqual(recipes[0]._state.db, 'shard_1')
+
+        res = self.client.get(
+            reverse('recipe:recipe-cookable'), {'ingredients': egg.id}
+        )
+        self.assertEqual(len(res.data), 2)
+
+        res = self.client.get(
+            reverse('recipe:recipe-similar', args=[recipes[0].id])
+        )
+        self.assertEqual([r['title'] for r in res.data], ['Menemen'])
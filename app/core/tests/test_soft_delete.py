@@ -0,0 +1,165 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from core.cloning import clone_recipes
+from core.models import Change, Recipe, Tag, Ingredient
+from PIL import Image
+
+
+def sample_image():
+    """ Return an uploadable in-memory JPEG """
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+        Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+        ntf.seek(0)
+        return SimpleUploadedFile('image.jpg', ntf.read())
+
+
+class SoftDeleteTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cacik',
+            time_minutes=5,
+            price=5.00
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Cucumber'
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def age(self, model, **filters):
+        """ Move deletion times past the purge grace period """
+        model.all_objects.filter(**filters).update(
+            deleted_at=timezone.now() - timedelta(days=1)
+        )
+
+    def test_soft_deleted_rows_hidden_by_default_manager(self):
+        """ Test that soft deleted rows are only reachable explicitly """
+        self.recipe.soft_delete()
+        self.tag.soft_delete()
+
+        self.assertFalse(Recipe.objects.filter(id=self.recipe.id).exists())
+        self.assertFalse(Tag.objects.filter(id=self.tag.id).exists())
+        self.assertTrue(
+            Recipe.all_objects.filter(id=self.recipe.id).exists()
+        )
+
+    def test_soft_deleted_name_can_be_reused(self):
+        """ Test that a deleted tag does not block its name """
+        self.tag.soft_delete()
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        self.assertEqual(Tag.all_objects.filter(name='Vegan').count(), 2)
+
+    def test_soft_delete_user(self):
+        """ Test that deleting a user deactivates them and drops tokens """
+        Token.objects.create(user=self.user)
+        self.user.soft_delete()
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertFalse(
+            get_user_model().all_objects.get(id=self.user.id).is_active
+        )
+
+    def test_purge_respects_grace_period(self):
+        """ Test that recently deleted rows are kept """
+        self.recipe.soft_delete()
+        call_command('purge_deleted', stdout=open(os.devnull, 'w'))
+
+        self.assertTrue(
+            Recipe.all_objects.filter(id=self.recipe.id).exists()
+        )
+
+    def test_purge_deleted_recipe(self):
+        """ Test that purging removes the recipe, its links and image """
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                self.recipe.image = sample_image()
+                self.recipe.save()
+                path = self.recipe.image.path
+                self.recipe.soft_delete()
+                self.age(Recipe)
+
+                call_command('purge_deleted', stdout=open(os.devnull, 'w'))
+
+                self.assertFalse(os.path.exists(path))
+
+        self.assertFalse(
+            Recipe.all_objects.filter(id=self.recipe.id).exists()
+        )
+        self.assertFalse(
+            Recipe.tags.through.objects.filter(tag=self.tag).exists()
+        )
+        self.assertTrue(Tag.objects.filter(id=self.tag.id).exists())
+
+    def test_purge_keeps_image_shared_with_clone(self):
+        """ Test that purging keeps an image a cloned recipe still uses """
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                self.recipe.image = sample_image()
+                self.recipe.save()
+                path = self.recipe.image.path
+                clone_recipes([self.recipe])
+                self.recipe.soft_delete()
+                self.age(Recipe, id=self.recipe.id)
+
+                call_command('purge_deleted', stdout=open(os.devnull, 'w'))
+
+                self.assertTrue(os.path.exists(path))
+
+    def test_purge_deleted_tag(self):
+        """ Test that purging a tag unlinks it from live recipes """
+        self.tag.soft_delete()
+        self.age(Tag)
+        call_command('purge_deleted', stdout=open(os.devnull, 'w'))
+
+        self.assertFalse(Tag.all_objects.filter(id=self.tag.id).exists())
+        self.assertTrue(Recipe.objects.filter(id=self.recipe.id).exists())
+        self.assertFalse(self.recipe.tags.exists())
+
+    def test_purge_deleted_user_in_batches(self):
+        """ Test that purging a user removes everything they own """
+        for index in range(5):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {index}',
+                time_minutes=5, price=5.00
+            )
+        other = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        Tag.objects.create(user=other, name='Vegan')
+        self.user.soft_delete()
+        self.age(get_user_model(), id=self.user.id)
+
+        call_command(
+            'purge_deleted', batch_size=2, stdout=open(os.devnull, 'w')
+        )
+
+        self.assertFalse(
+            get_user_model().all_objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.all_objects.filter(user=self.user).exists())
+        self.assertFalse(Tag.all_objects.filter(user=self.user).exists())
+        self.assertFalse(
+            Ingredient.all_objects.filter(user=self.user).exists()
+        )
+        self.assertFalse(Change.objects.filter(user=self.user).exists())
+        self.assertTrue(Tag.objects.filter(user=other).exists())
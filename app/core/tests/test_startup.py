@@ -0,0 +1,38 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.urls import get_resolver
+from core.startup import warm_up
+
+
+class StartupTests(SimpleTestCase):
+
+    def test_warm_up_builds_resolver(self):
+        """ Test that warming up populates the URL resolver """
+        warm_up()
+
+        self.assertTrue(get_resolver()._populated)
+
+    def test_api_settings_drop_unused_apps(self):
+        """ Test that the API-only profile leaves out browser features """
+        from app import settings_api
+
+        for app in ('django.contrib.admin', 'django.contrib.sessions',
+                    'django.contrib.messages'):
+            self.assertNotIn(app, settings_api.INSTALLED_APPS)
+        self.assertNotIn(
+            'django.middleware.csrf.CsrfViewMiddleware',
+            settings_api.MIDDLEWARE
+        )
+
+    def test_startup_benchmark(self):
+        """ Test that the benchmark reports the startup of a new process """
+        out = StringIO()
+        call_command(
+            'startup_benchmark', settings_modules=['app.settings_api'],
+            repeat=1, stdout=out
+        )
+
+        self.assertIn('app.settings_api', out.getvalue())
+        self.assertIn('first_request', out.getvalue())
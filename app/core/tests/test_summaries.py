@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from core.models import Recipe, Tag, Ingredient
+
+
+class RecipeSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Cacik',
+            time_minutes=5,
+            price=5.00
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Cucumber'
+        )
+
+    def assertSummaries(self, tags, ingredients):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.tag_list, tags)
+        self.assertEqual(self.recipe.ingredient_list, ingredients)
+
+    def test_summaries_follow_m2m_changes(self):
+        """ Test that adding and removing links updates the summaries """
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        self.assertSummaries(
+            [[self.tag.id, 'Vegan']],
+            [[self.ingredient.id, 'Cucumber']]
+        )
+
+        self.recipe.tags.remove(self.tag)
+        self.recipe.ingredients.clear()
+        self.assertSummaries([], [])
+
+    def test_summaries_follow_reverse_m2m_changes(self):
+        """ Test that changes made from the tag side update the recipe """
+        self.tag.recipe_set.add(self.recipe)
+        self.assertSummaries([[self.tag.id, 'Vegan']], [])
+
+        self.tag.recipe_set.clear()
+        self.assertSummaries([], [])
+
+    def test_summaries_follow_renames_and_deletes(self):
+        """ Test that renamed and deleted tags are reflected """
+        self.recipe.tags.add(self.tag)
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+        self.assertSummaries([[self.tag.id, 'Vegetarian']], [])
+
+        self.tag.delete()
+        self.assertSummaries([], [])
+
+    def test_recipe_save_keeps_summaries(self):
+        """ Test that saving a stale recipe instance keeps the summaries """
+        stale = Recipe.objects.get(id=self.recipe.id)
+        self.recipe.tags.add(self.tag)
+
+        stale.title = 'Tzatziki'
+        stale.save()
+
+        self.assertSummaries([[self.tag.id, 'Vegan']], [])
+
+    def test_check_and_rebuild_command(self):
+        """ Test that the command detects and repairs stale summaries """
+        self.recipe.tags.add(self.tag)
+        Recipe.objects.filter(id=self.recipe.id).update(tag_list=[])
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_summaries', check=True)
+
+        call_command('rebuild_recipe_summaries')
+        call_command('rebuild_recipe_summaries', check=True)
+        self.assertSummaries([[self.tag.id, 'Vegan']], [])
@@ -0,0 +1,123 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe
+from core.throttling import LocalBucketStore, get_bucket_store
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def throttle_rates(**rates):
+    """ Return REST framework settings using the given throttle rates """
+    defaults = {
+        'anon': '100/min',
+        'user': '100/min',
+        'reads': '100/min',
+        'writes': '100/min',
+        'uploads': '100/min',
+    }
+    defaults.update(rates)
+    return {
+        'DEFAULT_THROTTLE_CLASSES': [
+            'core.throttling.UserTokenBucketThrottle',
+            'core.throttling.ScopedTokenBucketThrottle',
+        ],
+        'DEFAULT_THROTTLE_RATES': defaults,
+    }
+
+
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        get_bucket_store().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(reads='2/min'))
+    def test_reads_throttled(self):
+        """ Test that a user exceeding their read budget gets a 429 """
+        for _ in range(2):
+            response = self.client.get(RECIPES_URL)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertEqual(response['Retry-After'], '30')
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(uploads='1/min'))
+    def test_upload_budget_separate_from_reads(self):
+        """ Test that uploads have their own budget """
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1.00
+        )
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+        self.client.post(url, {'image': 'notimage'}, format='multipart')
+
+        response = self.client.post(
+            url, {'image': 'notimage'}, format='multipart'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        response = self.client.get(RECIPES_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(reads='1/min'))
+    def test_budgets_are_per_user(self):
+        """ Test that a throttled user does not affect other users """
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        self.client.force_authenticate(other)
+
+        response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LocalBucketStoreTests(TestCase):
+
+    def setUp(self):
+        self.store = LocalBucketStore()
+        self.store.max_size = 10
+
+    def test_least_recently_used_evicted_when_full(self):
+        """ Test that live buckets are evicted, least recently used first,
+            once the store is full """
+        for i in range(10):
+            self.store.set(f'key{i}', (1, time.time()), 60)
+        self.store.set('key0', (0, time.time()), 60)
+
+        self.store.set('new', (1, time.time()), 60)
+
+        self.assertLessEqual(len(self.store._buckets), 10)
+        self.assertIsNotNone(self.store.get('key0'))
+        self.assertIsNotNone(self.store.get('new'))
+        self.assertIsNone(self.store.get('key1'))
+        self.assertIsNotNone(self.store.get('key2'))
+
+    def test_expired_buckets_pruned_first(self):
+        """ Test that expired buckets are dropped before live ones """
+        self.store.set('old', (1, time.time() - 120), 60)
+        for i in range(9):
+            self.store.set(f'key{i}', (1, time.time()), 60)
+
+        self.store.set('new', (1, time.time()), 60)
+
+        self.assertIsNone(self.store.get('old'))
+        self.assertIsNotNone(self.store.get('key0'))
+        self.assertIsNotNone(self.store.get('new'))
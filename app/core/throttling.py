@@ -0,0 +1,157 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_stores = {}
+
+
+class LocalBucketStore:
+    """ Keep token buckets in the memory of the current process
+
+    Buckets are read and replaced with single dict operations, which are
+    atomic under the GIL, so no lock is taken on the request path. Two
+    threads racing on the same bucket may both spend the same token; the
+    resulting over-admission is bounded by the number of threads.
+
+    Every request writes its bucket back, and buckets are reinserted when
+    written, so the dict stays ordered from least to most recently used.
+    Once max_size buckets are held, expired buckets are dropped and then
+    the least recently used ones, until a tenth of the store is free.
+    """
+    max_size = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._prune_lock = threading.Lock()
+
+    def get(self, key):
+        return self._buckets.get(key)
+
+    def set(self, key, state, ttl):
+        if self._buckets.pop(key, None) is None:
+            if len(self._buckets) >= self.max_size:
+                self.prune()
+        self._buckets[key] = (state[0], state[1], state[1] + ttl)
+
+    def prune(self):
+        """ Drop expired buckets, then the least recently used ones """
+        with self._prune_lock:
+            now = time.time()
+            for key, state in list(self._buckets.items()):
+                if state[2] <= now:
+                    self._buckets.pop(key, None)
+            excess = len(self._buckets) - (self.max_size - self.max_size // 10)
+            if excess > 0:
+                for key in list(self._buckets)[:excess]:
+                    self._buckets.pop(key, None)
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class CacheBucketStore:
+    """ Share token buckets between processes through a Django cache """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, state, ttl):
+        self.cache.set(key, state, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def get_bucket_store():
+    """ Return the bucket store configured by THROTTLE_BUCKET_STORE """
+    path = settings.THROTTLE_BUCKET_STORE
+    store = _stores.get(path)
+    if store is None:
+        store = _stores.setdefault(path, import_string(path)())
+    return store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """ Limit request rates with token buckets
+
+    Rates use the usual DRF "<requests>/<period>" syntax and are read from
+    DEFAULT_THROTTLE_RATES. A bucket holds up to <requests> tokens, one
+    is spent per request and they refill continuously over <period>, so
+    short bursts are allowed while the average rate stays bounded.
+    """
+    scope = None
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'anon:{self.get_ident(request)}'
+
+    def parse_rate(self, rate):
+        """ Return the bucket capacity and its refill period in seconds """
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        capacity, period = self.parse_rate(rate)
+        refill = capacity / period
+        # The rate is part of the key so that changing it starts afresh
+        key = f'throttle:{scope}:{rate}:{self.get_ident_key(request)}'
+        store = get_bucket_store()
+        now = time.time()
+
+        state = store.get(key)
+        tokens, stamp = (capacity, now) if state is None else state[:2]
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        if tokens < 1:
+            self.retry_after = (1 - tokens) / refill
+            store.set(key, (tokens, now), period)
+            return False
+
+        store.set(key, (tokens - 1, now), period)
+        return True
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """ Overall budget of a user, or of a client address when anonymous """
+
+    def get_scope(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return 'user'
+        return 'anon'
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """ Per endpoint budget of a user
+
+    Views pick their budget with a `throttle_scope` attribute, which can be
+    set per action. Without one, reads and writes get separate budgets.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        return 'reads' if request.method in SAFE_METHODS else 'writes'
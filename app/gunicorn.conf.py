@@ -0,0 +1,64 @@
+"""
+Gunicorn configuration for production.
+
+Run from this directory with `gunicorn`, which picks this file up. Every
+value can be overridden with the GUNICORN_* environment variables below.
+
+The app is imported once in the master and workers are forked from it,
+sharing its memory copy-on-write. Because of that, `kill -HUP` restarts
+the workers on the already loaded code; to deploy new code gracefully,
+send USR2 to start a new master, then QUIT to the old one, or run with
+GUNICORN_PRELOAD=0 so HUP reloads the code too.
+"""
+import os
+
+
+def cpu_count():
+    """ Return the CPUs this process may run on, which inside a container
+        can be fewer than the machine has """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = 'app.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Threaded workers overlap database and cache waits; the processes give
+# parallelism on every CPU, threads multiply them by the I/O overlap.
+worker_class = 'gthread'
+workers = env_int('GUNICORN_WORKERS', cpu_count() * 2 + 1)
+threads = env_int('GUNICORN_THREADS', 4)
+
+# Recycle workers after a jittered number of requests so slow memory
+# growth is bounded and workers don't all restart at once.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER',
+                              max_requests // 10)
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Heartbeat files on a tmpfs, Docker's overlay filesystem can stall them
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    """ Close the master's database connections before forking, a socket
+        shared by two processes gets corrupted as soon as both use it """
+    from django.db import connections
+    from core.backends.postgresql.base import close_pools
+
+    connections.close_all()
+    close_pools()
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        """ Connect the signal handlers maintaining the recommendation
+            index and the statistics cache """
+        from recipe import signals  # noqa: F401
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+from rest_framework.renderers import BaseRenderer
+from core.pubsub import get_broker
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """ Let clients ask for text/event-stream, and render errors raised
+        before the stream starts as a single JSON payload """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset)
+
+
+class TooManyStreams(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many open event streams, try again shortly.')
+    default_code = 'too_many_streams'
+
+    def __init__(self):
+        super().__init__()
+        self.wait = settings.EVENT_STREAM_RETRY_AFTER
+
+
+def close_connections():
+    """ Close the database connections of the current thread so that a
+        stream does not hold one for as long as it is open; connections
+        inside a transaction are left alone """
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+class EventStream:
+    """ Events published to a user, holding one of the worker's
+        EVENT_STREAM_MAX_PER_WORKER stream slots until closed
+
+    Raise TooManyStreams when every slot is taken, so that streams never
+    occupy all the threads of a worker.
+    """
+
+    def __init__(self, user_id, cursor):
+        global _open_streams
+        with _open_streams_lock:
+            if _open_streams >= settings.EVENT_STREAM_MAX_PER_WORKER:
+                raise TooManyStreams()
+            _open_streams += 1
+        self.user_id = user_id
+        self.cursor = cursor
+        self.closed = False
+
+    def __iter__(self):
+        return event_stream(self.user_id, self.cursor)
+
+    def close(self):
+        global _open_streams
+        with _open_streams_lock:
+            if not self.closed:
+                self.closed = True
+                _open_streams -= 1
+
+
+def format_event(event, data):
+    """ Encode one server-sent event """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+def event_stream(user_id, cursor):
+    """ Yield the events published to a user until the stream expires
+
+    The first event carries the change feed cursor the client can sync
+    from; a comment is sent whenever nothing happened for a heartbeat so
+    proxies keep the connection open.
+    """
+    subscription = get_broker().subscribe(user_id)
+    try:
+        yield format_event('ready', {'cursor': cursor})
+        deadline = time.monotonic() + settings.EVENT_STREAM_MAX_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = subscription.get(
+                min(settings.EVENT_STREAM_HEARTBEAT, remaining)
+            )
+            if message is None:
+                yield b': keepalive\n\n'
+            else:
+                yield format_event(*message)
+    finally:
+        subscription.close()
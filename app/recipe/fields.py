@@ -0,0 +1,240 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+def resolve_pks(queryset, pks):
+    """ Look up a list of primary keys with one query
+
+    Return the objects found, keyed by primary key, and the keys that do
+    not exist in the queryset. Large lists are split in batches by
+    in_bulk() as the database requires.
+    """
+    objects = queryset.in_bulk(set(pks))
+    missing = [pk for pk in pks if pk not in objects]
+
+    return objects, missing
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """ Many related field validating all submitted keys at once
+
+    Lists longer than `max_length` are refused before any key is looked up.
+    """
+    default_error_messages = dict(
+        serializers.ManyRelatedField.default_error_messages,
+        max_length=_('Ensure this field has no more than {max_length} '
+                     'elements.'),
+    )
+    max_length = None
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        if self.max_length is not None and len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+
+        return self.child_relation.to_internal_values(data)
+
+
+class UserOwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """ Primary key field accepting only objects of the request user
+
+    With many=True every submitted key is looked up with a single query
+    instead of one query per key, which also suits bulk endpoints taking
+    long lists of ids.
+
+    With create_by_name=True, names are accepted as well as keys. Names
+    are matched against the user's objects in the same query, and names
+    that do not exist yet come back as unsaved instances for the
+    serializer to create; see save_new_objects().
+    """
+    default_error_messages = {
+        'blank_name': _('Names may not be blank.'),
+    }
+
+    def __init__(self, **kwargs):
+        self.create_by_name = kwargs.pop('create_by_name', False)
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        """ Limit the choices to objects owned by the request user """
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None:
+            queryset = queryset.filter(user=request.user)
+        return queryset
+
+    def _error(self, key, **kwargs):
+        """ Return the detail of a validation error without raising it """
+        try:
+            self.fail(key, **kwargs)
+        except serializers.ValidationError as exc:
+            return exc.detail
+
+    def to_pk(self, data):
+        """ Convert a submitted value to a primary key """
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def to_key(self, data):
+        """ Return ('pk', key) or ('name', name) for a submitted value """
+        if self.create_by_name and isinstance(data, str) and \
+                not data.strip().isdigit():
+            name = data.strip()
+            if not name:
+                self.fail('blank_name')
+            return 'name', name
+        return 'pk', self.to_pk(data)
+
+    def _lookup(self, keys):
+        """ Fetch the objects matching keys and names with one query """
+        pks = [value for kind, value in keys if kind == 'pk']
+        names = [value for kind, value in keys if kind == 'name']
+        if not names:
+            objects, missing = resolve_pks(self.get_queryset(), pks)
+            return {('pk', pk): obj for pk, obj in objects.items()}
+
+        found = {}
+        queryset = self.get_queryset().filter(
+            Q(pk__in=set(pks)) | Q(name__in=set(names))
+        )
+        for obj in queryset:
+            found[('pk', obj.pk)] = obj
+            found[('name', obj.name)] = obj
+        return found
+
+    def _new_object(self, name):
+        model = self.get_queryset().model
+        request = self.context.get('request')
+        return model(name=name, user=getattr(request, 'user', None))
+
+    def resolve(self, data):
+        """ Return the object of every submitted value, in order
+
+        Errors are reported for every invalid item, keyed by its position
+        in the submitted list.
+        """
+        errors = {}
+        keys = []
+        for index, item in enumerate(data):
+            try:
+                keys.append((index, self.to_key(item)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        found = self._lookup([key for index, key in keys])
+        missing = {
+            index: self._error('does_not_exist', pk_value=key[1])
+            for index, key in keys if key[0] == 'pk' and key not in found
+        }
+        if missing:
+            raise serializers.ValidationError(missing)
+
+        resolved = []
+        for index, key in keys:
+            obj = found.get(key)
+            if obj is None:
+                obj = found[key] = self._new_object(key[1])
+            resolved.append(obj)
+
+        return resolved
+
+    def to_internal_values(self, data):
+        """ Return the objects for a list of primary keys, in order and
+            without duplicates """
+        objects = {}
+        for obj in self.resolve(data):
+            objects.setdefault(obj.pk or ('name', obj.name), obj)
+
+        return list(objects.values())
+
+
+class IngredientAmountSerializer(serializers.Serializer):
+    """ Ingredient of a recipe given with the amount needed """
+    ingredient = serializers.JSONField()
+    quantity = serializers.DecimalField(
+        max_digits=8, decimal_places=2, min_value=0,
+        required=False, allow_null=True
+    )
+    unit = serializers.CharField(max_length=32, required=False,
+                                 allow_blank=True)
+
+
+class IngredientAmountField(UserOwnedPrimaryKeyRelatedField):
+    """ Ingredients field also accepting objects with the amount needed,
+        as in {"ingredient": 1, "quantity": "0.5", "unit": "cup"}
+
+    With many=True the internal value is a list of (ingredient, amount)
+    pairs, amount holding the quantity and unit given, if any.
+    """
+
+    def to_internal_values(self, data):
+        values = []
+        amounts = []
+        errors = {}
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                values.append(item)
+                amounts.append({})
+                continue
+            amount = IngredientAmountSerializer(data=item)
+            if not amount.is_valid():
+                errors[index] = amount.errors
+                continue
+            amount = dict(amount.validated_data)
+            values.append(amount.pop('ingredient'))
+            amounts.append(amount)
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        pairs = {}
+        for obj, amount in zip(self.resolve(values), amounts):
+            pairs.setdefault(obj.pk or ('name', obj.name), (obj, amount))
+
+        return list(pairs.values())
+
+
+def save_new_objects(objects):
+    """ Create the unsaved objects of a list in bulk
+
+    Rows created concurrently by another request are reused thanks to the
+    unique (user, name) constraint. Return the list with every object
+    saved, keeping its order.
+    """
+    new = [obj for obj in objects if obj.pk is None]
+    if not new:
+        return objects
+
+    model = type(new[0])
+    model.objects.bulk_create(new, ignore_conflicts=True)
+    saved = {
+        (obj.user_id, obj.name): obj
+        for obj in model.objects.filter(
+            user_id__in={obj.user_id for obj in new},
+            name__in={obj.name for obj in new}
+        )
+    }
+
+    return [
+        saved[(obj.user_id, obj.name)] if obj.pk is None else obj
+        for obj in objects
+    ]
@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from core.models import Recipe
+from core.routers import shard_for_user_id
+
+
+FIELDS = ('tags', 'ingredients')
+
+""" Column of the through table holding the linked object for a field """
+COLUMNS = {'tags': 'tag_id', 'ingredients': 'ingredient_id'}
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(value):
+        """ Return the number of bits set in an integer """
+        return bin(value).count('1')
+
+
+class RecipeIndex:
+    """ In-memory bitsets of the tags and ingredients of a user's recipes
+
+    Every tag and ingredient gets a bit position, and every recipe is
+    stored as one Python int per field with the bits of its links set, so
+    coverage and similarity come down to a few integer operations per
+    recipe. Posting sets of the recipes linked to each tag and ingredient
+    restrict the scoring to recipes sharing at least one of them.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.positions = {field: {} for field in FIELDS}
+        self.targets = {field: [] for field in FIELDS}
+        self.postings = {field: {} for field in FIELDS}
+        self.masks = {}
+        self.built_at = time.monotonic()
+        self.epoch = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, user_id, using=None):
+        """ Build the index of a user from the through tables, read from
+            the shard of the user unless `using` is given """
+        index = cls(user_id)
+        using = using or shard_for_user_id(user_id)
+        recipes = Recipe.objects.using(using).filter(user_id=user_id)
+        for recipe_id in recipes.values_list('id', flat=True):
+            index.masks[recipe_id] = {field: 0 for field in FIELDS}
+        for field in FIELDS:
+            through = Recipe._meta.get_field(field).remote_field.through
+            rows = through.objects.using(using).filter(
+                user_id=user_id,
+                recipe__deleted_at__isnull=True,
+                **{f'{COLUMNS[field][:-3]}__deleted_at__isnull': True}
+            ).values_list('recipe_id', COLUMNS[field])
+            for recipe_id, target_id in rows:
+                index._link(recipe_id, field, target_id)
+
+        return index
+
+    def bit(self, field, target_id):
+        """ Return the bit of a tag or ingredient, allocating it if new """
+        positions = self.positions[field]
+        position = positions.get(target_id)
+        if position is None:
+            position = positions[target_id] = len(positions)
+            self.targets[field].append(target_id)
+        return 1 << position
+
+    def mask(self, field, target_ids):
+        """ Return the bits of known tags or ingredients """
+        positions = self.positions[field]
+        mask = 0
+        for target_id in target_ids:
+            if target_id in positions:
+                mask |= 1 << positions[target_id]
+        return mask
+
+    def _targets_of(self, field, mask):
+        """ Return the tag or ingredient ids whose bits are set in mask """
+        targets = self.targets[field]
+        return [
+            targets[position] for position in range(mask.bit_length())
+            if mask >> position & 1
+        ]
+
+    def _link(self, recipe_id, field, target_id):
+        masks = self.masks.setdefault(recipe_id, {name: 0 for name in FIELDS})
+        masks[field] |= self.bit(field, target_id)
+        self.postings[field].setdefault(target_id, set()).add(recipe_id)
+
+    def _unlink(self, recipe_id, field, target_ids):
+        masks = self.masks.get(recipe_id)
+        if masks is not None:
+            masks[field] &= ~self.mask(field, target_ids)
+        for target_id in target_ids:
+            self.postings[field].get(target_id, set()).discard(recipe_id)
+
+    def add_recipe(self, recipe_id):
+        with self.lock:
+            self.masks.setdefault(recipe_id, {field: 0 for field in FIELDS})
+
+    def remove_recipe(self, recipe_id):
+        with self.lock:
+            masks = self.masks.get(recipe_id)
+            if masks is None:
+                return
+            for field in FIELDS:
+                self._unlink(
+                    recipe_id, field, self._targets_of(field, masks[field])
+                )
+            del self.masks[recipe_id]
+
+    def link(self, recipe_id, field, target_ids):
+        with self.lock:
+            for target_id in target_ids:
+                self._link(recipe_id, field, target_id)
+
+    def unlink(self, recipe_id, field, target_ids=None):
+        """ Remove links of a recipe, or all of them without target_ids """
+        with self.lock:
+            if target_ids is None:
+                masks = self.masks.get(recipe_id)
+                if masks is None:
+                    return
+                target_ids = self._targets_of(field, masks[field])
+            self._unlink(recipe_id, field, target_ids)
+
+    def _candidates(self, field, target_ids):
+        """ Return the recipes linked to any of the given objects """
+        postings = self.postings[field]
+        candidates = set()
+        for target_id in target_ids:
+            candidates.update(postings.get(target_id, ()))
+        return candidates
+
+    def cookable(self, ingredient_ids, limit):
+        """ Rank recipes by the share of their ingredients on hand
+
+        Return (recipe id, coverage, number of missing ingredients) for the
+        best matches among recipes using at least one of the ingredients.
+        """
+        # Writers change the masks and postings from other threads
+        with self.lock:
+            have = self.mask('ingredients', ingredient_ids)
+            candidates = [
+                (recipe_id, self.masks[recipe_id]['ingredients'])
+                for recipe_id in self._candidates('ingredients', ingredient_ids)
+                if recipe_id in self.masks
+            ]
+
+        results = []
+        for recipe_id, need in candidates:
+            needed = popcount(need)
+            missing = popcount(need & ~have)
+            results.append(
+                (recipe_id, (needed - missing) / needed, missing)
+            )
+        results.sort(key=lambda result: (-result[1], result[2], result[0]))
+
+        return results[:limit]
+
+    def similar(self, recipe_id, limit):
+        """ Rank recipes by Jaccard similarity of their tags and
+            ingredients with a recipe
+
+        Return (recipe id, similarity) for the best matches.
+        """
+        with self.lock:
+            source = self.masks.get(recipe_id)
+            if source is None:
+                return []
+            source = dict(source)
+            candidates = set()
+            for field in FIELDS:
+                candidates |= self._candidates(
+                    field, self._targets_of(field, source[field])
+                )
+            candidates.discard(recipe_id)
+            candidates = [
+                (other_id, dict(self.masks[other_id]))
+                for other_id in candidates if other_id in self.masks
+            ]
+
+        results = []
+        for other_id, masks in candidates:
+            union = shared = 0
+            for field in FIELDS:
+                union += popcount(source[field] | masks[field])
+                shared += popcount(source[field] & masks[field])
+            results.append((other_id, shared / union))
+        results.sort(key=lambda result: (-result[1], result[0]))
+
+        return results[:limit]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(user_id, using=None, epoch=None):
+    """ Return the index of a user, building it on first use
+
+    Indexes are rebuilt after RECOMMENDATION_INDEX_TTL seconds to pick up
+    changes made by other processes, and only the most recently used
+    RECOMMENDATION_INDEX_MAX_USERS indexes are kept. Given the
+    `changes_epoch` of the user, an index built at another epoch, e.g.
+    before the user moved shards, is rebuilt too.
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and epoch in (None, index.epoch):
+            age = time.monotonic() - index.built_at
+            if age < settings.RECOMMENDATION_INDEX_TTL:
+                _indexes.move_to_end(user_id)
+                return index
+
+    index = RecipeIndex.build(user_id, using)
+    index.epoch = epoch
+    with _indexes_lock:
+        _indexes[user_id] = index
+        while len(_indexes) > settings.RECOMMENDATION_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def cached_index(user_id):
+    """ Return the index of a user if it is built, without building it """
+    return _indexes.get(user_id)
+
+
+def drop_index(user_id):
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def clear_indexes():
+    with _indexes_lock:
+        _indexes.clear()
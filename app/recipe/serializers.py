@@ -1,8 +1,80 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, RecipeIngredient, \
+    RecipeRevision
+from core.revisions import FIELDS as REVISION_FIELDS, record_revision
+from core.summaries import refresh_recipe_summaries
+from recipe.fields import IngredientAmountField, \
+    UserOwnedPrimaryKeyRelatedField, save_new_objects
 
 
-class TagSerializer(serializers.ModelSerializer):
+def update_m2m(instance, field_name, targets, values=None):
+    """ Make a many-to-many field hold exactly the given objects, touching
+        only the through rows that have to change
+
+    `values` holds the through fields of each target, if any. Through
+    models with a `position` get the place of each target in the list.
+    """
+    targets = save_new_objects(targets)
+    manager = getattr(instance, field_name)
+    through = manager.through.objects.filter(
+        **{manager.source_field_name: instance}
+    )
+    column = f'{manager.target_field_name}_id'
+    fields = [
+        field.attname for field in manager.through._meta.concrete_fields
+        if not field.primary_key and not field.is_relation
+    ]
+
+    wanted = {}
+    for position, target in enumerate(targets):
+        row = dict(values[position]) if values else {}
+        if 'position' in fields:
+            row['position'] = position
+        wanted[target.pk] = row
+    current = set(through.values_list(column, flat=True))
+
+    removed = current - set(wanted)
+    if removed:
+        manager.remove(*removed)
+    added = set(wanted) - current
+    if added:
+        manager.add(*added)
+    if not fields:
+        return
+
+    changed = []
+    for link in through.only('id', column, *fields):
+        row = wanted[getattr(link, column)]
+        if any(getattr(link, name) != value for name, value in row.items()):
+            for name, value in row.items():
+                setattr(link, name, value)
+            changed.append(link)
+    if changed:
+        manager.through.objects.bulk_update(changed, fields)
+        # Links are added and removed with signals keeping the summaries
+        # up to date, but their order is changed behind their back
+        refresh_recipe_summaries([instance.pk], instance._state.db)
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """ Base serializer for user owned recipe attributes """
+
+    def validate_name(self, value):
+        """ Reject names the user already has """
+        request = self.context.get('request')
+        if request is not None and self.Meta.model.objects.filter(
+                user=request.user, name=value).exists():
+            raise serializers.ValidationError(
+                _('You already have one with this name.'), code='unique'
+            )
+        return value
+
+
+class TagSerializer(RecipeAttrSerializer):
     """ Serializer for tag objects """
 
     class Meta:
@@ -11,7 +83,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """ Serializer for ingredient objects """
 
     class Meta:
@@ -21,14 +93,22 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    """ Serializer for recipe objects """
-    ingredients = serializers.PrimaryKeyRelatedField(
+    """ Serializer for recipe objects
+
+    Tags and ingredients are given by id or by name; unknown names are
+    created for the user along with the recipe. Ingredients are kept in
+    the order given and may come with their quantity and unit; those given
+    by id or name alone keep the amount they had.
+    """
+    ingredients = IngredientAmountField(
         many=True,
-        queryset=Ingredient.objects.all()
+        queryset=Ingredient.objects.all(),
+        create_by_name=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserOwnedPrimaryKeyRelatedField(
         many=True,
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        create_by_name=True
     )
 
     class Meta:
@@ -38,12 +118,135 @@ class RecipeSerializer(serializers.ModelSerializer):
                   )
         read_only_fields = ('id',)
 
+    def _pop_m2m(self, validated_data):
+        """ Return the targets and through values of each given field """
+        related = {}
+        if 'ingredients' in validated_data:
+            pairs = validated_data.pop('ingredients')
+            related['ingredients'] = (
+                [ingredient for ingredient, _ in pairs],
+                [amount for _, amount in pairs]
+            )
+        if 'tags' in validated_data:
+            related['tags'] = (validated_data.pop('tags'), None)
+        return related
+
+    def create(self, validated_data):
+        """ Create a recipe, its links and first revision in one
+            transaction """
+        related = self._pop_m2m(validated_data)
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            recipe = super().create(validated_data)
+            for field, (targets, values) in related.items():
+                update_m2m(recipe, field, targets, values)
+            record_revision(recipe)
+
+        return recipe
+
+    def update(self, instance, validated_data):
+        """ Update a recipe, writing only the links that changed, and
+            record the changes as a revision """
+        related = self._pop_m2m(validated_data)
+        with transaction.atomic(using=instance._state.db):
+            recipe = super().update(instance, validated_data)
+            for field, (targets, values) in related.items():
+                update_m2m(recipe, field, targets, values)
+            record_revision(recipe)
+
+        return recipe
+
+
+class RecipeListSerializer(RecipeSerializer):
+    """ Serializer for recipe lists, reading tags and ingredients from the
+        denormalized summaries instead of the through tables """
+    ingredients = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+
+    def get_ingredients(self, obj):
+        return [item[0] for item in obj.ingredient_list]
+
+    def get_tags(self, obj):
+        return [item[0] for item in obj.tag_list]
+
+
+class CookableRecipeSerializer(RecipeListSerializer):
+    """ Serializer for recipes ranked by the ingredients on hand """
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class SimilarRecipeSerializer(RecipeListSerializer):
+    """ Serializer for recipes ranked by similarity """
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('similarity',)
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """ Serializer for the recipes to build a shopping list from """
+    recipes = UserOwnedPrimaryKeyRelatedField(
+        many=True,
+        queryset=Recipe.objects.only('id'),
+        allow_empty=False
+    )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['recipes'].max_length = settings.SHOPPING_LIST_MAX_RECIPES
+        return fields
+
+
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    """ Serializer for the ingredients of a recipe with their amounts """
+    id = serializers.IntegerField(source='ingredient_id', read_only=True)
+    name = serializers.CharField(source='ingredient.name', read_only=True)
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'name', 'quantity', 'unit')
+        read_only_fields = fields
+
+
+class RecipeCloneSerializer(serializers.Serializer):
+    """ Serializer for cloning a recipe, optionally under another title """
+    title = serializers.CharField(max_length=255, required=False)
+
+
+class RecipeMultiCloneSerializer(serializers.Serializer):
+    """ Serializer for the recipes to clone at once """
+    recipes = UserOwnedPrimaryKeyRelatedField(
+        many=True,
+        queryset=Recipe.objects.all(),
+        allow_empty=False
+    )
+
+    def validate_recipes(self, value):
+        if len(value) > settings.RECIPE_CLONE_MAX:
+            raise serializers.ValidationError(
+                _('Ensure this field has no more than {count} elements.')
+                .format(count=settings.RECIPE_CLONE_MAX),
+                code='max_length'
+            )
+        return value
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """ Serializer for recipe detail """
-    ingredients = IngredientSerializer(many=True, read_only=True)
+    ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
 
+    def get_ingredients(self, obj):
+        """ Return the ingredients in order, read with their amounts from
+            the partition of the owner """
+        links = obj.recipeingredient_set.filter(
+            user_id=obj.user_id, ingredient__deleted_at__isnull=True
+        ).select_related('ingredient').order_by('position', 'ingredient_id')
+        return RecipeIngredientSerializer(links, many=True).data
+
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """ Serializer for uploading images to recipes """
@@ -52,3 +255,60 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'image')
         read_only_field = ('id',)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic(using=instance._state.db):
+            recipe = super().update(instance, validated_data)
+            record_revision(recipe)
+
+        return recipe
+
+
+class RecipeRevisionSerializer(serializers.ModelSerializer):
+    """ Serializer for the revisions of a recipe """
+    changed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RecipeRevision
+        fields = ('number', 'created_at', 'changed')
+        read_only_fields = fields
+
+    def get_changed(self, obj):
+        """ Return the fields changed by the revision, all for the first """
+        if obj.delta is None:
+            return list(REVISION_FIELDS) + ['tags', 'ingredients']
+        return sorted(obj.delta)
+
+
+class RecipeVersionSerializer(serializers.Serializer):
+    """ Serializer for a recipe as it was at a revision, given as a
+        (revision, state) pair from core.revisions.get_version() """
+    number = serializers.IntegerField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    title = serializers.CharField(read_only=True)
+    time_minutes = serializers.IntegerField(read_only=True)
+    price = serializers.DecimalField(max_digits=5, decimal_places=2,
+                                     read_only=True)
+    link = serializers.CharField(read_only=True)
+    image = serializers.CharField(read_only=True)
+    tags = serializers.ListField(child=serializers.IntegerField(),
+                                 read_only=True)
+    ingredients = serializers.ListField(read_only=True)
+
+    def to_representation(self, instance):
+        revision, state = instance
+        ingredients = sorted(
+            state['ingredients'].items(),
+            key=lambda item: (item[1][0], int(item[0]))
+        )
+        return super().to_representation(dict(
+            state,
+            number=revision.number,
+            created_at=revision.created_at,
+            image=default_storage.url(state['image']) if state['image']
+            else None,
+            ingredients=[
+                {'id': int(key), 'quantity': quantity, 'unit': unit}
+                for key, (_, quantity, unit) in ingredients
+            ]
+        ))
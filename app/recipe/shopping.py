@@ -0,0 +1,71 @@
+import json
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from core.models import Recipe
+
+
+def chunks(items, size):
+    """ Split a list in consecutive chunks of at most size items """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _item(row):
+    return {
+        'id': row['ingredient_id'],
+        'name': row['ingredient__name'],
+        'recipe_count': row['recipe_count'],
+    }
+
+
+def shopping_list(user, recipe_ids):
+    """ Merge the ingredients of a user's recipes, counting the recipes
+        using each
+
+    Yield the ingredients ordered by name from one grouped query, read
+    SHOPPING_LIST_CHUNK_SIZE rows at a time, so that large lists are
+    streamed without being held in memory. Databases capping the number of
+    parameters of a query below the number of recipes, like SQLite, get
+    one query per chunk of recipes instead and the counts are merged in
+    memory; chunks never share a recipe, so their counts add up.
+    """
+    through = Recipe._meta.get_field('ingredients').remote_field.through
+    recipe_ids = sorted(set(recipe_ids))
+    rows = through.objects.filter(
+        user=user, ingredient__deleted_at__isnull=True
+    ).values(
+        'ingredient_id', 'ingredient__name'
+    ).annotate(recipe_count=Count('recipe_id'))
+
+    # The user takes a parameter too
+    max_params = connections[rows.db].features.max_query_params
+    if max_params is None or len(recipe_ids) < max_params:
+        rows = rows.filter(recipe_id__in=recipe_ids).order_by(
+            'ingredient__name', 'ingredient_id'
+        )
+        for row in rows.iterator(settings.SHOPPING_LIST_CHUNK_SIZE):
+            yield _item(row)
+        return
+
+    merged = {}
+    for chunk in chunks(recipe_ids, max_params - 1):
+        for row in rows.filter(recipe_id__in=chunk).order_by():
+            item = merged.get(row['ingredient_id'])
+            if item is None:
+                merged[row['ingredient_id']] = _item(row)
+            else:
+                item['recipe_count'] += row['recipe_count']
+
+    yield from sorted(
+        merged.values(), key=lambda item: (item['name'], item['id'])
+    )
+
+
+def stream_json_list(items):
+    """ Render a list as JSON piece by piece """
+    yield '['
+    for position, item in enumerate(items):
+        yield (',' if position else '') + json.dumps(item)
+    yield ']'
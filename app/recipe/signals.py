@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from core.models import Recipe, Tag, Ingredient
+from core.cloning import recipes_cloned
+from core.sharding import user_moved
+from recipe import recommendations
+
+
+def recipe_links_changed(field, instance, action, reverse, pk_set, using,
+                         **kwargs):
+    """ Apply a tag or ingredient change to the recommendation index """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    def apply():
+        index = recommendations.cached_index(instance.user_id)
+        if index is None:
+            return
+        if reverse and action == 'post_clear':
+            recommendations.drop_index(instance.user_id)
+        elif reverse:
+            for recipe_id in pk_set:
+                if action == 'post_add':
+                    index.link(recipe_id, field, [instance.pk])
+                else:
+                    index.unlink(recipe_id, field, [instance.pk])
+        elif action == 'post_add':
+            index.link(instance.pk, field, pk_set)
+        else:
+            index.unlink(
+                instance.pk, field,
+                None if action == 'post_clear' else pk_set
+            )
+
+    transaction.on_commit(apply, using=using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, **kwargs):
+    recipe_links_changed('tags', **kwargs)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, **kwargs):
+    recipe_links_changed('ingredients', **kwargs)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, using, raw=False, **kwargs):
+    if raw or not created and instance.deleted_at is None:
+        return
+
+    def apply():
+        index = recommendations.cached_index(instance.user_id)
+        if index is None:
+            return
+        if instance.deleted_at is None:
+            index.add_recipe(instance.pk)
+        else:
+            index.remove_recipe(instance.pk)
+
+    transaction.on_commit(apply, using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, using, **kwargs):
+    recipe_id = instance.pk
+
+    def apply():
+        index = recommendations.cached_index(instance.user_id)
+        if index is not None:
+            index.remove_recipe(recipe_id)
+
+    transaction.on_commit(apply, using=using)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, using, **kwargs):
+    """ Deleting a tag or ingredient drops its links without m2m signals,
+        so the index of its owner is rebuilt on next use """
+    transaction.on_commit(
+        lambda: recommendations.drop_index(instance.user_id), using=using
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, using, raw=False, **kwargs):
+    """ Soft deleted tags and ingredients leave the index too """
+    if not raw and instance.deleted_at is not None:
+        recipe_attr_deleted(sender, instance, using)
+
+
+@receiver(user_moved)
+def user_shard_moved(sender, user_id, **kwargs):
+    """ Drop the index of a moved user in this process; the other ones
+        rebuild theirs once they see the new change log epoch """
+    recommendations.drop_index(user_id)
+
+
+@receiver(recipes_cloned)
+def user_recipes_cloned(sender, user_id, recipes, using, **kwargs):
+    """ Add cloned recipes to the index, their links taken from their
+        summaries since they were copied without m2m signals """
+    def apply():
+        index = recommendations.cached_index(user_id)
+        if index is None:
+            return
+        for recipe in recipes:
+            index.add_recipe(recipe.pk)
+            index.link(recipe.pk, 'tags', [pk for pk, _ in recipe.tag_list])
+            index.link(recipe.pk, 'ingredients',
+                       [pk for pk, _ in recipe.ingredient_list])
+
+    transaction.on_commit(apply, using=using)
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Min, Q
+from core.models import Change, Recipe
+
+
+""" Upper bounds of the histogram buckets, the last bucket is open """
+TIME_BUCKETS = (15, 30, 60, 120)
+PRICE_BUCKETS = (5, 10, 20, 50)
+
+
+def _bucket_aggregates(field, bounds):
+    """ Return one filtered COUNT per histogram bucket of a field """
+    aggregates = {}
+    lower = None
+    for upper in bounds + (None,):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(**{f'{field}__gte': lower})
+        if upper is not None:
+            condition &= Q(**{f'{field}__lt': upper})
+        aggregates[f'{field}_{lower}_{upper}'] = Count('id', filter=condition)
+        lower = upper
+    return aggregates
+
+
+def _histogram(field, bounds, row):
+    """ Turn the bucket counts of an aggregate row into a histogram """
+    histogram = []
+    lower = None
+    for upper in bounds + (None,):
+        histogram.append({
+            'min': lower,
+            'max': upper,
+            'count': row[f'{field}_{lower}_{upper}'],
+        })
+        lower = upper
+    return histogram
+
+
+def _top(user, field, column, top):
+    """ Return the tags or ingredients used by the most recipes """
+    through = Recipe._meta.get_field(field).remote_field.through
+    rows = through.objects.filter(
+        user=user,
+        recipe__deleted_at__isnull=True,
+        **{f'{column}__deleted_at__isnull': True}
+    ).values(
+        f'{column}_id', f'{column}__name'
+    ).annotate(
+        count=Count('recipe_id')
+    ).order_by('-count', f'{column}__name')[:top]
+
+    return [
+        {
+            'id': row[f'{column}_id'],
+            'name': row[f'{column}__name'],
+            'count': row['count'],
+        }
+        for row in rows
+    ]
+
+
+def compute_stats(user, top):
+    """ Compute the statistics of a user's recipes with grouped queries """
+    row = Recipe.objects.filter(user=user).aggregate(
+        count=Count('id'),
+        average_price=Avg('price'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        average_time_minutes=Avg('time_minutes'),
+        min_time_minutes=Min('time_minutes'),
+        max_time_minutes=Max('time_minutes'),
+        **_bucket_aggregates('time_minutes', TIME_BUCKETS),
+        **_bucket_aggregates('price', PRICE_BUCKETS)
+    )
+
+    return {
+        'count': row['count'],
+        'price': {
+            'average': row['average_price'],
+            'min': row['min_price'],
+            'max': row['max_price'],
+            'histogram': _histogram('price', PRICE_BUCKETS, row),
+        },
+        'time_minutes': {
+            'average': row['average_time_minutes'],
+            'min': row['min_time_minutes'],
+            'max': row['max_time_minutes'],
+            'histogram': _histogram('time_minutes', TIME_BUCKETS, row),
+        },
+        'top_tags': _top(user, 'tags', 'tag', top),
+        'top_ingredients': _top(user, 'ingredients', 'ingredient', top),
+    }
+
+
+def stats_version(user):
+    """ Return a version of a user's recipe library that changes on every
+        write, read from their change log
+
+    Every write appends to the log, so every process sees the same
+    version without having to be told about writes made elsewhere. The
+    horizon covers tombstones dropped from the end of the log, and the
+    epoch a log rebuilt after a move.
+    """
+    last = Change.objects.filter(user=user).aggregate(last=Max('id'))['last']
+    return f'{user.changes_epoch}.{user.changes_horizon}.{last or 0}'
+
+
+def get_stats(user, top):
+    """ Return the statistics of a user, from the cache when possible """
+    key = f'recipe-stats:{user.pk}:{stats_version(user)}:{top}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(user, top)
+        cache.set(key, stats, settings.RECIPE_STATS_CACHE_TIMEOUT)
+
+    return stats
@@ -0,0 +1,93 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, status
+from core.models import Change, Recipe, Tag, Ingredient
+from recipe import serializers
+
+""" How the objects named in the change log are loaded and serialized """
+SERIALIZERS = {
+    Change.RECIPE: (Recipe, serializers.RecipeListSerializer),
+    Change.TAG: (Tag, serializers.TagSerializer),
+    Change.INGREDIENT: (Ingredient, serializers.IngredientSerializer),
+}
+
+
+class CursorExpired(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('Changes since this cursor were compacted away, '
+                       'sync again from the start.')
+    default_code = 'cursor_expired'
+
+
+def format_cursor(user, change_id):
+    """ Return the cursor a client resumes from after a given change
+
+    The change log epoch of the user is part of the cursor once it has
+    been bumped, since change ids start over when the log is rebuilt.
+    """
+    if user.changes_epoch:
+        return f'{user.changes_epoch}.{change_id}'
+    return str(change_id)
+
+
+def parse_cursor(value):
+    """ Return the epoch and change id a client cursor stands for """
+    if value in (None, ''):
+        return 0, 0
+    epoch, dot, change_id = str(value).rpartition('.')
+    try:
+        cursor = int(epoch or 0), int(change_id)
+    except ValueError:
+        cursor = (-1, -1)
+    if min(cursor) < 0:
+        raise exceptions.ValidationError(
+            {'since': [_('A valid cursor is required.')]}
+        )
+    return cursor
+
+
+def change_feed(user, cursor, limit):
+    """ Return the changes of a user's objects after a cursor
+
+    Each change carries the current state of the object, or none when it
+    was deleted. A client without any state syncs from cursor 0, which
+    lists every live object since the log is compacted.
+    """
+    epoch, since = cursor
+    if since and (epoch != user.changes_epoch or
+                  since < user.changes_horizon):
+        raise CursorExpired()
+
+    entries = list(
+        Change.objects.filter(user=user, id__gt=since)
+        .order_by('id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    objects = {}
+    for model_name, (model, serializer_class) in SERIALIZERS.items():
+        ids = [
+            entry.object_id for entry in entries
+            if entry.model == model_name and entry.action == Change.UPSERT
+        ]
+        if ids:
+            found = model.objects.filter(user=user).in_bulk(ids)
+            objects[model_name] = {
+                pk: serializer_class(obj).data for pk, obj in found.items()
+            }
+
+    results = []
+    for entry in entries:
+        data = objects.get(entry.model, {}).get(entry.object_id)
+        results.append({
+            'model': entry.model,
+            'id': entry.object_id,
+            'action': Change.UPSERT if data is not None else Change.DELETE,
+            'data': data,
+        })
+
+    return {
+        'cursor': format_cursor(user, entries[-1].id if entries else since),
+        'has_more': has_more,
+        'changes': results,
+    }
@@ -0,0 +1,159 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, RecipeRevision
+from recipe.uploads import BatchUploadHandler
+from PIL import Image
+
+UPLOAD_IMAGES_URL = reverse('recipe:recipe-upload-images')
+
+
+def sample_recipe(user, title='Soup'):
+    """ Create and return a sample recipe """
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00
+    )
+
+
+def image_bytes():
+    """ Return the bytes of a small JPEG """
+    content = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(content, format='JPEG')
+    return content.getvalue()
+
+
+class BatchImageUploadApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe1 = sample_recipe(self.user, 'Soup')
+        self.recipe2 = sample_recipe(self.user, 'Stew')
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def test_upload_images_by_field(self):
+        """ Test uploading images in fields named after recipe ids """
+        response = self.client.post(UPLOAD_IMAGES_URL, {
+            str(self.recipe1.id): SimpleUploadedFile('a.jpg', image_bytes()),
+            str(self.recipe2.id): SimpleUploadedFile('b.jpg', image_bytes()),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['recipes']],
+            sorted([self.recipe1.id, self.recipe2.id])
+        )
+        self.assertEqual(response.data['errors'], {})
+        for recipe in (self.recipe1, self.recipe2):
+            recipe.refresh_from_db()
+            self.assertTrue(os.path.exists(recipe.image.path))
+            self.assertTrue(recipe.revisions.exists())
+
+    def test_upload_images_from_zip(self):
+        """ Test uploading a zip archive of images named after recipe ids """
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr(f'{self.recipe1.id}.jpg', image_bytes())
+            zf.writestr(f'photos/{self.recipe2.id}.jpg', image_bytes())
+
+        response = self.client.post(UPLOAD_IMAGES_URL, {
+            'archive': SimpleUploadedFile('images.zip', archive.getvalue()),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['recipes']), 2)
+        self.recipe2.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe2.image.path))
+
+    def test_upload_images_partial_errors(self):
+        """ Test that invalid images and other users' recipes are reported
+            while valid images are still stored """
+        other = get_user_model().objects.create_user(
+            'other@domain.com', 'test123'
+        )
+        other_recipe = sample_recipe(other)
+
+        response = self.client.post(UPLOAD_IMAGES_URL, {
+            str(self.recipe1.id): SimpleUploadedFile('a.jpg', image_bytes()),
+            str(self.recipe2.id): SimpleUploadedFile('b.jpg', b'notimage'),
+            str(other_recipe.id): SimpleUploadedFile('c.jpg', image_bytes()),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['recipes']), 1)
+        self.assertEqual(
+            set(response.data['errors']),
+            {str(self.recipe2.id), str(other_recipe.id)}
+        )
+        self.recipe2.refresh_from_db()
+        other_recipe.refresh_from_db()
+        self.assertFalse(self.recipe2.image)
+        self.assertFalse(other_recipe.image)
+        self.assertFalse(
+            RecipeRevision.objects.filter(recipe=self.recipe2).exists()
+        )
+
+    def test_upload_images_bad_field_name(self):
+        """ Test that files must be named after recipe ids """
+        response = self.client.post(UPLOAD_IMAGES_URL, {
+            'image': SimpleUploadedFile('a.jpg', image_bytes()),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('images', response.data)
+
+    def test_upload_images_batch_limit(self):
+        """ Test that a batch holds at most RECIPE_UPLOAD_BATCH_MAX files """
+        with self.settings(RECIPE_UPLOAD_BATCH_MAX=1):
+            response = self.client.post(UPLOAD_IMAGES_URL, {
+                str(self.recipe1.id): SimpleUploadedFile('a.jpg',
+                                                         image_bytes()),
+                str(self.recipe2.id): SimpleUploadedFile('b.jpg',
+                                                         image_bytes()),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe1.refresh_from_db()
+        self.assertFalse(self.recipe1.image)
+
+    def test_upload_images_size_limit(self):
+        """ Test that images larger than RECIPE_IMAGE_MAX_SIZE are refused
+            while the body is read """
+        with self.settings(RECIPE_IMAGE_MAX_SIZE=100):
+            response = self.client.post(UPLOAD_IMAGES_URL, {
+                str(self.recipe1.id): SimpleUploadedFile('a.jpg',
+                                                         image_bytes()),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchUploadHandlerTests(TestCase):
+
+    def test_small_files_streamed_to_disk(self):
+        """ Test that even small files are written to temporary files """
+        handler = BatchUploadHandler()
+        handler.new_file('1', 'a.jpg', 'image/jpeg', 3)
+        handler.receive_data_chunk(b'abc', 0)
+        upload = handler.file_complete(3)
+
+        self.assertTrue(os.path.exists(upload.temporary_file_path()))
+        upload.close()
@@ -0,0 +1,197 @@
+import os
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.changes import record_changes
+from core.models import Change, Recipe, Tag
+
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+def sample_recipe(user, **params):
+    """ Create and return a sample recipe """
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ChangeFeedApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None):
+        params = {} if since is None else {'since': since}
+        response = self.client.get(CHANGES_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_login_required(self):
+        """ Test that the change feed needs authentication """
+        response = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_initial_sync_lists_live_objects(self):
+        """ Test that syncing from scratch returns every object once """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+        sample_recipe(get_user_model().objects.create_user(
+            'other@domain.com', 'test123'
+        ))
+
+        data = self.sync()
+
+        self.assertFalse(data['has_more'])
+        self.assertEqual(
+            [(c['model'], c['id'], c['action']) for c in data['changes']],
+            [('tag', tag.id, 'upsert'), ('recipe', recipe.id, 'upsert')]
+        )
+        self.assertEqual(data['changes'][1]['data']['tags'], [tag.id])
+
+    def test_sync_returns_only_deltas(self):
+        """ Test that a cursor only yields later changes, compacted """
+        recipe = sample_recipe(self.user)
+        kept = sample_recipe(self.user, title='Kept')
+        cursor = self.sync()['cursor']
+
+        recipe.title = 'Renamed'
+        recipe.save()
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        deleted = Tag.objects.create(user=self.user, name='Dessert')
+        deleted.soft_delete()
+
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            [(c['model'], c['id'], c['action']) for c in data['changes']],
+            [('tag', deleted.id - 1, 'upsert'),
+             ('recipe', recipe.id, 'upsert'),
+             ('tag', deleted.id, 'delete')]
+        )
+        self.assertEqual(data['changes'][1]['data']['title'], 'Renamed')
+        self.assertIsNone(data['changes'][2]['data'])
+        self.assertNotIn(kept.id, [c['id'] for c in data['changes']
+                                   if c['model'] == 'recipe'])
+        self.assertEqual(self.sync(data['cursor'])['changes'], [])
+
+    def test_log_compacted(self):
+        """ Test that only the latest change of an object is kept """
+        recipe = sample_recipe(self.user)
+        for index in range(3):
+            recipe.title = f'Title {index}'
+            recipe.save()
+
+        self.assertEqual(
+            Change.objects.filter(model='recipe', object_id=recipe.id).count(),
+            1
+        )
+
+    def test_sync_pages(self):
+        """ Test that large feeds are split into pages """
+        for index in range(3):
+            sample_recipe(self.user, title=f'Recipe {index}')
+
+        with self.settings(CHANGE_FEED_PAGE_SIZE=2):
+            first = self.sync()
+            second = self.sync(first['cursor'])
+
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(first['changes']), 2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(second['changes']), 1)
+
+    def test_invalid_cursor(self):
+        """ Test that a malformed cursor is rejected """
+        response = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_expired_by_compaction(self):
+        """ Test that cursors older than dropped tombstones must resync """
+        sample_recipe(self.user)
+        cursor = self.sync()['cursor']
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.soft_delete()
+        Change.objects.update(created_at=timezone.now() - timedelta(days=60))
+
+        call_command('compact_changes', stdout=open(os.devnull, 'w'))
+
+        self.assertFalse(Change.objects.filter(action='delete').exists())
+        self.user.refresh_from_db()
+        response = self.client.get(CHANGES_URL, {'since': cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(len(self.sync()['changes']), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'SQLite runs one writing transaction at a time')
+class ChangeFeedCommitOrderTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since):
+        return self.client.get(CHANGES_URL, {'since': since}).data
+
+    def test_changes_committed_out_of_order_not_skipped(self):
+        """ Test that a change taking an id before a concurrent one is not
+            skipped when the other transaction commits first """
+        recorded = threading.Event()
+        release = threading.Event()
+
+        def write(object_id, hold=False):
+            try:
+                with transaction.atomic():
+                    record_changes(self.user.pk, Change.TAG, [object_id])
+                    recorded.set()
+                    if hold:
+                        release.wait(10)
+            finally:
+                connections.close_all()
+
+        cursor = self.sync(None)['cursor']
+        first = threading.Thread(target=write, args=(1, True))
+        first.start()
+        recorded.wait(10)
+        second = threading.Thread(target=write, args=(2,))
+        second.start()
+        second.join(0.5)
+
+        data = self.sync(cursor)
+        self.assertEqual(data['changes'], [])
+        cursor = data['cursor']
+
+        release.set()
+        first.join(10)
+        second.join(10)
+
+        data = self.sync(cursor)
+        self.assertEqual([c['id'] for c in data['changes']], [1, 2])
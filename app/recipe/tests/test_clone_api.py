@@ -0,0 +1,148 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.cloning import clone_recipes
+from core.models import Change, Recipe, RecipeIngredient, RecipeRevision, \
+    Tag, Ingredient
+from recipe import recommendations
+
+
+CLONE_MANY_URL = reverse('recipe:recipe-clone-many')
+
+
+def clone_url(recipe_id):
+    return reverse('recipe:recipe-clone', args=[recipe_id])
+
+
+def sample_recipe(user, title='Soup'):
+    """ Create a recipe with a tag and an ingredient """
+    recipe = Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00,
+        image='upload/recipe/soup.jpg'
+    )
+    recipe.tags.add(Tag.objects.get_or_create(user=user, name='Vegan')[0])
+    recipe.ingredients.add(
+        Ingredient.objects.get_or_create(user=user, name='Salt')[0],
+        through_defaults={'quantity': 2, 'unit': 'tsp'}
+    )
+    recipe.refresh_from_db()
+    return recipe
+
+
+class RecipeCloneApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_clone_recipe(self):
+        """ Test that a clone copies the recipe, its links and image """
+        recipe = sample_recipe(self.user)
+
+        response = self.client.post(clone_url(recipe.id), {'title': 'Stew'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        clone = Recipe.objects.get(id=response.data['id'])
+        self.assertNotEqual(clone.id, recipe.id)
+        self.assertEqual(clone.title, 'Stew')
+        self.assertEqual(clone.image.name, recipe.image.name)
+        self.assertEqual(list(clone.tags.all()), list(recipe.tags.all()))
+        link = RecipeIngredient.objects.get(recipe=clone)
+        self.assertEqual((link.user_id, link.quantity, link.unit),
+                         (self.user.id, 2, 'tsp'))
+        self.assertEqual(clone.ingredient_list, recipe.ingredient_list)
+        self.assertEqual(response.data['tags'], [clone.tag_list[0][0]])
+        self.assertEqual(
+            RecipeRevision.objects.get(recipe=clone).snapshot['title'], 'Stew'
+        )
+        self.assertTrue(Change.objects.filter(
+            model=Change.RECIPE, object_id=clone.id
+        ).exists())
+
+    def test_clone_many_recipes_bulk(self):
+        """ Test that cloning many recipes costs the same as cloning two """
+        counts = []
+        for size in (2, 20):
+            recipes = [
+                sample_recipe(self.user, f'Recipe {size}.{index}')
+                for index in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    CLONE_MANY_URL,
+                    {'recipes': [recipe.id for recipe in recipes]},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                [item['title'] for item in response.data],
+                [recipe.title for recipe in recipes]
+            )
+            counts.append(len(queries))
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            RecipeIngredient.objects.filter(recipe__title='Recipe 20.5')
+            .count(), 2
+        )
+
+    def test_clone_other_users_recipe(self):
+        """ Test that recipes of other users can not be cloned """
+        other = get_user_model().objects.create_user(
+            'other@domain.com', 'test123'
+        )
+        recipe = sample_recipe(other)
+
+        response = self.client.post(clone_url(recipe.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(
+            CLONE_MANY_URL, {'recipes': [recipe.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clone_many_limit(self):
+        """ Test that too many recipes are refused """
+        recipe = sample_recipe(self.user)
+
+        with self.settings(RECIPE_CLONE_MAX=1):
+            response = self.client.post(
+                CLONE_MANY_URL, {'recipes': [recipe.id, recipe.id + 1]},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeCloneIndexTests(TransactionTestCase):
+
+    def setUp(self):
+        recommendations.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+
+    def test_clones_added_to_index(self):
+        """ Test that clones reach the recommendation index """
+        recipe = sample_recipe(self.user)
+        index = recommendations.get_index(self.user.pk)
+
+        clone, = clone_recipes([recipe])
+
+        salt = recipe.ingredient_list[0][0]
+        self.assertEqual(
+            sorted(index.cookable([salt], 10)),
+            [(recipe.id, 1.0, 0), (clone.id, 1.0, 0)]
+        )
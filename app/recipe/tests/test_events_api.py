@@ -0,0 +1,132 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Tag
+from core.pubsub import get_broker
+
+
+EVENTS_URL = reverse('recipe:events')
+
+
+def parse_event(chunk):
+    """ Return the name and data of an encoded server-sent event """
+    fields = dict(
+        line.split(': ', 1) for line in chunk.decode().strip().split('\n')
+    )
+    return fields['event'], json.loads(fields['data'])
+
+
+class ChangeEventsApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_events_login_required(self):
+        """ Test that the event stream needs authentication """
+        response = APIClient().get(
+            EVENTS_URL, HTTP_ACCEPT='text/event-stream'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stream_pushes_published_events(self):
+        """ Test that the stream starts with the cursor and relays events """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.settings(EVENT_STREAM_HEARTBEAT=0.01,
+                           EVENT_STREAM_MAX_SECONDS=0.2):
+            response = self.client.get(
+                EVENTS_URL, HTTP_ACCEPT='text/event-stream'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = iter(response.streaming_content)
+
+            event, data = parse_event(next(stream))
+            self.assertEqual(event, 'ready')
+            self.assertNotEqual(data['cursor'], '0')
+
+            get_broker().publish(self.user.pk, 'change', {'ids': [tag.id]})
+            get_broker().publish(self.user.pk + 1, 'change', {'ids': [0]})
+            event, data = parse_event(next(stream))
+            self.assertEqual((event, data), ('change', {'ids': [tag.id]}))
+
+            rest = list(stream)
+        self.assertTrue(rest)
+        self.assertTrue(all(chunk == b': keepalive\n\n' for chunk in rest))
+        self.assertNotIn(self.user.pk, get_broker()._subscribers)
+
+    def test_streams_per_worker_capped(self):
+        """ Test that a worker refuses streams beyond
+            EVENT_STREAM_MAX_PER_WORKER until one is closed """
+        with self.settings(EVENT_STREAM_MAX_PER_WORKER=1):
+            first = self.client.get(
+                EVENTS_URL, HTTP_ACCEPT='text/event-stream'
+            )
+            refused = self.client.get(
+                EVENTS_URL, HTTP_ACCEPT='text/event-stream'
+            )
+            first.close()
+            second = self.client.get(
+                EVENTS_URL, HTTP_ACCEPT='text/event-stream'
+            )
+            second.close()
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(refused.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', refused)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+
+
+class ChangeEventsConnectionTests(TransactionTestCase):
+
+    def test_stream_releases_database_connection(self):
+        """ Test that the connection is closed before streaming starts """
+        user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        # The in-memory test database ignores close(), count the calls
+        with self.settings(EVENT_STREAM_MAX_SECONDS=0), \
+                patch.object(connection, 'close') as close:
+            response = client.get(EVENTS_URL, HTTP_ACCEPT='text/event-stream')
+            close.assert_called_once_with()
+            list(response.streaming_content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ChangePublishTests(TransactionTestCase):
+
+    def test_committed_changes_published(self):
+        """ Test that committed changes are published to the owner """
+        user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        subscription = get_broker().subscribe(user.pk)
+        try:
+            tag = Tag.objects.create(user=user, name='Vegan')
+
+            self.assertEqual(subscription.get(0), ('change', {
+                'model': 'tag', 'ids': [tag.id], 'action': 'upsert'
+            }))
+        finally:
+            subscription.close()
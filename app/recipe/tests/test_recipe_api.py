@@ -1,12 +1,15 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 import tempfile
 import os
+from types import SimpleNamespace
 from PIL import Image
 
 
@@ -84,6 +87,19 @@ class PrivateREcipeApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
 
+    def test_list_recipes_single_query(self):
+        """ Test that listing recipes does not join the through tables """
+        for title in ('Cacik', 'Menemen', 'Pilav'):
+            recipe = sample_recipe(user=self.user, title=title)
+            recipe.tags.add(sample_tag(user=self.user, name=title))
+            recipe.ingredients.add(sample_ingredient(user=self.user, name=title))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data[0]['tags']), 1)
+
     def test_recipe_limited_successful(self):
         """ Test that recipe for the authenticated user are returned """
         user2 = get_user_model().objects.create_user(
@@ -116,6 +132,16 @@ class PrivateREcipeApiTests(TestCase):
 
         self.assertEqual(response.data, serializer.data)
 
+    def test_delete_recipe_soft_deletes(self):
+        """ Test deleting a recipe hides it until it is purged """
+        recipe = sample_recipe(user=self.user)
+
+        response = self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(RECIPES_URL).data, [])
+        self.assertTrue(Recipe.all_objects.filter(id=recipe.id).exists())
+
     def test_create_basic_recipe(self):
         """ Test creating a new recipe """
         payload = {
@@ -191,6 +217,141 @@ class PrivateREcipeApiTests(TestCase):
         self.assertEqual(len(tags), 1)
         self.assertIn(new_tag, tags)
 
+    def test_create_recipe_with_other_users_tag(self):
+        """ Test that tags of other users are rejected """
+        user2 = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        tag = sample_tag(user=user2)
+
+        payload = {
+            'title': 'Cacik',
+            'tags': [tag.id],
+            'time_minutes': 5,
+            'price': 10.00
+        }
+        response = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_reports_every_missing_id(self):
+        """ Test that each unknown id is reported with its position """
+        tag = sample_tag(user=self.user)
+        payload = {
+            'title': 'Cacik',
+            'tags': [tag.id, 9998, tag.id, True, 9999],
+            'time_minutes': 5,
+            'price': 10.00
+        }
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['tags']), {3})
+
+        payload['tags'] = [tag.id, 9998, tag.id, 9999]
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['tags']), {1, 3})
+        self.assertEqual(response.data['tags'][1][0].code, 'does_not_exist')
+
+    def test_create_recipe_with_tag_names(self):
+        """ Test that tags can be given by name and are created if needed """
+        vegan = sample_tag(user=self.user, name='Vegan')
+        dinner = sample_tag(user=self.user, name='Dinner')
+        payload = {
+            'title': 'Mercimek',
+            'tags': ['Vegan', dinner.id, 'Soup', 'Soup'],
+            'ingredients': ['Lentils'],
+            'time_minutes': 30,
+            'price': 4.00
+        }
+
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        soup = Tag.objects.get(user=self.user, name='Soup')
+        self.assertEqual(set(recipe.tags.all()), {vegan, dinner, soup})
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            list(recipe.ingredients.values_list('name', flat=True)),
+            ['Lentils']
+        )
+
+    def test_create_recipe_with_names_bounded_queries(self):
+        """ Test that creating many tags by name costs the same """
+        counts = []
+        for size in (2, 20):
+            payload = {
+                'title': f'Recipe {size}',
+                'tags': [f'Tag {size}.{index}' for index in range(size)],
+                'ingredients': [],
+                'time_minutes': 5,
+                'price': 1.00
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    RECIPES_URL, payload, format='json'
+                )
+            self.assertEqual(
+                response.status_code, status.HTTP_201_CREATED
+            )
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_recipe_validates_ids_in_one_query(self):
+        """ Test that validating many tags costs a single query """
+        tags = [
+            sample_tag(user=self.user, name=f'Tag {index}')
+            for index in range(20)
+        ]
+        serializer = RecipeSerializer(
+            data={'tags': [tag.id for tag in tags]},
+            context={'request': SimpleNamespace(user=self.user)},
+            partial=True
+        )
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['tags'], tags)
+
+    def _count_tag_update_queries(self, ingredient_count):
+        """ Count the queries of changing one tag on a recipe """
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user, name=f'Main {ingredient_count}'))
+        ingredients = [
+            sample_ingredient(
+                user=self.user, name=f'Ingredient {ingredient_count}.{index}'
+            )
+            for index in range(ingredient_count)
+        ]
+        recipe.ingredients.add(*ingredients)
+        payload = {
+            'tags': [sample_tag(
+                user=self.user, name=f'Curry {ingredient_count}'
+            ).id],
+            'ingredients': [ingredient.id for ingredient in ingredients]
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                detail_url(recipe.id), payload, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_update_recipe_queries_constant(self):
+        """ Test that updates cost the same with many ingredients """
+        self.assertEqual(
+            self._count_tag_update_queries(5),
+            self._count_tag_update_queries(50)
+        )
+
     def test_full_update_recipe(self):
         """ Test updating a recipe with pull """
         recipe = sample_recipe(user=self.user)
@@ -210,6 +371,73 @@ class PrivateREcipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_create_recipe_with_ingredient_amounts(self):
+        """ Test that ingredients keep their order and amounts """
+        salt = sample_ingredient(user=self.user, name='Salt')
+        payload = {
+            'title': 'Cacik',
+            'ingredients': [
+                {'ingredient': 'Yogurt', 'quantity': '2.5', 'unit': 'cup'},
+                salt.id,
+                {'ingredient': salt.id, 'quantity': '9'},
+            ],
+            'tags': [],
+            'time_minutes': 5,
+            'price': 10.00
+        }
+
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=response.data['id'])
+        ingredients = self.client.get(detail_url(recipe.id)).data['ingredients']
+        self.assertEqual(
+            [(item['name'], item['quantity'], item['unit']) for item in ingredients],
+            [('Yogurt', '2.50', 'cup'), ('Salt', None, '')]
+        )
+        self.assertEqual(
+            [item[1] for item in recipe.ingredient_list], ['Yogurt', 'Salt']
+        )
+
+    def test_reorder_ingredients_keeps_amounts(self):
+        """ Test that reordering ingredients by id keeps their amounts """
+        recipe = sample_recipe(user=self.user)
+        salt = sample_ingredient(user=self.user, name='Salt')
+        pepper = sample_ingredient(user=self.user, name='Pepper')
+        recipe.ingredients.add(salt, through_defaults={
+            'quantity': 1, 'unit': 'tsp'
+        })
+        recipe.ingredients.add(pepper)
+
+        response = self.client.patch(
+            detail_url(recipe.id),
+            {'ingredients': [pepper.id, salt.id]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(
+            recipe.ingredient_list, [[pepper.id, 'Pepper'], [salt.id, 'Salt']]
+        )
+        ingredients = self.client.get(detail_url(recipe.id)).data['ingredients']
+        self.assertEqual(ingredients[1]['quantity'], '1.00')
+        self.assertEqual(ingredients[1]['unit'], 'tsp')
+
+    def test_invalid_ingredient_amount(self):
+        """ Test that invalid amounts are reported by position """
+        payload = {
+            'title': 'Cacik',
+            'ingredients': ['Salt', {'ingredient': 'Yogurt', 'quantity': -1}],
+            'tags': [],
+            'time_minutes': 5,
+            'price': 10.00
+        }
+
+        response = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(1, response.data['ingredients'])
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -0,0 +1,150 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag, Ingredient
+from recipe import recommendations
+
+
+COOKABLE_URL = reverse('recipe:recipe-cookable')
+
+
+def similar_url(recipe_id):
+    """ Return the similar recipes url of a recipe """
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+def sample_recipe(user, title, tags=(), ingredients=()):
+    """ Create and return a recipe linked to the given objects """
+    recipe = Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00
+    )
+    recipe.tags.add(*tags)
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class RecommendationApiTests(TestCase):
+
+    def setUp(self):
+        recommendations.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.egg, self.tomato, self.pepper, self.rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Tomato', 'Pepper', 'Rice')
+        ]
+        self.breakfast = Tag.objects.create(user=self.user, name='Breakfast')
+        self.menemen = sample_recipe(
+            self.user, 'Menemen', [self.breakfast],
+            [self.egg, self.tomato, self.pepper]
+        )
+        self.omelette = sample_recipe(
+            self.user, 'Omelette', [self.breakfast], [self.egg]
+        )
+        self.pilav = sample_recipe(self.user, 'Pilav', [], [self.rice])
+
+    def test_cookable_ranks_by_coverage(self):
+        """ Test that recipes are ranked by ingredients on hand """
+        response = self.client.get(
+            COOKABLE_URL, {'ingredients': f'{self.egg.id},{self.tomato.id}'}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['title'], item['missing']) for item in response.data],
+            [('Omelette', 0), ('Menemen', 1)]
+        )
+        self.assertEqual(response.data[0]['coverage'], 1.0)
+
+    def test_cookable_invalid_ingredients(self):
+        """ Test that malformed ingredient lists are rejected """
+        response = self.client.get(COOKABLE_URL, {'ingredients': 'egg'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_ranks_by_jaccard(self):
+        """ Test that similar recipes share tags and ingredients """
+        response = self.client.get(similar_url(self.menemen.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['id'], self.omelette.id)
+        self.assertEqual(response.data[0]['similarity'], 0.5)
+
+    def test_similar_other_user_recipe(self):
+        """ Test that recipes of other users cannot be used """
+        user2 = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        recipe = sample_recipe(user2, 'Kofte')
+
+        response = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecommendationIndexTests(TransactionTestCase):
+
+    def setUp(self):
+        recommendations.clear_indexes()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+
+    def test_index_follows_changes(self):
+        """ Test that the index is updated incrementally """
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        recipe = sample_recipe(self.user, 'Omelette')
+        index = recommendations.get_index(self.user.pk)
+        self.assertEqual(index.cookable([egg.id], 10), [])
+
+        recipe.ingredients.add(egg)
+        self.assertIs(recommendations.get_index(self.user.pk), index)
+        self.assertEqual(index.cookable([egg.id], 10), [(recipe.id, 1.0, 0)])
+
+        egg.recipe_set.remove(recipe)
+        self.assertEqual(index.cookable([egg.id], 10), [])
+
+        recipe.delete()
+        self.assertEqual(index.masks, {})
+
+    def test_index_rebuilt_at_new_epoch(self):
+        """ Test that an index built before the user moved shards is
+            rebuilt by processes that never saw the move """
+        index = recommendations.get_index(self.user.pk, epoch=0)
+
+        self.assertIs(recommendations.get_index(self.user.pk, epoch=0), index)
+        self.assertIsNot(
+            recommendations.get_index(self.user.pk, epoch=1), index
+        )
+
+    def test_ranking_waits_for_writers(self):
+        """ Test that rankings read the index under its lock, so recipes
+            removed by another thread are never half seen """
+        egg = Ingredient.objects.create(user=self.user, name='Egg')
+        recipe = sample_recipe(self.user, 'Omelette', ingredients=[egg])
+        index = recommendations.get_index(self.user.pk)
+        results = []
+
+        with index.lock:
+            reader = threading.Thread(target=lambda: results.append(
+                (index.cookable([egg.id], 10), index.similar(recipe.id, 10))
+            ))
+            reader.start()
+            reader.join(0.2)
+            self.assertTrue(reader.is_alive())
+            # A removal in progress: the mask is gone, the postings not yet
+            del index.masks[recipe.id]
+        reader.join()
+
+        self.assertEqual(results, [([], [])])
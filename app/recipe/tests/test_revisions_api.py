@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, RecipeRevision, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def revisions_url(recipe_id):
+    return reverse('recipe:recipe-revisions', args=[recipe_id])
+
+
+def revision_url(recipe_id, number):
+    return reverse('recipe:recipe-revision', args=[recipe_id, number])
+
+
+class RecipeRevisionApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        response = self.client.post(RECIPES_URL, {
+            'title': 'Soup',
+            'tags': [self.tag.id],
+            'ingredients': [{'ingredient': 'Salt', 'quantity': '1'}],
+            'time_minutes': 10,
+            'price': '5.00'
+        }, format='json')
+        self.recipe = Recipe.objects.get(id=response.data['id'])
+
+    def edit(self, **payload):
+        response = self.client.patch(
+            detail_url(self.recipe.id), payload, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_edits_recorded_as_deltas(self):
+        """ Test that edits store only what changed """
+        self.edit(title='Stew')
+        self.edit(title='Stew')
+        self.edit(tags=[], ingredients=['Salt', 'Pepper'])
+
+        response = self.client.get(revisions_url(self.recipe.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['number'], item['changed']) for item in response.data],
+            [(3, ['ingredients', 'tags']), (2, ['title'])] +
+            [(1, response.data[-1]['changed'])]
+        )
+        delta = RecipeRevision.objects.get(number=2).delta
+        self.assertEqual(delta, {'title': 'Stew'})
+
+    def test_view_old_version(self):
+        """ Test that any version can be rebuilt """
+        self.edit(title='Stew', tags=[])
+        self.edit(ingredients=[{'ingredient': 'Salt', 'quantity': '2',
+                                'unit': 'tsp'}])
+
+        first = self.client.get(revision_url(self.recipe.id, 1)).data
+        second = self.client.get(revision_url(self.recipe.id, 2)).data
+        third = self.client.get(revision_url(self.recipe.id, 3)).data
+
+        self.assertEqual(first['title'], 'Soup')
+        self.assertEqual(first['tags'], [self.tag.id])
+        self.assertEqual(first['ingredients'][0]['quantity'], '1.00')
+        self.assertEqual(second['title'], 'Stew')
+        self.assertEqual(second['tags'], [])
+        self.assertEqual(third['ingredients'][0]['quantity'], '2.00')
+        self.assertEqual(third['ingredients'][0]['unit'], 'tsp')
+
+    def test_missing_version(self):
+        """ Test that unknown revision numbers are not found """
+        response = self.client.get(revision_url(self.recipe.id, 2))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_snapshots_bound_rebuilds(self):
+        """ Test that rebuilding reads at most a snapshot interval of rows """
+        with self.settings(RECIPE_REVISION_SNAPSHOT_INTERVAL=3):
+            for minutes in range(11, 20):
+                self.edit(time_minutes=minutes)
+
+        snapshots = RecipeRevision.objects.filter(
+            snapshot__isnull=False
+        ).values_list('number', flat=True)
+        self.assertEqual(list(snapshots.order_by('number')), [1, 4, 7, 10])
+        response = self.client.get(revision_url(self.recipe.id, 9))
+        self.assertEqual(response.data['time_minutes'], 18)
+
+    def test_other_users_revisions_hidden(self):
+        """ Test that revisions of other users' recipes are not shown """
+        other = get_user_model().objects.create_user(
+            'other@domain.com', 'test123'
+        )
+        self.client.force_authenticate(other)
+
+        response = self.client.get(revision_url(self.recipe.id, 1))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
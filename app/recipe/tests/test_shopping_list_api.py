@@ -0,0 +1,127 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Ingredient
+
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def sample_recipe(user, title, ingredients=()):
+    """ Create and return a recipe using the given ingredients """
+    recipe = Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00
+    )
+    recipe.ingredients.add(*ingredients)
+    return recipe
+
+
+class ShoppingListApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.egg, self.tomato, self.rice = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Egg', 'Tomato', 'Rice')
+        ]
+        self.recipes = [
+            sample_recipe(self.user, 'Menemen', [self.egg, self.tomato]),
+            sample_recipe(self.user, 'Omelette', [self.egg]),
+            sample_recipe(self.user, 'Pilav', [self.rice]),
+        ]
+        self.expected = [
+            {'id': self.egg.id, 'name': 'Egg', 'recipe_count': 2},
+            {'id': self.tomato.id, 'name': 'Tomato', 'recipe_count': 1},
+        ]
+
+    def test_shopping_list(self):
+        """ Test merging the ingredients of several recipes """
+        payload = {'recipes': [recipe.id for recipe in self.recipes[:2]]}
+
+        response = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.expected)
+
+    def test_shopping_list_single_query(self):
+        """ Test that the recipes are checked with one query and their
+            ingredients aggregated with another """
+        payload = {'recipes': [recipe.id for recipe in self.recipes]}
+
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                SHOPPING_LIST_URL, payload, format='json'
+            )
+
+        self.assertEqual(response.data, [
+            self.expected[0],
+            {'id': self.rice.id, 'name': 'Rice', 'recipe_count': 1},
+            self.expected[1],
+        ])
+
+    def test_shopping_list_chunked(self):
+        """ Test that databases capping query parameters get one query per
+            chunk of recipes, whose counts are merged """
+        payload = {'recipes': [recipe.id for recipe in self.recipes[:2]]}
+
+        with patch.object(connection.features, 'max_query_params', 2), \
+                self.assertNumQueries(3):
+            response = self.client.post(
+                SHOPPING_LIST_URL, payload, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.expected)
+
+    @override_settings(SHOPPING_LIST_STREAM_THRESHOLD=2,
+                       SHOPPING_LIST_CHUNK_SIZE=1)
+    def test_shopping_list_streamed(self):
+        """ Test that large shopping lists are streamed as they are read """
+        payload = {'recipes': [recipe.id for recipe in self.recipes[:2]]}
+
+        response = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)), self.expected
+        )
+
+    @override_settings(SHOPPING_LIST_MAX_RECIPES=2)
+    def test_shopping_list_too_many_recipes(self):
+        """ Test that lists are built from a bounded number of recipes,
+            checked before looking any of them up """
+        payload = {'recipes': [recipe.id for recipe in self.recipes]}
+
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                SHOPPING_LIST_URL, payload, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('recipes', response.data)
+
+    def test_shopping_list_other_user_recipe(self):
+        """ Test that recipes of other users are rejected """
+        other = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        recipe = sample_recipe(other, 'Kofte')
+        payload = {'recipes': [self.recipes[0].id, recipe.id]}
+
+        response = self.client.post(SHOPPING_LIST_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data['recipes']), [1])
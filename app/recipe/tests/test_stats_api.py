@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.models import Recipe, Tag
+
+
+STATS_URL = reverse('recipe:recipe-stats')
+
+
+def sample_recipe(user, **params):
+    """ Create and return a sample recipe """
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class StatsApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats(self):
+        """ Test the statistics of a recipe library """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        sample_recipe(self.user, time_minutes=10, price=4.00).tags.add(vegan)
+        sample_recipe(self.user, time_minutes=40, price=8.00).tags.add(
+            vegan, dessert
+        )
+        sample_recipe(self.user, time_minutes=200, price=60.00)
+        other = get_user_model().objects.create_user(
+            'other@domain.com',
+            'test123'
+        )
+        sample_recipe(other, time_minutes=10, price=1.00)
+
+        response = self.client.get(STATS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['price']['average'], 24)
+        self.assertEqual(
+            [bucket['count']
+             for bucket in response.data['time_minutes']['histogram']],
+            [1, 0, 1, 0, 1]
+        )
+        self.assertEqual(
+            [(tag['name'], tag['count'])
+             for tag in response.data['top_tags']],
+            [('Vegan', 2), ('Dessert', 1)]
+        )
+
+
+class StatsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@domain.com',
+            'test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_stats_cached_until_write(self):
+        """ Test that statistics are cached and refreshed after writes """
+        sample_recipe(self.user)
+        self.client.get(STATS_URL)
+
+        # Only the change log version is read
+        with self.assertNumQueries(1):
+            response = self.client.get(STATS_URL)
+        self.assertEqual(response.data['count'], 1)
+
+        sample_recipe(self.user)
+        response = self.client.get(STATS_URL)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_link_change_refreshes_stats(self):
+        """ Test that linking a tag is reflected without any invalidation
+            reaching this process """
+        recipe = sample_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(STATS_URL)
+
+        recipe.tags.add(tag)
+        response = self.client.get(STATS_URL)
+
+        self.assertEqual(
+            [t['name'] for t in response.data['top_tags']], ['Vegan']
+        )
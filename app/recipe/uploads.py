@@ -0,0 +1,170 @@
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from rest_framework import serializers
+from core.models import Recipe
+from core.revisions import record_revision
+
+""" Multipart field holding a zip of images named after recipe ids """
+ARCHIVE_FIELD = 'archive'
+
+
+class BatchUploadHandler(TemporaryFileUploadHandler):
+    """ Stream every uploaded file to a temporary file on disk
+
+    Unlike the default handlers, small files are not kept in memory either,
+    and the body stops being read once a batch holds more than
+    RECIPE_UPLOAD_BATCH_MAX files or a file outgrows its size limit.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.file_count = 0
+        self.size = 0
+        self.max_size = 0
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.file_count += 1
+        if self.file_count > settings.RECIPE_UPLOAD_BATCH_MAX:
+            raise serializers.ValidationError({'images': [
+                f'Upload at most {settings.RECIPE_UPLOAD_BATCH_MAX} '
+                f'images at a time.'
+            ]})
+        self.size = 0
+        self.max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if field_name == ARCHIVE_FIELD:
+            self.max_size = settings.RECIPE_UPLOAD_ARCHIVE_MAX_SIZE
+        super().new_file(field_name, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            raise serializers.ValidationError({self.field_name: [
+                f'Files may be at most {self.max_size} bytes.'
+            ]})
+        return super().receive_data_chunk(raw_data, start)
+
+
+def _recipe_id(name):
+    """ Return the recipe id a file is named after, None for other names """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return int(stem) if stem.isdigit() else None
+
+
+def batch_files(files):
+    """ Return {recipe id: file} for the multipart files of a batch upload
+
+    Files are sent either in fields named after recipe ids, or as a zip
+    archive of images named after recipe ids. Archive members are read
+    lazily, by the worker handling them. Raise ValidationError for names
+    that are not recipe ids and for unreadable archives.
+    """
+    images = {}
+    errors = []
+    for field, upload in files.items():
+        if field != ARCHIVE_FIELD:
+            recipe_id = _recipe_id(field)
+            if recipe_id is None:
+                errors.append(f'Field {field} is not a recipe id.')
+            else:
+                images[recipe_id] = upload
+            continue
+
+        try:
+            archive = zipfile.ZipFile(upload)
+        except zipfile.BadZipFile:
+            raise serializers.ValidationError(
+                {ARCHIVE_FIELD: ['Upload a valid zip archive.']}
+            )
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        for info in members:
+            recipe_id = _recipe_id(info.filename)
+            if recipe_id is None:
+                errors.append(f'File {info.filename} is not a recipe id.')
+            elif info.file_size > settings.RECIPE_IMAGE_MAX_SIZE:
+                errors.append(f'File {info.filename} is too large.')
+            else:
+                images[recipe_id] = (archive, info)
+
+    if errors:
+        raise serializers.ValidationError({'images': errors})
+    if not images:
+        raise serializers.ValidationError({'images': ['No images sent.']})
+    if len(images) > settings.RECIPE_UPLOAD_BATCH_MAX:
+        raise serializers.ValidationError({'images': [
+            f'Upload at most {settings.RECIPE_UPLOAD_BATCH_MAX} '
+            f'images at a time.'
+        ]})
+    return images
+
+
+def _store(recipe, upload):
+    """ Validate an image and save it to storage, return its name """
+    if isinstance(upload, tuple):
+        archive, info = upload
+        try:
+            content = archive.read(info)
+        except (zipfile.BadZipFile, EOFError):
+            raise serializers.ValidationError(['Upload a valid image.'])
+        upload = ContentFile(content, name=os.path.basename(info.filename))
+    try:
+        image = serializers.ImageField().run_validation(upload)
+    except DjangoValidationError as exc:
+        raise serializers.ValidationError(exc.messages)
+    field = Recipe._meta.get_field('image')
+    name = field.generate_filename(recipe, image.name)
+    return field.storage.save(name, image, max_length=field.max_length)
+
+
+def upload_images(recipes, images):
+    """ Store images for recipes and point the recipes to them
+
+    `recipes` maps recipe ids to recipes and `images` recipe ids to files,
+    as given by batch_files(). Validation and storage run in a pool of
+    RECIPE_UPLOAD_WORKERS threads; the recipes are then saved together,
+    with their revisions, from the calling thread so that no database
+    connection is opened per worker. Return the updated recipes and
+    {recipe id: errors} for the images that were not used.
+    """
+    errors = {}
+    jobs = {}
+    for recipe_id, upload in images.items():
+        if recipe_id in recipes:
+            jobs[recipe_id] = upload
+        else:
+            errors[recipe_id] = ['Recipe not found.']
+
+    names = {}
+    with ThreadPoolExecutor(settings.RECIPE_UPLOAD_WORKERS) as pool:
+        futures = {
+            recipe_id: pool.submit(_store, recipes[recipe_id], upload)
+            for recipe_id, upload in jobs.items()
+        }
+        for recipe_id, future in futures.items():
+            try:
+                names[recipe_id] = future.result()
+            except serializers.ValidationError as exc:
+                errors[recipe_id] = exc.detail
+
+    updated = [recipes[recipe_id] for recipe_id in sorted(names)]
+    if not updated:
+        return updated, errors
+    try:
+        with transaction.atomic(using=updated[0]._state.db):
+            for recipe in updated:
+                recipe.image = names[recipe.id]
+                recipe.save(update_fields=['image'])
+                record_revision(recipe)
+    except Exception:
+        storage = Recipe._meta.get_field('image').storage
+        for name in names.values():
+            storage.delete(name)
+        raise
+
+    return updated, errors
@@ -11,5 +11,7 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('changes/', views.ChangeFeedView.as_view(), name='changes'),
+    path('events/', views.ChangeEventsView.as_view(), name='events'),
     path('', include(router.urls))
 ]
@@ -1,10 +1,23 @@
+from django.conf import settings
+from django.db.models import Max
+from django.http import Http404, StreamingHttpResponse
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import viewsets, mixins, status
+from rest_framework import viewsets, mixins, status, views
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+from rest_framework.renderers import JSONRenderer
+from core.models import Change, Tag, Ingredient, Recipe, RecipeTag, \
+    RecipeIngredient
+from core.cloning import clone_recipes
+from core.revisions import get_version
+from recipe import serializers, recommendations
+from recipe.stats import get_stats
+from recipe.shopping import shopping_list, stream_json_list
+from recipe.sync import change_feed, format_cursor, parse_cursor
+from recipe.events import EventStream, EventStreamRenderer, \
+    close_connections
+from recipe.uploads import BatchUploadHandler, batch_files, upload_images
 
 
 class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
@@ -21,7 +34,10 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(
+                recipe__isnull=False,
+                recipe__deleted_at__isnull=True
+            )
 
         return queryset.filter(
             user=self.request.user
@@ -44,38 +60,133 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
+class ChangeFeedView(views.APIView):
+    """ List the changes to the user's recipes, tags and ingredients after
+        a cursor so clients can sync incrementally """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = 'reads'
+
+    def get(self, request):
+        cursor = parse_cursor(request.query_params.get('since'))
+        return Response(change_feed(
+            request.user, cursor, settings.CHANGE_FEED_PAGE_SIZE
+        ))
+
+
+class ChangeEventsView(views.APIView):
+    """ Push notifications of changes to the user's recipes, tags and
+        ingredients as server-sent events """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    renderer_classes = (EventStreamRenderer, JSONRenderer)
+    throttle_scope = 'reads'
+
+    def get(self, request):
+        last_change = Change.objects.filter(user=request.user).aggregate(
+            last=Max('id')
+        )['last'] or 0
+        cursor = format_cursor(request.user, last_change)
+        stream = EventStream(request.user.pk, cursor)
+        close_connections()
+        response = StreamingHttpResponse(
+            stream, content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class RecipeViewSet(viewsets.ModelViewSet):
     """ Manage recipe in the database """
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    throttle_scope = None
 
     def _params_to_ints(self, qs):
         """ Convert a list of string IDs to a list of integers """
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _limit(self, default=20, maximum=100):
+        """ Return the number of results asked for, within bounds """
+        try:
+            limit = int(self.request.query_params.get('limit', default))
+        except ValueError:
+            limit = default
+        return max(1, min(limit, maximum))
+
+    def _ranked_response(self, ranking, score_names):
+        """ Serialize ranked (recipe id, *scores) tuples in order """
+        recipes = Recipe.objects.filter(user=self.request.user).in_bulk(
+            [result[0] for result in ranking]
+        )
+        results = []
+        for recipe_id, *scores in ranking:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                for name, score in zip(score_names, scores):
+                    setattr(recipe, name, score)
+                results.append(recipe)
+
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    def initialize_request(self, request, *args, **kwargs):
+        """ Stream batch uploads to disk, before anything reads the body """
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload_images':
+            request.upload_handlers = [BatchUploadHandler(request)]
+        return drf_request
+
     def get_queryset(self):
-        """ Retrieve the recipes for the authenticated user """
+        """ Retrieve the recipes for the authenticated user
+
+        Every table is filtered by the user, including the through tables
+        behind the tag and ingredient filters, so partitioned tables are
+        only read in the user's partition.
+        """
+        user = self.request.user
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(id__in=RecipeTag.objects.filter(
+                user=user, tag_id__in=tag_ids
+            ).values('recipe_id'))
 
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(id__in=RecipeIngredient.objects.filter(
+                user=user, ingredient_id__in=ingredient_ids
+            ).values('recipe_id'))
 
-        return queryset.filter(user=self.request.user)
+        return queryset.filter(user=user).order_by('-id')
 
     def get_serializer_class(self):
         """ Return appropriate serializer class """
-        if self.action == 'retrieve':
+        if self.action == 'list':
+            return serializers.RecipeListSerializer
+        elif self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'cookable':
+            return serializers.CookableRecipeSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
+        elif self.action == 'shopping_list':
+            return serializers.ShoppingListSerializer
+        elif self.action == 'revisions':
+            return serializers.RecipeRevisionSerializer
+        elif self.action == 'revision':
+            return serializers.RecipeVersionSerializer
+        elif self.action == 'clone':
+            return serializers.RecipeCloneSerializer
+        elif self.action == 'clone_many':
+            return serializers.RecipeMultiCloneSerializer
 
         return self.serializer_class
 
@@ -83,7 +194,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """ Create a new recipe """
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def perform_destroy(self, instance):
+        """ Hide the recipe, it is purged in the background """
+        instance.soft_delete()
+
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_scope='uploads')
     def upload_image(self, request, pk=None):
         """ Upload an image tp a recipe """
         recipe = self.get_object()
@@ -102,3 +218,120 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=False, url_path='upload-images',
+            throttle_scope='uploads')
+    def upload_images(self, request):
+        """ Upload images to many recipes, from files named after recipe
+            ids or from a zip archive of them """
+        images = batch_files(request.FILES)
+        recipes = Recipe.objects.filter(user=request.user).in_bulk(
+            list(images)
+        )
+        updated, errors = upload_images(recipes, images)
+
+        return Response(
+            {
+                'recipes': serializers.RecipeImageSerializer(
+                    updated, many=True, context=self.get_serializer_context()
+                ).data,
+                'errors': {str(key): value for key, value in errors.items()},
+            },
+            status=status.HTTP_200_OK if updated
+            else status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(methods=['GET'], detail=False)
+    def cookable(self, request):
+        """ Rank recipes by the share of their ingredients on hand """
+        ingredients = request.query_params.get('ingredients')
+        try:
+            ingredient_ids = self._params_to_ints(ingredients or '')
+        except ValueError:
+            return Response(
+                {'ingredients': ['Expected a comma separated list of ids.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        index = recommendations.get_index(
+            request.user.pk, epoch=request.user.changes_epoch
+        )
+        ranking = index.cookable(ingredient_ids, self._limit())
+        return self._ranked_response(ranking, ('coverage', 'missing'))
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """ Rank recipes by how many tags and ingredients they share """
+        recipe = self.get_object()
+        index = recommendations.get_index(
+            request.user.pk, epoch=request.user.changes_epoch
+        )
+        ranking = index.similar(recipe.pk, self._limit())
+        return self._ranked_response(ranking, ('similarity',))
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """ Summarize the prices, times, tags and ingredients of the
+            user's recipes """
+        return Response(get_stats(request.user, self._limit(10, 50)))
+
+    @action(methods=['POST'], detail=False, url_path='shopping-list',
+            throttle_scope='reads')
+    def shopping_list(self, request):
+        """ Merge the ingredients of many recipes into a shopping list """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+
+        items = shopping_list(request.user, [recipe.pk for recipe in recipes])
+        if len(recipes) < settings.SHOPPING_LIST_STREAM_THRESHOLD:
+            return Response(list(items))
+
+        return StreamingHttpResponse(
+            stream_json_list(items), content_type='application/json'
+        )
+
+    @action(methods=['GET'], detail=True)
+    def revisions(self, request, pk=None):
+        """ List the revisions of a recipe, newest first """
+        recipe = self.get_object()
+        revisions = recipe.revisions.defer('snapshot').order_by('-number')
+        serializer = self.get_serializer(revisions, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=True,
+            url_path=r'revisions/(?P<number>[0-9]+)')
+    def revision(self, request, pk=None, number=None):
+        """ Show a recipe as it was at one of its revisions """
+        version = get_version(self.get_object(), int(number))
+        if version is None:
+            raise Http404
+        serializer = self.get_serializer(version)
+        return Response(serializer.data)
+
+    @action(methods=['POST'], detail=True)
+    def clone(self, request, pk=None):
+        """ Copy a recipe with its tags, ingredients and image """
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        clone, = clone_recipes(
+            [recipe], serializer.validated_data.get('title')
+        )
+        return Response(
+            serializers.RecipeListSerializer(clone).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(methods=['POST'], detail=False, url_path='clone')
+    def clone_many(self, request):
+        """ Copy many recipes with their tags, ingredients and images """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        clones = clone_recipes(serializer.validated_data['recipes'])
+        return Response(
+            serializers.RecipeListSerializer(clones, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
@@ -0,0 +1,90 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from django.utils.functional import cached_property
+from rest_framework.exceptions import Throttled
+
+
+class LoginGuard:
+    """ Keep failed logins from burning CPU on password hashing
+
+    A credential pair that just failed is remembered, so sending the same
+    bad password again is rejected without hashing it. Nothing about the
+    stored password is kept: the remembered pairs of an account are keyed
+    on a generation that ForgetFailedLogins renews when its password
+    changes. A client address failing too often on an account is locked
+    out of it for a while; other clients keep logging in, so nobody can
+    lock an account out for everyone. Everything lives in the default
+    cache, which must be shared by every worker.
+    """
+
+    def __init__(self, email, password, client=''):
+        self.email = email or ''
+        self.password = password or ''
+        self.client = client or ''
+
+    @staticmethod
+    def _digest(*parts):
+        return salted_hmac('user.login', '\0'.join(parts)).hexdigest()
+
+    @cached_property
+    def attempts_key(self):
+        digest = self._digest(self.email.lower(), self.client)
+        return f'login-attempts:{digest}'
+
+    @classmethod
+    def generation_key(cls, email):
+        return f'login-generation:{cls._digest(email.lower())}'
+
+    @classmethod
+    def forget(cls, email):
+        """ Forget the failed credential pairs of an account """
+        # Pairs outlive their generation by at most LOGIN_FAILURE_CACHE
+        cache.set(cls.generation_key(email), uuid.uuid4().hex,
+                  settings.LOGIN_FAILURE_CACHE)
+
+    @cached_property
+    def credential_key(self):
+        generation = cache.get(self.generation_key(self.email), '')
+        digest = self._digest(self.email, self.password, generation)
+        return f'login-failed:{digest}'
+
+    def check(self):
+        """ Raise if the client is locked out, return False if these
+            credentials are known to be wrong """
+        attempts = cache.get(self.attempts_key, 0)
+        if attempts >= settings.LOGIN_MAX_FAILURES:
+            raise Throttled(wait=settings.LOGIN_FAILURE_WINDOW)
+
+        return not cache.get(self.credential_key)
+
+    def failed(self):
+        """ Remember a failed attempt """
+        cache.set(self.credential_key, True, settings.LOGIN_FAILURE_CACHE)
+        if cache.add(self.attempts_key, 1, settings.LOGIN_FAILURE_WINDOW):
+            return
+        try:
+            cache.incr(self.attempts_key)
+        except ValueError:
+            # The counter expired between add() and incr()
+            cache.set(self.attempts_key, 1, settings.LOGIN_FAILURE_WINDOW)
+
+    def succeeded(self):
+        """ Reset the failure counter after a successful login """
+        cache.delete(self.attempts_key)
+
+
+class ForgetFailedLogins:
+    """ Password validator accepting every password, which makes Django
+        tell LoginGuard whenever a password changes """
+
+    def validate(self, password, user=None):
+        pass
+
+    def password_changed(self, password, user):
+        LoginGuard.forget(user.get_username())
+
+    def get_help_text(self):
+        return ''
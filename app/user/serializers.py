@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
+from rest_framework.throttling import BaseThrottle
+from rest_framework.validators import UniqueValidator
 from django.utils.translation import ugettext_lazy as _
+from user.login import LoginGuard
 
 
 class UserSerializers(serializers.ModelSerializer):
@@ -13,6 +16,12 @@ class UserSerializers(serializers.ModelSerializer):
             'password': {
                 'write_only': True,
                 'min_length': 5
+            },
+            'email': {
+                # Soft deleted users keep their email until purged
+                'validators': [UniqueValidator(
+                    queryset=get_user_model().all_objects.all()
+                )]
             }
         }
 
@@ -45,14 +54,22 @@ class AuthTokenSerializer(serializers.Serializer):
         email = attrs.get('email')
         password = attrs.get('password')
 
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password
+        request = self.context.get('request')
+        guard = LoginGuard(
+            email, password, request and BaseThrottle().get_ident(request)
         )
+        user = None
+        if guard.check():
+            user = authenticate(
+                request=request,
+                username=email,
+                password=password
+            )
         if not user:
+            guard.failed()
             msg = _('Unable to authentiate with provided credentials')
             raise serializers.ValidationError(msg, code='authentication')
 
+        guard.succeeded()
         attrs['user'] = user
         return attrs
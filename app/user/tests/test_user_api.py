@@ -1,9 +1,13 @@
-from django.test import TestCase
-from django.contrib.auth import get_user_model
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model, authenticate
+from django.core.cache import cache
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from user.login import LoginGuard
 
 
 CREATE_USER_URL = reverse('user:create')
@@ -20,6 +24,7 @@ class PublicUserApiTests(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        cache.clear()
 
     def test_create_valid_user_success(self):
         """ Test creating user with valid payload is successful """
@@ -118,6 +123,90 @@ class PublicUserApiTests(TestCase):
         self.assertNotIn('token', response.data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_token_upgrades_password_hash(self):
+        """ Test that logging in rehashes a password with the current cost """
+        payload = {
+            'email': 'test@domain.com',
+            'password': 'test123'
+        }
+        with override_settings(PBKDF2_ITERATIONS=1000):
+            user = create_user(**payload)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with override_settings(PBKDF2_ITERATIONS=2000):
+            response = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_create_token_repeated_bad_password_not_hashed(self):
+        """ Test that a known bad password is rejected without hashing """
+        create_user(email='test@domain.com', password='test123')
+        payload = {
+            'email': 'test@domain.com',
+            'password': 'wrong'
+        }
+        with patch('user.serializers.authenticate',
+                   side_effect=authenticate) as auth:
+            self.client.post(TOKEN_URL, payload)
+            response = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(auth.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LOGIN_MAX_FAILURES=2)
+    def test_create_token_locked_out(self):
+        """ Test that too many failed logins lock the client out of the
+            account for a while, and only that client """
+        create_user(email='test@domain.com', password='test123')
+        for password in ('wrong1', 'wrong2'):
+            self.client.post(
+                TOKEN_URL,
+                {'email': 'test@domain.com', 'password': password},
+                REMOTE_ADDR='10.0.0.1'
+            )
+
+        payload = {'email': 'test@domain.com', 'password': 'test123'}
+        response = self.client.post(
+            TOKEN_URL, payload, REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn('Retry-After', response)
+
+        response = self.client.post(
+            TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_failed_login_reads_no_password(self):
+        """ Test that failed logins are remembered without reading the
+            stored password """
+        create_user(email='test@domain.com', password='test123')
+        guard = LoginGuard('test@domain.com', 'wrong', '10.0.0.1')
+
+        with self.assertNumQueries(0):
+            self.assertTrue(guard.check())
+            guard.failed()
+        self.assertFalse(
+            LoginGuard('test@domain.com', 'wrong', '10.0.0.2').check()
+        )
+
+    def test_password_change_forgets_failed_logins(self):
+        """ Test that a password which failed before the account switched
+            to it is accepted """
+        user = create_user(email='test@domain.com', password='test123')
+        payload = {'email': 'test@domain.com', 'password': 'newpass123'}
+        self.client.post(TOKEN_URL, payload)
+
+        user.set_password('newpass123')
+        user.save()
+        response = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_retrieve_user_unauthorized(self):
         """" Test that authentication is required for users """
         response = self.client.get(ME_URL)
@@ -165,3 +254,15 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_user_profile(self):
+        """ Test deleting the profile deactivates the user """
+        response = self.client.delete(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        user = get_user_model().all_objects.get(id=self.user.id)
+        self.assertFalse(user.is_active)
+        self.assertIsNotNone(user.deleted_at)
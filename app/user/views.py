@@ -15,7 +15,7 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     """ Manage the authenticated user """
     serializer_class = UserSerializers
     authentication_classes = (authentication.TokenAuthentication, )
@@ -24,3 +24,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         """ Retrieve and return authentication user """
         return self.request.user
+
+    def perform_destroy(self, instance):
+        """ Deactivate the user, their data is purged in the background """
+        instance.soft_delete()